@@ -0,0 +1,240 @@
+"""
+Micro-benchmarks for the hot paths of the fuzzing loop.
+
+Run from the repository root:
+
+    python -m bench.microbench [-f FILTER] [-r REPEAT] [-o OUTPUT]
+
+Every result is written as one JSON object per line (keys sorted), preceded by
+a header line describing the environment, so that runs of different versions
+can be diffed or loaded line by line to track regressions.
+"""
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Any
+from pathlib import Path
+import argparse
+import json
+import pickle
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import timeit
+
+from mutator import Mutator, ArgMutator, DupMutator, SwapMutator, DelMutator, InsMutator, MutExecutor
+from protocol import Protocol, new_seed
+from catalog import Catalog
+from seed import Seed, SeedStatus
+from utils import PATH_ROOT
+
+
+SCHEMA_VERSION = 1
+QUEUE_SIZES = [10, 100, 1_000, 10_000, 100_000, 1_000_000]
+
+# A benchmark case: (name, params, statement to time). A `None` statement marks a skipped case.
+Case = Tuple[str, Dict[str, Any], Optional[Callable[[], Any]]]
+
+
+class StubClient:
+    """A client accepting every API call and answering immediately, to measure pure dispatch overhead"""
+
+    def __getattr__(self, name: str) -> Callable:
+        return self._call
+
+    @staticmethod
+    def _call(*args) -> str:
+        return "200 OK"
+
+
+def load_seeds() -> Dict[str, Optional[Seed]]:
+    """Load the initial seed of every protocol, `None` when its dependencies are not available"""
+    seeds: Dict[str, Optional[Seed]] = {}
+    for protocol in Protocol:
+        try:
+            seeds[protocol.name] = new_seed(protocol)
+        except Exception as e:
+            print(f"# skip {protocol.name} seed: {type(e).__name__}: {e}", file=sys.stderr)
+            seeds[protocol.name] = None
+    return seeds
+
+
+def mutator_cases(seeds: Dict[str, Optional[Seed]]) -> Iterator[Case]:
+    mutators: List[Mutator] = [ArgMutator(), DupMutator(), SwapMutator(), DelMutator()]
+    for mutator in mutators:
+        for proto, seed in seeds.items():
+            yield (f"mutator.{mutator.name()}", {"protocol": proto},
+                   None if seed is None else (lambda m=mutator, s=seed: m.mutate(s)))
+
+    for proto, seed in seeds.items():
+        mutator = None if seed is None else InsMutator(catalog=Catalog.load(Protocol[proto], seed))
+        yield ("mutator.ins", {"protocol": proto},
+               None if mutator is None else (lambda m=mutator, s=seed: m.mutate(s)))
+
+
+def catalog_cases(seeds: Dict[str, Optional[Seed]]) -> Iterator[Case]:
+    for proto, seed in seeds.items():
+        if seed is None:
+            yield ("catalog.load", {"protocol": proto, "cache": False}, None)
+            yield ("catalog.load", {"protocol": proto, "cache": True}, None)
+            yield ("catalog.draw", {"protocol": proto}, None)
+            continue
+
+        protocol = Protocol[proto]
+        yield ("catalog.load", {"protocol": proto, "cache": False},
+               lambda p=protocol, s=seed: Catalog.load(p, s, cache=False))
+        yield ("catalog.load", {"protocol": proto, "cache": True},
+               lambda p=protocol, s=seed: Catalog.load(p, s))
+        yield ("catalog.draw", {"protocol": proto}, Catalog.load(protocol, seed).draw)
+
+
+def copy_cases(seeds: Dict[str, Optional[Seed]]) -> Iterator[Case]:
+    for proto, seed in seeds.items():
+        yield ("seed.copy", {"protocol": proto}, None if seed is None else seed.copy)
+
+
+def serialization_cases(seeds: Dict[str, Optional[Seed]], tmpdir: Path) -> Iterator[Case]:
+    for proto, seed in seeds.items():
+        if seed is None:
+            yield ("seed.pickle", {"protocol": proto}, None)
+            yield ("seed.save", {"protocol": proto}, None)
+            continue
+
+        yield ("seed.pickle", {"protocol": proto},
+               lambda s=seed: pickle.loads(pickle.dumps(s)))
+        yield ("seed.save", {"protocol": proto},
+               lambda s=seed: s.save(tmpdir, SeedStatus.Interesting))
+
+
+def execute_cases(seeds: Dict[str, Optional[Seed]]) -> Iterator[Case]:
+    client = StubClient()
+    for proto, seed in seeds.items():
+        if seed is None:
+            yield ("fn.execute", {"protocol": proto}, None)
+            yield ("seed.execute", {"protocol": proto}, None)
+            continue
+
+        fn = seed[0]
+        yield ("fn.execute", {"protocol": proto}, lambda f=fn: f.execute(client))
+        yield ("seed.execute", {"protocol": proto}, lambda s=seed: s.execute(client))
+
+
+def executor_cases(seeds: Dict[str, Optional[Seed]]) -> Iterator[Case]:
+    seed = seeds.get(Protocol.FTP.name)
+    for splice in (False, True):
+        executor = MutExecutor(splice=splice)
+        for size in QUEUE_SIZES:
+            queue = None if seed is None else [seed] * size
+            yield ("mutexecutor.mutate", {"protocol": Protocol.FTP.name, "queue": size, "splice": splice},
+                   None if queue is None else (lambda q=queue, e=executor: e.mutate(q)))
+
+
+STARTUP_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+from protocol import Protocol, new_seed
+from catalog import Catalog
+from client import Client
+protocol = Protocol[sys.argv[1]]
+new_seed(protocol)
+Client.preload(protocol)
+print(int((time.perf_counter() - start) * 1e9))
+"""
+
+
+def startup(protocol: Protocol, repeat: int) -> Dict[str, Any]:
+    """Time importing, loading the seed and preloading the client of `protocol` in fresh interpreters"""
+    times: List[float] = []
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT, protocol.name], cwd=PATH_ROOT,
+                              capture_output=True, text=True)
+        if proc.returncode != 0:
+            return {"skipped": True}
+        times.append(float(proc.stdout.strip().splitlines()[-1]))
+    return summarize(times, loops=1)
+
+
+def measure(stmt: Callable[[], Any], repeat: int) -> Dict[str, Any]:
+    """Time `stmt`, choosing the loop count so that one repetition takes at least 0.2s"""
+    timer = timeit.Timer(stmt)
+    loops, _ = timer.autorange()
+    times = [t / loops * 1e9 for t in timer.repeat(repeat=repeat, number=loops)]
+    return summarize(times, loops=loops)
+
+
+def summarize(times: List[float], *, loops: int) -> Dict[str, Any]:
+    """Statistics (in ns per call) of the timings of all repetitions"""
+    return {
+        "loops": loops,
+        "repeat": len(times),
+        "min_ns": round(min(times), 1),
+        "median_ns": round(statistics.median(times), 1),
+        "mean_ns": round(statistics.fmean(times), 1),
+        "stdev_ns": round(statistics.stdev(times), 1) if len(times) > 1 else 0.0,
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PATH_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def header() -> Dict[str, Any]:
+    return {
+        "schema": SCHEMA_VERSION,
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "system": platform.system(),
+    }
+
+
+def run(filters: List[str], repeat: int, output) -> None:
+    random.seed(0)
+    seeds = load_seeds()
+
+    with tempfile.TemporaryDirectory(prefix="fazz-bench-") as tmp:
+        cases: List[Case] = [
+            *mutator_cases(seeds),
+            *catalog_cases(seeds),
+            *copy_cases(seeds),
+            *serialization_cases(seeds, Path(tmp)),
+            *execute_cases(seeds),
+            *executor_cases(seeds),
+        ]
+
+        output.write(json.dumps(header(), sort_keys=True) + "\n")
+        for name, params, stmt in cases:
+            if filters and not any(f in name for f in filters):
+                continue
+
+            record: Dict[str, Any] = {"name": name, "params": params}
+            if stmt is None:
+                record["skipped"] = True
+            else:
+                record.update(measure(stmt, repeat))
+            output.write(json.dumps(record, sort_keys=True) + "\n")
+            output.flush()
+
+        for protocol in Protocol:
+            if filters and not any(f in "startup" for f in filters):
+                continue
+
+            record = {"name": "startup", "params": {"protocol": protocol.name}}
+            record.update(startup(protocol, repeat))
+            output.write(json.dumps(record, sort_keys=True) + "\n")
+            output.flush()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("Function-Aware Fuzzer micro-benchmarks")
+    parser.add_argument('-f', '--filter', action="append", default=[], help="only run benchmarks whose name contains FILTER")
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    parser.add_argument('-o', '--output', type=argparse.FileType('w'), default=sys.stdout)
+
+    args = parser.parse_args()
+    run(args.filter, args.repeat, args.output)
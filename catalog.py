@@ -0,0 +1,264 @@
+"""
+Catalog of the API calls of each protocol client, introspected from the client classes.
+
+The hand-written seeds in `protocol/*.py` only use a fraction of what the clients offer.
+The catalog lists every public method of the client (with the kinds of its arguments, read
+from the signature), so that `InsMutator` can insert calls the seeds never contained.
+Introspection is done once and persisted under `catalog/`; the argument generators are bound
+to the initial seed when loading, so that drawing a new call is O(1).
+"""
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Sequence, Tuple
+from copy import deepcopy
+from enum import Enum
+from importlib import import_module
+import inspect
+import json
+import logging
+import random
+import sys
+import types
+import typing
+import zlib
+
+from protocol import Protocol
+from seed import Seed
+from seed.arg import Arg, StringArg, NumberArg, BooleanArg, CallableArg, FileDescriptorArg, PayloadArg, EnumArg
+from seed.fn import Fn
+from utils import PATH_CATALOG
+from exception import ClientNotInstalled
+
+
+logger = logging.getLogger("fazz.catalog")
+
+CATALOG_VERSION = 1
+
+
+class ApiSource:
+    """Where the API calls of a protocol come from"""
+
+    def __init__(self, cls: str, *, prefix: str = "", exclude: FrozenSet[str] = frozenset(),
+                 hints: Optional[Dict[str, str]] = None) -> None:
+        self.cls = cls              # `module:attribute` of the class whose methods are the API calls
+        self.prefix = prefix        # only the methods starting with it
+        self.exclude = exclude      # connection management and calls waiting for data never sent
+        self.hints = hints or {}    # parameter name -> argument kind, overriding the signature
+
+
+# The DICOM API calls are methods of the association, not of the application entity built by `Client`
+SOURCES: Dict[Protocol, ApiSource] = {
+    Protocol.FTP: ApiSource("ftplib:FTP", exclude=frozenset({
+        "connect", "close", "quit", "abort", "debug", "set_debuglevel", "getwelcome", "sanitize",
+        "getline", "getmultiline", "getresp", "voidresp", "putline", "putcmd",
+        "makeport", "makepasv", "sendport", "sendeprt", "ntransfercmd", "transfercmd",
+    }), hints={"callback": "callable", "fp": "file", "val": "bool", "blocksize": "int", "rest": "int"}),
+    Protocol.SMTP: ApiSource("smtplib:SMTP", exclude=frozenset({
+        "connect", "close", "quit", "set_debuglevel", "getreply", "send", "putcmd",
+        "has_extn", "auth", "starttls", "send_message",
+    })),
+    Protocol.DNS: ApiSource("dns.resolver:Resolver", prefix="resolve"),
+    Protocol.DICOM: ApiSource("pynetdicom.association:Association", prefix="send_",
+                              hints={"query_model": "value:protocol.dicom:SOPClassFind"}),
+}
+
+# (API name, argument kinds, number of required arguments)
+Api = Tuple[str, Tuple[str, ...], int]
+
+
+def discard(*args) -> None:
+    """Callback ignoring the data received (picklable, unlike a lambda)"""
+    return
+
+
+def arg_kind(arg: Arg) -> Optional[str]:
+    """The kind of an argument of the hand-written seeds"""
+    if isinstance(arg, BooleanArg):
+        return "bool"
+    if isinstance(arg, NumberArg):
+        return "float" if isinstance(arg.value, float) else "int"
+    if isinstance(arg, StringArg):
+        return "str"
+    if isinstance(arg, CallableArg):
+        return "callable"
+    if isinstance(arg, (FileDescriptorArg, PayloadArg)):
+        return "file"
+    if isinstance(arg, EnumArg):
+        enum = type(arg.value)
+        return f"{'value' if arg.use_value else 'enum'}:{enum.__module__}:{enum.__qualname__}"
+    if type(arg).__name__.startswith("DICOM"):
+        return "dataset"
+    return None
+
+
+def type_kind(annotation: Any) -> Optional[str]:
+    """The kind of an argument annotated with `annotation`"""
+    if typing.get_origin(annotation) in (typing.Union, getattr(types, "UnionType", typing.Union)):
+        kinds = [kind for member in typing.get_args(annotation) if (kind := type_kind(member)) is not None]
+        for preferred in ("dataset", "enum", "value"):
+            for kind in kinds:
+                if kind.split(":")[0] == preferred:
+                    return kind
+        return kinds[0] if kinds else None
+
+    if not isinstance(annotation, type):
+        return None
+    if issubclass(annotation, Enum):
+        return f"enum:{annotation.__module__}:{annotation.__qualname__}"
+    if annotation.__name__ == "Dataset":
+        return "dataset"
+    for python_type, kind in ((bool, "bool"), (int, "int"), (float, "float"), (str, "str")):
+        if issubclass(annotation, python_type):
+            return kind
+    return None
+
+
+def param_kind(param: inspect.Parameter, hints: Dict[str, str]) -> Optional[str]:
+    if param.name in hints:
+        return hints[param.name]
+    if param.annotation is not inspect.Parameter.empty:
+        return type_kind(param.annotation)
+    if param.default is inspect.Parameter.empty:
+        return "str"  # the unannotated arguments of the text protocol clients are commands and names
+    if param.default is None:
+        return None
+    return type_kind(type(param.default))
+
+
+def introspect(source: ApiSource) -> List[Api]:
+    """List the API calls of the client class, skipping those whose required arguments cannot be generated"""
+    module_name, attr = source.cls.split(':')
+    try:
+        cls = getattr(import_module(module_name), attr)
+    except ImportError as e:
+        raise ClientNotInstalled(f"Client library {module_name} is not installed: {e}")
+
+    package = module_name.split('.')[0]
+    apis: List[Api] = []
+    for name, method in inspect.getmembers(cls, inspect.isfunction):
+        if name.startswith('_') or not name.startswith(source.prefix) or name in source.exclude:
+            continue
+        if not method.__module__.startswith(package):
+            continue  # inherited from the standard library (e.g. `threading.Thread`)
+
+        try:
+            signature = inspect.signature(method, eval_str=True)
+        except Exception:
+            signature = inspect.signature(method)
+
+        kinds: List[str] = []
+        required = 0
+        supported = True
+        for param in list(signature.parameters.values())[1:]:
+            if param.kind not in (param.POSITIONAL_ONLY, param.POSITIONAL_OR_KEYWORD):
+                break
+            kind = param_kind(param, source.hints)
+            if kind is None:
+                supported = param.default is not inspect.Parameter.empty
+                break
+            kinds.append(kind)
+            if param.default is inspect.Parameter.empty:
+                required += 1
+
+        if supported:
+            apis.append((name, tuple(kinds), required))
+        else:
+            logger.debug(f"Skip {name}{signature}: cannot generate its arguments")
+    return apis
+
+
+def library_version(source: ApiSource) -> str:
+    """Identify the client library and the source, to redo the introspection when they change"""
+    package = import_module(source.cls.split(':')[0].split('.')[0])
+    version = getattr(package, "__version__", None) or f"{sys.version_info.major}.{sys.version_info.minor}"
+    config = zlib.crc32(repr((source.prefix, sorted(source.exclude), sorted(source.hints.items()))).encode())
+    return f"{CATALOG_VERSION}:{source.cls}:{version}:{config:08x}"
+
+
+def resolve_enum(path: str) -> type:
+    module_name, qualname = path.split(':')
+    obj: Any = import_module(module_name)
+    for attr in qualname.split('.'):
+        obj = getattr(obj, attr)
+    return obj
+
+
+class Catalog:
+    """The API calls of a protocol, with argument generators bound to the initial seed"""
+
+    def __init__(self, protocol: Protocol, apis: Sequence[Api], seed: Optional[Seed] = None) -> None:
+        self.protocol = protocol
+
+        # Argument prototypes taken from the seed: the hand-written values are far better than defaults
+        self.prototypes: Dict[str, List[Arg]] = {}
+        for fn in (seed.fns if seed is not None else []):
+            for arg in fn.args:
+                if (kind := arg_kind(arg)) is not None:
+                    self.prototypes.setdefault(kind, []).append(arg)
+
+        self.apis: List[Tuple[str, Tuple[Callable[[], Arg], ...], int]] = []
+        for name, kinds, required in apis:
+            try:
+                generators = tuple(self.generator(kind) for kind in kinds)
+            except Exception as e:
+                logger.debug(f"Skip {name}: {e}")
+                continue
+            self.apis.append((name, generators, required))
+
+    def generator(self, kind: str) -> Callable[[], Arg]:
+        """Build the generator of the arguments of the given kind"""
+        if prototypes := self.prototypes.get(kind, None):
+            return lambda: deepcopy(random.choice(prototypes))
+
+        if kind == "str":
+            return lambda: StringArg("test")
+        if kind == "int":
+            return lambda: NumberArg(1)
+        if kind == "float":
+            return lambda: NumberArg(1.0)
+        if kind == "bool":
+            return lambda: BooleanArg(random.random() < 0.5)
+        if kind == "callable":
+            return lambda: CallableArg(discard)
+        if kind == "file":
+            return lambda: PayloadArg(b"test")
+        if kind.startswith(("enum:", "value:")):
+            prefix, path = kind.split(':', 1)
+            members = list(resolve_enum(path))
+            return lambda: EnumArg(random.choice(members), use_value=prefix == "value")
+        raise ValueError(f"No generator for {kind} arguments")
+
+    def draw(self) -> Fn:
+        """A new API call of the protocol, with generated arguments"""
+        name, generators, required = random.choice(self.apis)
+        count = random.randint(required, len(generators))
+        return Fn(name, [generate() for generate in generators[:count]])
+
+    def names(self) -> List[str]:
+        return [name for name, _, _ in self.apis]
+
+    def __len__(self) -> int:
+        return len(self.apis)
+
+    @classmethod
+    def load(cls, protocol: Protocol, seed: Optional[Seed] = None, *, cache: bool = True) -> "Catalog":
+        """Load the catalog of the protocol, introspecting the client only when not persisted yet"""
+        source = SOURCES[protocol]
+        version = library_version(source)
+        path = PATH_CATALOG.joinpath(f"{protocol.name.lower()}.json")
+
+        apis: Optional[List[Api]] = None
+        if cache and path.exists():
+            try:
+                content = json.loads(path.read_text(encoding="utf-8"))
+                if content["version"] == version:
+                    apis = [(name, tuple(kinds), required) for name, kinds, required in content["apis"]]
+            except (ValueError, KeyError) as e:
+                logger.warning(f"Ignore the corrupted catalog {path}: {e}")
+
+        if apis is None:
+            apis = introspect(source)
+            logger.debug(f"Introspected {len(apis)} API calls of {source.cls}")
+            if cache:
+                PATH_CATALOG.mkdir(exist_ok=True)
+                path.write_text(json.dumps({"version": version, "apis": apis}, indent=1), encoding="utf-8")
+
+        return cls(protocol, apis, seed)
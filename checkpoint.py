@@ -0,0 +1,137 @@
+"""
+Checkpoint and restore of a fuzzing campaign.
+
+A checkpoint directory holds:
+- `queue`: the pickled queue seeds, each prefixed by its length. The queue only grows, so every
+  checkpoint appends the seeds queued since the previous one instead of rewriting it;
+- `state`: the rest of the fuzzer state (timer, coverage, models, statistics, RNG state), with the
+  number of seeds and bytes of `queue` it matches. It is written to a temporary file then renamed,
+  so that a checkpoint interrupted at any point leaves the previous one usable.
+
+The state is snapshot (pickled) by the fuzzing loop, then written and synced by a background thread.
+The thread only makes system calls on its own files (no logging, no buffered files), so that the
+executors forked meanwhile never inherit one of its locks.
+Only the queue is incremental: the snapshot pickles the whole state (coverage map, models), and its
+cost in the loop grows with them.
+"""
+from pathlib import Path
+from threading import Thread
+from typing import Any, Dict, List, Optional, Tuple
+import os
+import pickle
+import struct
+import time
+import logging
+
+from seed import Seed
+from seedstore import SeedStore
+
+
+logger = logging.getLogger("fazz.checkpoint")
+
+CHECKPOINT_VERSION = 1
+
+RECORD = struct.Struct("<I")  # length of a pickled seed in `queue`
+
+
+def fsync_write(path: Path, data: bytes, *, append: bool = False) -> None:
+    # raw file descriptors: the writer thread holds no lock of a buffered file when the executors fork
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | (os.O_APPEND if append else os.O_TRUNC), 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class Checkpointer:
+    """
+    Write the checkpoints of a campaign into `path`, continuing the checkpoint there with `resume`.
+    An existing checkpoint is only replaced with `overwrite`.
+    """
+
+    def __init__(self, path: Path, *, resume: bool = False, overwrite: bool = False) -> None:
+        self.path = path
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        # Seeds and bytes of the queue file covered by the last checkpoint started
+        self.seeds = 0
+        self.size = 0
+        state, queue = self.path.joinpath("state"), self.path.joinpath("queue")
+        if resume and state.exists():
+            self.seeds, self.size = pickle.loads(state.read_bytes())["queue"]
+            if queue.exists() and queue.stat().st_size > self.size:
+                os.truncate(queue, self.size)  # the seeds appended by an interrupted checkpoint
+        else:
+            if not overwrite and (state.exists() or queue.exists()):
+                raise FileExistsError(f"{self.path} holds a checkpoint, resume or overwrite it")
+            state.unlink(missing_ok=True)
+            queue.unlink(missing_ok=True)
+
+        self._writer: Optional[Thread] = None
+        self.written = 0
+        self.skipped = 0  # checkpoints skipped while the previous one was being written
+        self.elapsed = 0.0  # seconds of the fuzzing loop spent snapshotting
+
+    def save(self, state: Dict[str, Any], queue: SeedStore) -> bool:
+        """
+        Snapshot the state and the seeds queued since the last checkpoint, and write them in background.
+        Returns False (nothing done) while the previous checkpoint is still being written.
+        """
+        if self._writer is not None and self._writer.is_alive():
+            self.skipped += 1
+            return False
+
+        start = time.perf_counter()
+        records = b"".join(RECORD.pack(len(data)) + data
+                           for data in (queue.pickled(index) for index in range(self.seeds, len(queue))))
+        self.seeds, self.size = len(queue), self.size + len(records)
+        snapshot = pickle.dumps({"version": CHECKPOINT_VERSION, "queue": (self.seeds, self.size), "state": state},
+                                protocol=pickle.HIGHEST_PROTOCOL)
+        self.elapsed += time.perf_counter() - start
+
+        self._writer = Thread(target=self._write, args=(records, snapshot), name="checkpoint", daemon=True)
+        self._writer.start()
+        return True
+
+    def _write(self, records: bytes, snapshot: bytes) -> None:
+        # the queue is complete before the state refers to it
+        if records:
+            fsync_write(self.path.joinpath("queue"), records, append=True)
+        tmp = self.path.joinpath(".state.tmp")
+        fsync_write(tmp, snapshot)
+        os.replace(tmp, self.path.joinpath("state"))
+        self.written += 1
+
+    def wait(self) -> None:
+        """Wait for the checkpoint being written"""
+        if self._writer is not None:
+            self._writer.join()
+
+    @staticmethod
+    def load(path: Path) -> Tuple[Dict[str, Any], List[Seed]]:
+        """The fuzzer state and the queue seeds of the last complete checkpoint"""
+        content = pickle.loads(path.joinpath("state").read_bytes())
+        if content["version"] != CHECKPOINT_VERSION:
+            raise ValueError(f"Unsupported checkpoint version {content['version']}")
+        count, size = content["queue"]
+
+        # the seeds appended by an interrupted checkpoint are ignored
+        with path.joinpath("queue").open("rb") if size else open(os.devnull, "rb") as file:
+            data = file.read(size)
+
+        seeds: List[Seed] = []
+        offset = 0
+        while offset < size:
+            length, = RECORD.unpack_from(data, offset)
+            offset += RECORD.size
+            seeds.append(pickle.loads(data[offset:offset + length]))
+            offset += length
+        if len(seeds) != count:
+            raise ValueError(f"Corrupted checkpoint: {len(seeds)} seeds instead of {count}")
+        return content["state"], seeds
+
+    def __str__(self) -> str:
+        return f"checkpoints: {self.written} ({self.elapsed * 1000:.1f}ms in the loop)"
@@ -1,4 +1,6 @@
-from typing import Dict, Callable
+from typing import Dict, Callable, Tuple
+from functools import lru_cache
+from importlib import import_module
 import logging
 
 from utils import Addr
@@ -15,46 +17,91 @@ class Client:
     """
     timeout_connect = 5
 
+    # Builder method of each protocol, resolved once into `_builders`
+    builders: Dict[Protocol, str] = {
+        Protocol.FTP: "ftpclient",
+        Protocol.SMTP: "smtpclient",
+        Protocol.DNS: "dnsclient",
+        Protocol.DICOM: "dicomclient",
+    }
+    _builders: Dict[Protocol, Callable] = {}
+
+    # Client class of each protocol as `module:attribute`, imported once by `client_class`
+    classes: Dict[Protocol, str] = {
+        Protocol.FTP: "ftplib:FTP",
+        Protocol.SMTP: "smtplib:SMTP",
+        Protocol.DNS: "dns.resolver:Resolver",
+        Protocol.DICOM: "pynetdicom.ae:ApplicationEntity",
+    }
+
+    # What the clients negotiated with the target the first time (the accepted DICOM presentation contexts),
+    # requested as is by the later connections. Filled in the executors and reported back to the fuzzer.
+    negotiated: Dict[Protocol, Tuple] = {}
+
     @classmethod
     def new(cls, protocol: Protocol, addr: Addr) -> object:
         """Construct the client with the established connection to server"""
-        
-        client_map: Dict[Protocol, Callable] = {
-            Protocol.FTP: cls.ftpclient,
-            Protocol.SMTP: cls.smtpclient,
-            Protocol.DNS: cls.dnsclient,
-            Protocol.DICOM: cls.dicomclient,
-        }
-        
-        if (client_builder := client_map.get(protocol, None)) is None:
-            raise ClientNotFound(f"No such client for given protocol: {protocol.name}")
+        client_builder = cls.builder(protocol)
 
         logger.debug(f"Use {protocol.name} client")
         return client_builder(addr)
-    
+
+    @classmethod
+    def builder(cls, protocol: Protocol) -> Callable:
+        """Resolve the client builder of the given protocol"""
+        if (client_builder := cls._builders.get(protocol, None)) is None:
+            if (name := cls.builders.get(protocol, None)) is None:
+                raise ClientNotFound(f"No such client for given protocol: {protocol.name}")
+            client_builder = cls._builders[protocol] = getattr(cls, name)
+        return client_builder
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def client_class(protocol: Protocol) -> type:
+        """Import the client class of the given protocol, once per process"""
+        if (path := Client.classes.get(protocol, None)) is None:
+            raise ClientNotFound(f"No such client for given protocol: {protocol.name}")
+
+        module_name, attr = path.split(':')
+        try:
+            return getattr(import_module(module_name), attr)
+        except ImportError as e:
+            raise ClientNotInstalled(f"Client library of {protocol.name} is not installed: {e}")
+
+    @classmethod
+    def preload(cls, protocol: Protocol) -> None:
+        """
+        Resolve the builder and import the client library in the current process,
+        so that the forked executors inherit them instead of importing on every connection
+        """
+        cls.builder(protocol)
+        cls.client_class(protocol)
+        if protocol == Protocol.DICOM:
+            dicom_contexts()
+
     @classmethod
     def ftpclient(cls, addr: Addr):
-        from ftplib import FTP
-        client = FTP()
+        client = cls.client_class(Protocol.FTP)()
 
         for i in range(0, cls.timeout_connect):
             try:
                 client.connect(host=addr[0], port=addr[1])
+                break
             except:
                 if i + 1 == cls.timeout_connect:
                     raise ClientConnectFailed(f"Connection failed after {cls.timeout_connect} times.")
                 else:
                     logger.warning(f"FTP client failed to connect to server {i + 1} times.")
         return client
-        
+
     @classmethod
     def smtpclient(cls, addr: Addr):
-        from smtplib import SMTP
-        client = SMTP()
+        client = cls.client_class(Protocol.SMTP)()
 
         for i in range(0, cls.timeout_connect):
             try:
                 client.connect(host=addr[0], port=addr[1])
+                break
             except:
                 if i + 1 == cls.timeout_connect:
                     raise ClientConnectFailed(f"Connection failed after {cls.timeout_connect} times.")
@@ -64,22 +111,31 @@ class Client:
 
     @classmethod
     def dnsclient(cls, addr: Addr):
-        from dns.resolver import Resolver
-        
-        client = Resolver(configure=False)  # prevent it from reading /etc/resolve.conf
+        client = cls.client_class(Protocol.DNS)(configure=False)  # prevent it from reading /etc/resolve.conf
         client.nameservers = [addr[0]]
         client.port = addr[1]
         return client
-    
+
     @classmethod
     def dicomclient(cls, addr: Addr):
-        from pynetdicom.ae import ApplicationEntity
-        from pynetdicom.sop_class import uid_to_sop_class
-        from pynetdicom.presentation import VerificationPresentationContexts, QueryRetrievePresentationContexts
-
-        ae = ApplicationEntity()
-        ae.requested_contexts = [*VerificationPresentationContexts, *QueryRetrievePresentationContexts]
-        ae.add_requested_context("1.2.840.10008.5.1.4.1.1.2")  #CTImageStorage
+        ae = cls.client_class(Protocol.DICOM)()
+        if (accepted := cls.negotiated.get(Protocol.DICOM, None)) is not None:
+            # only request what the target accepted before, instead of every QR context
+            for abstract_syntax, transfer_syntax in accepted:
+                ae.add_requested_context(abstract_syntax, transfer_syntax)
+        else:
+            ae.requested_contexts = dicom_contexts()
+            ae.add_requested_context("1.2.840.10008.5.1.4.1.1.2")  #CTImageStorage
         client = ae.associate(addr[0], addr[1])
 
-        return client
\ No newline at end of file
+        if accepted is None and client.is_established and client.accepted_contexts:
+            cls.negotiated[Protocol.DICOM] = tuple((context.abstract_syntax, list(context.transfer_syntax))
+                                                   for context in client.accepted_contexts)
+        return client
+
+
+@lru_cache(maxsize=None)
+def dicom_contexts() -> Tuple:
+    """The presentation contexts requested by the DICOM client, built once per process"""
+    from pynetdicom.presentation import VerificationPresentationContexts, QueryRetrievePresentationContexts
+    return (*VerificationPresentationContexts, *QueryRetrievePresentationContexts)
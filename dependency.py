@@ -0,0 +1,143 @@
+"""
+Dependencies between API calls, learned from execution outcomes.
+
+An API call X depends on Y when X only ever succeeded after a successful Y, and failed
+often enough without one (`cwd` before `mkd`, `retrbinary` before `login`, `rcpt` before `mail`, ...).
+The mutators use the model to avoid (or repair) sequences predicted to fail, which would
+otherwise burn a whole server lifecycle for nothing.
+"""
+import logging
+from typing import Dict, Iterator, Optional, Set, Tuple
+
+from seed import Seed
+
+
+logger = logging.getLogger("fazz.dependency")
+
+
+def failed(code: int, ok: bool) -> bool:
+    """Whether an API call failed: it raised, or the server replied with a 4xx/5xx code"""
+    return not ok or 400 <= code < 600
+
+
+class DependencyModel:
+
+    def __init__(self, *, min_failures: int = 3, guiding: bool = False) -> None:
+        self.min_failures = min_failures  # failures without Y before X is said to depend on Y
+        self.guiding = guiding  # whether the mutators avoid the predicted failures, for the report
+
+        self.succ: Dict[str, int] = {}
+        self.fail: Dict[str, int] = {}
+        self.succ_with: Dict[str, Dict[str, int]] = {}     # X -> Y -> successes of X after Y succeeded
+        self.fail_without: Dict[str, Dict[str, int]] = {}  # X -> Y -> failures of X without Y before
+
+        self._requires: Dict[str, Set[str]] = {}  # cache, invalidated on every observation of X
+
+        # Only the executions observed once a dependency is learned can be judged wasted: the rate is
+        # measured from there, to compare the campaigns with the model guiding the mutators or not
+        self.executions = 0
+        self.learned_at: Optional[int] = None  # executions observed when the first dependency was learned
+        self.predicting = 0  # executions observed since
+        self.wasted = 0  # executions with a call failing because of a missing (learned) dependency
+
+    def outcomes(self, seed: Seed) -> Iterator[Tuple[str, bool]]:
+        """(API name, failed) of every API call run by the last execution of the seed"""
+        for fn, (code, ok) in zip(seed.fns, seed.trace):
+            yield fn.fn_name, failed(code, ok)
+
+    def observe(self, seed: Seed) -> bool:
+        """
+        Learn from the last execution of the seed
+
+        Returns True if the execution was wasted on a call whose dependencies were missing
+        """
+        if not seed.trace:
+            return False
+
+        # judge the execution with what was known before it
+        wasted = False
+        done: Set[str] = set()
+        for name, fail in self.outcomes(seed):
+            if fail and self.requires(name) - done:
+                wasted = True
+                break
+            if not fail:
+                done.add(name)
+
+        done = set()
+        for name, fail in self.outcomes(seed):
+            self._requires.pop(name, None)
+            if fail:
+                self.fail[name] = self.fail.get(name, 0) + 1
+                without = self.fail_without.setdefault(name, {})
+                for other in self.succ.keys() - done:
+                    without[other] = without.get(other, 0) + 1
+            else:
+                self.succ[name] = self.succ.get(name, 0) + 1
+                with_ = self.succ_with.setdefault(name, {})
+                for other in done:
+                    with_[other] = with_.get(other, 0) + 1
+                done.add(name)
+
+        self.executions += 1
+        if self.learned_at is not None:
+            self.predicting += 1
+        elif any(self.requires(name) for name in self.fail):  # only the calls which failed depend on others
+            self.learned_at = self.executions
+        self.wasted += wasted
+        return wasted
+
+    def requires(self, name: str) -> Set[str]:
+        """The API calls which must succeed before `name` to let it succeed"""
+        if (required := self._requires.get(name, None)) is not None:
+            return required
+
+        required = set()
+        if (succ := self.succ.get(name, 0)) > 0:
+            with_ = self.succ_with.get(name, {})
+            for other, failures in self.fail_without.get(name, {}).items():
+                if other != name and failures >= self.min_failures and with_.get(other, 0) == succ:
+                    required.add(other)
+        self._requires[name] = required
+        return required
+
+    def doomed(self, seed: Seed) -> Optional[int]:
+        """The position of the first API call predicted to fail for a missing dependency, if any"""
+        done: Set[str] = set()
+        for position, fn in enumerate(seed.fns):
+            if self.requires(fn.fn_name) - done:
+                return position
+            done.add(fn.fn_name)
+            if fn.is_last:
+                break
+        return None
+
+    def repair(self, seed: Seed) -> bool:
+        """
+        Move the missing dependencies found later in the seed before the calls needing them
+
+        Returns True if the seed is no longer predicted to fail
+        """
+        for _ in range(seed.len()):
+            if (position := self.doomed(seed)) is None:
+                return True
+
+            done = {fn.fn_name for fn in seed.fns[:position]}
+            missing = self.requires(seed[position].fn_name) - done
+            later = [i for i in range(position + 1, seed.len()) if seed[i].fn_name in missing]
+            if not later:
+                return False
+            seed.fns.insert(position, seed.fns.pop(later[0]))
+        return self.doomed(seed) is None
+
+    @property
+    def wasted_ratio(self) -> float:
+        """The share of the executions wasted, since the model predicts"""
+        return self.wasted / self.predicting if self.predicting else 0.0
+
+    def __str__(self) -> str:
+        mode = "on" if self.guiding else "off"
+        if self.learned_at is None:
+            return f"wasted (deps {mode}): no dependency learned in {self.executions} executions"
+        return (f"wasted (deps {mode}): {self.wasted}/{self.predicting} ({self.wasted_ratio:.1%}) "
+                f"since execution {self.learned_at}")
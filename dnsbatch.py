@@ -0,0 +1,267 @@
+"""
+High-rate DNS execution: thousands of queries per server lifetime.
+
+Resolving one name per server start wastes the whole lifecycle on a single packet. The batch engine
+turns the `resolve` calls of a seed into wire-format queries (`dns.message`), derives `variants`
+header-mutated copies of each, and sends them all over one non-blocking UDP socket, in batches of
+`sendmmsg`/`recvmmsg` where the libc has them. Responses are matched to the queries by ID.
+The variants are derived from the content of the seed, so that an interesting seed replays the same batch.
+"""
+import ctypes
+import ctypes.util
+import errno
+import os
+import random
+import select
+import socket
+import struct
+import time
+import zlib
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from utils import Addr
+from seed import Seed, CODE_FAILED
+
+
+logger = logging.getLogger("fazz.dnsbatch")
+
+HEADER = struct.Struct("!HHHHHH")  # id, flags, qdcount, ancount, nscount, arcount
+
+MSG_DONTWAIT = 0x40
+
+# Flag bits of the header: QR, AA, TC, RD, RA, Z, AD, CD
+FLAG_BITS = (15, 10, 9, 8, 7, 6, 5, 4)
+
+
+class _iovec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+
+class _msghdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p), ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(_iovec)), ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p), ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+
+class _mmsghdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", _msghdr), ("msg_len", ctypes.c_uint)]
+
+
+_libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+HAS_MMSG = hasattr(_libc, "sendmmsg") and hasattr(_libc, "recvmmsg")
+
+
+def mutate_header(query: bytearray, rng: random.Random) -> bytearray:
+    """Mutate the header (and the question type/class) of a wire-format query in place"""
+    _, flags, *counts = HEADER.unpack_from(query)
+    choice = rng.randrange(6)
+    if choice == 0:    # flip a flag
+        flags ^= 1 << rng.choice(FLAG_BITS)
+    elif choice == 1:  # opcode
+        flags = (flags & ~(0xF << 11)) | (rng.randrange(16) << 11)
+    elif choice == 2:  # rcode set by a client
+        flags = (flags & ~0xF) | rng.randrange(16)
+    elif choice == 3:  # a section count disagreeing with the message
+        counts[rng.randrange(4)] = rng.choice((0, 1, 2, 0xFFFF))
+    elif choice == 4 and len(query) >= HEADER.size + 4:  # question type and class
+        query[-4:] = struct.pack("!HH", rng.randrange(0x10000), rng.choice((1, 3, 4, 254, 255, rng.randrange(0x10000))))
+    else:              # truncated message
+        del query[rng.randrange(HEADER.size, len(query) + 1):]
+    HEADER.pack_into(query, 0, 0, flags, *counts)
+    return query
+
+
+def query_wire(fn) -> Optional[bytes]:
+    """The wire-format query sent by a `resolve`/`resolve_address` call, None for the other calls"""
+    import dns.message
+    import dns.reversename
+
+    args = [arg.unpack() for arg in fn.args]
+    try:
+        if fn.fn_name == "resolve" and args:
+            return dns.message.make_query(args[0], *args[1:3]).to_wire()
+        if fn.fn_name == "resolve_address" and args:
+            return dns.message.make_query(dns.reversename.from_address(args[0]), "PTR").to_wire()
+    except Exception as e:
+        logger.debug(f"Cannot build the query of {fn}: {e}")
+    return None
+
+
+class BatchSocket:
+    """A connected non-blocking UDP socket sending and receiving datagrams by batches"""
+
+    def __init__(self, addr: Addr, *, vlen: int = 64, bufsize: int = 4096) -> None:
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.connect(addr)
+        self.sock.setblocking(False)
+        self.vlen = vlen
+        self.bufsize = bufsize
+
+        self.mmsg = HAS_MMSG
+        if self.mmsg:
+            self._buffers = [ctypes.create_string_buffer(bufsize) for _ in range(vlen)]
+            self._recv_iovs = (_iovec * vlen)(*[_iovec(ctypes.addressof(buf), bufsize) for buf in self._buffers])
+            self._recv_msgs = (_mmsghdr * vlen)()
+            for i in range(vlen):
+                self._recv_msgs[i].msg_hdr.msg_iov = ctypes.pointer(self._recv_iovs[i])
+                self._recv_msgs[i].msg_hdr.msg_iovlen = 1
+
+    def send(self, packets: Sequence[bytes]) -> int:
+        """Send the packets, waiting while the socket buffer is full. Returns the number sent"""
+        sent = refused = 0
+        while sent < len(packets):
+            try:
+                sent += self._send(packets[sent:sent + self.vlen])
+                refused = 0
+            except BlockingIOError:
+                select.select([], [self.sock], [], 1.0)
+            except ConnectionRefusedError:
+                # an ICMP error of a previous datagram, unless nothing listens at all (refused in a row)
+                if (refused := refused + 1) > self.vlen:
+                    raise
+        return sent
+
+    def _send(self, packets: Sequence[bytes]) -> int:
+        if not self.mmsg:
+            self.sock.send(packets[0])
+            return 1
+
+        buffers = [ctypes.create_string_buffer(packet, len(packet)) for packet in packets]
+        iovs = (_iovec * len(packets))(*[_iovec(ctypes.addressof(buf), len(packet))
+                                         for buf, packet in zip(buffers, packets)])
+        msgs = (_mmsghdr * len(packets))()
+        for i in range(len(packets)):
+            msgs[i].msg_hdr.msg_iov = ctypes.pointer(iovs[i])
+            msgs[i].msg_hdr.msg_iovlen = 1
+
+        count = _libc.sendmmsg(self.sock.fileno(), msgs, len(packets), MSG_DONTWAIT)
+        if count < 0:
+            code = ctypes.get_errno()
+            if code in (errno.EAGAIN, errno.EWOULDBLOCK):
+                raise BlockingIOError(code, os.strerror(code))
+            if code == errno.ECONNREFUSED:
+                raise ConnectionRefusedError(code, os.strerror(code))
+            raise OSError(code, os.strerror(code))
+        return count
+
+    def recv(self) -> List[bytes]:
+        """The datagrams available now"""
+        received: List[bytes] = []
+        while True:
+            try:
+                if not self.mmsg:
+                    received.append(self.sock.recv(self.bufsize))
+                    continue
+
+                count = _libc.recvmmsg(self.sock.fileno(), self._recv_msgs, self.vlen, MSG_DONTWAIT, None)
+                if count < 0:
+                    code = ctypes.get_errno()
+                    if code == errno.ECONNREFUSED:
+                        continue
+                    break
+                received.extend(self._buffers[i].raw[:self._recv_msgs[i].msg_len] for i in range(count))
+                if count < self.vlen:
+                    break
+            except ConnectionRefusedError:
+                continue
+            except BlockingIOError:
+                break
+        return received
+
+    def wait(self, timeout: float) -> bool:
+        """Wait for a datagram to read"""
+        readable, _, _ = select.select([self.sock], [], [], timeout)
+        return bool(readable)
+
+    def close(self) -> None:
+        self.sock.close()
+
+
+class DNSBatchEngine:
+    """
+    Execute DNS seeds as batches of queries: every `resolve` call is sent as is, followed by
+    `variants` header-mutated copies.
+    """
+
+    def __init__(self, *, variants: int = 1000, window: int = 256, timeout: float = 0.2) -> None:
+        self.variants = variants
+        self.window = window    # queries in flight
+        self.timeout = timeout  # waiting for the responses of a window once the target is silent
+
+        # queries of the whole campaign: the engine runs in the executors, which report them back
+        self.sent = 0
+        self.answered = 0
+
+    def queries(self, seed: Seed) -> Tuple[List[Optional[bytes]], List[bytes]]:
+        """The query of each API call of the seed, and the header-mutated variants"""
+        rng = random.Random(zlib.crc32(str(seed).encode()))
+        bases = [query_wire(fn) for fn in seed.fns]
+        candidates = [base for base in bases if base is not None]
+
+        variants: List[bytes] = []
+        for _ in range(self.variants if candidates else 0):
+            query = bytearray(rng.choice(candidates))
+            for _ in range(rng.randint(1, 3)):
+                mutate_header(query, rng)
+            variants.append(bytes(query))
+        return bases, variants
+
+    def send(self, sock: BatchSocket, queries: Sequence[bytes]) -> List[Optional[bytes]]:
+        """Send the queries, returning the response to each of them (None when unanswered)"""
+        responses: List[Optional[bytes]] = [None] * len(queries)
+        # The ID of a query is its index (modulo 2^16), unique for the lifetime of the server: a late
+        # response of a previous window is still credited to its own query
+        unanswered: Dict[int, int] = {}  # ID -> index of the query
+        for start in range(0, len(queries), self.window):
+            window = queries[start:start + self.window]
+            packets = []
+            for index, query in enumerate(window, start):
+                packet = bytearray(query)
+                if len(packet) >= 2:
+                    packet[0:2] = struct.pack("!H", index & 0xFFFF)
+                    unanswered[index & 0xFFFF] = index  # replacing the query sent 2^16 queries earlier
+                packets.append(bytes(packet))
+
+            sock.send(packets)
+            self.sent += len(packets)
+
+            deadline = time.perf_counter() + self.timeout
+            while any(responses[index] is None for index in range(start, start + len(window))) \
+                    and sock.wait(max(0.0, deadline - time.perf_counter())):
+                for response in sock.recv():
+                    if len(response) >= 2 and (index := unanswered.pop(struct.unpack_from("!H", response)[0], None)) is not None:
+                        responses[index] = response
+                        self.answered += 1
+                deadline = time.perf_counter() + self.timeout
+        return responses
+
+    def execute(self, seed: Seed, addr: Addr) -> List[Tuple[int, bool]]:
+        """
+        Execute the seed against the target at `addr`
+
+        Returns the trace of the seed: (rcode, answered) of the query of every API call
+        """
+        bases, variants = self.queries(seed)
+        sock = BatchSocket(addr)
+        try:
+            responses = self.send(sock, [base for base in bases if base is not None] + variants)
+        finally:
+            sock.close()
+
+        trace: List[Tuple[int, bool]] = []
+        answers = iter(responses)
+        for base in bases:
+            response = next(answers) if base is not None else None
+            if response is None or len(response) < HEADER.size:
+                trace.append((CODE_FAILED, False))
+            else:
+                trace.append((HEADER.unpack_from(response)[1] & 0xF, True))
+        logger.debug(f"Sent {len(bases) + len(variants)} queries, {sum(r is not None for r in responses)} answered")
+        return trace
+
+    def __str__(self) -> str:
+        return f"dns: {self.sent} queries, {self.answered / max(self.sent, 1):.1%} answered"
@@ -1,3 +1,6 @@
+from typing import Optional
+
+
 class FAException(Exception):
     pass
 
@@ -17,7 +20,16 @@ class FnException(FAException):
 
 class FnExecFailed(FnException):
     """Throw this exception when the client fails to execute the given API call"""
-    pass
+    def __init__(self, *args, code: Optional[int] = None) -> None:
+        super().__init__(*args)
+        self.code = code  # the reply code of the server, if any
+
+
+class FnTimeout(FnExecFailed):
+    """Throw this exception when the API call misses its deadline"""
+    def __init__(self, *args, category: str = "call") -> None:
+        super().__init__(*args)
+        self.category = category  # "call": the call stalled, "budget": the seed ran out of time
 
 
 class FnNotFound(FnException):
@@ -52,6 +64,16 @@ class ServerAbnormallyExited(ServerException):
     pass
 
 
+class ServerResetFailed(ServerException):
+    """Throw this exception when the working directory of the server cannot be restored"""
+    pass
+
+
+class ServerIsolationFailed(ServerException):
+    """Throw this exception when the server cannot be started in (or joined through) its own namespaces"""
+    pass
+
+
 """
 Exceptions related to Server
 """
@@ -0,0 +1,133 @@
+"""
+Favored seeds: the smallest set of queue seeds reaching everything the queue reached (AFL `cull_queue`).
+
+Every coverage element (line or branch) gets a dense id, and the coverage of a seed becomes a bitset
+of its elements, kept zlib-compressed and unpacked into a Python int when culling. The `top_rated`
+table holds the best seed of every element, the fastest and smallest (latency x API calls). It is
+updated as the seeds are queued, and the favored set is recomputed from it only when it changed, one
+bitset operation per favored seed. Only the seeds holding at least one element keep their bitset.
+"""
+from array import array
+from typing import Dict, Hashable, List, Sequence
+import random
+import zlib
+import logging
+
+from gcov import Coverage
+from seed import Seed
+
+
+logger = logging.getLogger("fazz.favored")
+
+NO_SEED = -1
+
+
+def pack(bits: bytes) -> bytes:
+    return zlib.compress(bits, 1)
+
+
+def unpack(data: bytes) -> int:
+    return int.from_bytes(zlib.decompress(data), "little")
+
+
+class TopRated:
+    """The best seed of every coverage element and the favored seeds derived from them"""
+
+    def __init__(self, *, favored_rate: float = 0.9) -> None:
+        self.favored_rate = favored_rate  # share of the seeds scheduled taken among the favored ones
+
+        self.ids: Dict[Hashable, int] = {}     # coverage element -> id
+        self.top = array('i')                  # element id -> queue index of its best seed
+        self.scores = array('d')               # queue index -> score (lower is better)
+        self.bits: Dict[int, bytes] = {}       # queue index -> compressed bitset, for the seeds in `top`
+        self.refs: Dict[int, int] = {}         # queue index -> elements it is the best seed of
+
+        self.favored: List[int] = []
+        self.changed = False
+
+    def element_ids(self, cov: Coverage) -> List[int]:
+        """The ids of the elements of a coverage, allocating them to the elements never seen"""
+        ids: List[int] = []
+        for element in (*cov.lines, *cov.branches):
+            if (id_ := self.ids.get(element, None)) is None:
+                id_ = self.ids[element] = len(self.ids)
+                self.top.append(NO_SEED)
+            ids.append(id_)
+        return ids
+
+    @staticmethod
+    def bitset(ids: Sequence[int]) -> bytes:
+        """The little-endian bitset of the ids, built bytewise (big int operations are linear in its size)"""
+        bits = bytearray((max(ids) >> 3) + 1 if ids else 0)
+        for id_ in ids:
+            bits[id_ >> 3] |= 1 << (id_ & 7)
+        return bytes(bits)
+
+    def add(self, index: int, seed: Seed) -> bool:
+        """Rate the seed queued at `index`, returning whether it became the best seed of any element"""
+        while len(self.scores) <= index:
+            self.scores.append(float("inf"))
+        if seed.coverage is None:
+            return False
+
+        score = self.scores[index] = (seed.exec_time or 1.0) * max(1, seed.len())
+        ids = self.element_ids(seed.coverage)
+
+        won = 0
+        for id_ in ids:
+            if (current := self.top[id_]) != NO_SEED and self.scores[current] <= score:
+                continue
+            if current != NO_SEED:
+                self.refs[current] -= 1
+                if self.refs[current] == 0:
+                    del self.refs[current]
+                    del self.bits[current]  # beaten everywhere, its bitset is useless
+            self.top[id_] = index
+            won += 1
+
+        if won:
+            self.refs[index] = won
+            self.bits[index] = pack(self.bitset(ids))
+            self.changed = True
+        return won > 0
+
+    def cull(self) -> List[int]:
+        """Recompute the favored seeds if the table changed: the best seeds covering every element"""
+        if not self.changed:
+            return self.favored
+
+        favored: List[int] = []
+        remaining = (1 << len(self.ids)) - 1
+        while remaining:
+            id_ = (remaining & -remaining).bit_length() - 1
+            if (index := self.top[id_]) == NO_SEED:
+                remaining &= ~(1 << id_)
+                continue
+            favored.append(index)
+            remaining &= ~unpack(self.bits[index])
+        self.favored = favored
+        self.changed = False
+        logger.debug(f"{len(favored)} favored seeds out of {len(self.scores)}")
+        return favored
+
+    def select(self, queue: Sequence[Seed], n: int) -> List[Seed]:
+        """
+        Choose `n` distinct seeds to mutate, about `favored_rate` of them among the favored ones,
+        the others among the rest of the queue (the whole queue when it holds at most `n` seeds)
+        """
+        if len(queue) <= n:
+            return list(queue)
+
+        favored = self.cull()
+        chosen = random.sample(favored, min(round(n * self.favored_rate), len(favored)))
+        taken = set(chosen)
+        others = len(queue) - len(taken)
+        # draw the others by rejection: the queue may be too large to list the seeds not taken
+        while len(chosen) < n and others > 0:
+            if (index := random.randrange(len(queue))) not in taken:
+                taken.add(index)
+                chosen.append(index)
+        return [queue[index] for index in chosen]
+
+    def __str__(self) -> str:
+        return f"favored: {len(self.cull())}/{len(self.scores)}"
@@ -0,0 +1,40 @@
+"""Cheap feedback from the replies of the server"""
+import random
+import logging
+from typing import Set, Tuple
+
+
+logger = logging.getLogger("fazz.feedback")
+
+
+class ResponseFilter:
+    """
+    Pre-filter in front of the (expensive) coverage collection.
+
+    The sequence of reply codes of an execution tells which paths of the server ran almost for free.
+    The coverage is only collected when the sequence was never seen, or for a sampled
+    fraction `sample_rate` of the other executions.
+    """
+
+    def __init__(self, sample_rate: float = 0.1) -> None:
+        self.sample_rate = sample_rate
+        self.traces: Set[Tuple[int, ...]] = set()
+
+        self.collected = 0
+        self.skipped = 0
+
+    def should_collect(self, codes: Tuple[int, ...]) -> bool:
+        if codes not in self.traces:
+            self.traces.add(codes)
+            collect = True
+        else:
+            collect = random.random() < self.sample_rate
+
+        if collect:
+            self.collected += 1
+        else:
+            self.skipped += 1
+        return collect
+
+    def __str__(self) -> str:
+        return f"traces: {len(self.traces)}; skipped: {self.skipped}/{self.collected + self.skipped}"
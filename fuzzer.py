@@ -1,16 +1,36 @@
 import time
+import random
 from colorama import Style, Fore
-from typing import List
+from typing import Any, Counter, Deque, Dict, Optional, Tuple
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import Future, ThreadPoolExecutor
+from multiprocessing.connection import Connection
+from pathlib import Path
 import argparse
 import logging
 import multiprocessing as mp
+import threading
 
 from mutator import MutExecutor
 from protocol import new_seed, Protocol
 from seed import Seed, SeedStatus
 from server import Target, ServerBuilder
-from utils import get_local_time, PATH_LOG, format_time, PATH_SEED, Timer
+from utils import get_local_time, PATH_LOG, format_time, PATH_SEED, Timer, TimeoutCalibrator
 from client import Client
+from gcov import Coverage, GcovCollector, CoverageMap
+from feedback import ResponseFilter
+from state import StateModel
+from dependency import DependencyModel
+from catalog import Catalog
+from wire import Recorder, Replayer, Trace
+from dnsbatch import DNSBatchEngine
+from smtppipeline import SMTPPipeline
+from seedstore import SeedStore
+from sync import SyncDir
+from checkpoint import Checkpointer
+from profiler import SamplingProfiler
+from favored import TopRated
 from exception import SeedDryRunTimeout, ServerAbnormallyExited
 
 
@@ -21,58 +41,265 @@ PATH_SEED.mkdir(exist_ok=True)
 
 class Fuzzer:
 
-    def __init__(self: "Fuzzer", protocol: str, target: Target, *, timeout: int = 1, log: bool = False, timeout_testcase: float = 2.0) -> None:
+    def __init__(self: "Fuzzer", protocol: str, target: Target, *, timeout: int = 1, log: bool = False, timeout_testcase: float = 2.0,
+                 timeout_verify: Optional[float] = None, calibration_runs: int = 5, per_exec_cov: bool = False,
+                 pipeline: bool = False, response_filter: Optional[float] = None, state_aware: bool = False,
+                 dependency: bool = False, insert: bool = False, splice: bool = False, havoc: bool = False,
+                 replay_calibration: bool = False, dns_batch: int = 0, smtp_pipeline: bool = False,
+                 queue_memory: int = 256, sync_dir: Optional[Path] = None, sync_name: str = "main",
+                 sync_main: bool = True, sync_interval: int = 10, checkpoint: Optional[Path] = None,
+                 checkpoint_interval: int = 50, resume: bool = False, checkpoint_overwrite: bool = False,
+                 timeout_call: Optional[float] = None, timeout_budget: Optional[float] = None,
+                 timeout_policy: str = "continue", profile: Optional[Path] = None, favored: bool = False) -> None:
         self.protocol: Protocol = Protocol.new(protocol)
-        self.queue: List[Seed] = [new_seed(self.protocol)]
+        # Seeds beyond `queue_memory` MB are spilled to disk and loaded back when scheduled
+        self.queue: SeedStore = SeedStore([new_seed(self.protocol)], memory_limit=queue_memory * 1024 * 1024)
+        Client.preload(self.protocol)  # forked executors inherit the imported client library
 
         # Timeout
         self.timeout = timeout
         self.timeout_testcase = timeout_testcase
+        self.calibrator = TimeoutCalibrator(timeout_testcase, upper=timeout_verify or timeout_testcase * 5)
+        self.calibration_runs = calibration_runs
+        self.replay_calibration = replay_calibration  # replay the wire trace of the first calibration run
+
+        # Socket deadline of every api call and time budget of the whole seed, failing fast instead of
+        # waiting for the executor to be killed. After a missed deadline, the rest of the seed runs
+        # ("continue") or not ("abort")
+        if timeout_policy not in ("continue", "abort"):
+            raise ValueError(f"No such timeout policy: {timeout_policy}")
+        self.timeout_call = timeout_call
+        self.timeout_budget = timeout_budget
+        self.timeout_policy = timeout_policy
+        self.timeouts: Counter[str] = Counter()  # executions missing a deadline by category ("process": killed)
+
+        # Wire trace of the last execution run with `record`
+        self.wire: Optional[Trace] = None
 
         # Coverage
         self.line_cov = 0
         self.branch_cov = 0
 
+        # Per-execution coverage (otherwise, the cumulative coverage reported by gcovr)
+        self.gcov: Optional[GcovCollector] = GcovCollector() if per_exec_cov else None
+        self.cov_map = CoverageMap()
+
+        # Pipelining: the coverage of execution N is analyzed by a background worker while
+        # execution N+1 runs, which needs the per-execution coverage
+        if pipeline and self.gcov is None:
+            logger.warning("Pipelining needs per-execution coverage, run without pipelining")
+        self.analyzer: Optional[ThreadPoolExecutor] = \
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix="analyzer") if pipeline and self.gcov is not None else None
+        self.pending: Deque[Tuple[Seed, int, Future]] = deque()
+        # Held while forking the executors and the servers, and by the analyzer while it logs or updates the
+        # campaign state: a child forked while the analyzer holds a lock (logging, stdio) would deadlock on it
+        self.fork_lock = threading.Lock()
+
+        # Only collect the coverage of executions with a new reply code sequence
+        # (or of a sampled fraction `response_filter` of the others). Needs the per-execution coverage:
+        # the cumulative counters of the skipped executions would be credited to the next analyzed one
+        if response_filter is not None and self.gcov is None:
+            logger.warning("The response filter needs per-execution coverage, run without filtering")
+        self.response_filter: Optional[ResponseFilter] = \
+            ResponseFilter(response_filter) if response_filter is not None and self.gcov is not None else None
+
+        # Protocol state model inferred from the reply codes, driving the seed selection
+        self.state_model: Optional[StateModel] = StateModel() if state_aware else None
+
+        # Dependencies between API calls learned from the reply codes. The model always learns
+        # (to report the executions wasted on missing dependencies) but only guides the
+        # structural mutators with `dependency`
+        self.deps = DependencyModel(guiding=dependency)
+
+        # DNS: send `dns_batch` header-mutated queries per server lifetime instead of one resolution
+        if dns_batch and self.protocol != Protocol.DNS:
+            logger.warning("Batched queries are only supported by DNS, run without batching")
+        self.dns_engine: Optional[DNSBatchEngine] = \
+            DNSBatchEngine(variants=dns_batch) if dns_batch and self.protocol == Protocol.DNS else None
+
+        # SMTP: pipeline the commands over a raw socket instead of one `smtplib` round trip per API call
+        if smtp_pipeline and self.protocol != Protocol.SMTP:
+            logger.warning("Pipelined execution is only supported by SMTP, run without pipelining")
+        self.smtp_pipeline: Optional[SMTPPipeline] = \
+            SMTPPipeline(timeout=timeout_testcase) if smtp_pipeline and self.protocol == Protocol.SMTP else None
+
+        # Corpus shared with the other instances through `sync_dir`, imported every `sync_interval` epochs
+        self.sync: Optional[SyncDir] = SyncDir(sync_dir, sync_name, main=sync_main) if sync_dir is not None else None
+        if sync_interval <= 0:
+            raise ValueError(f"The sync interval must be positive, not {sync_interval}")
+        self.sync_interval = sync_interval
+
+        # Favored seeds: the best (fastest and smallest) seed of every coverage element, scheduled most of
+        # the time. Needs the coverage of every seed
+        if favored and self.gcov is None:
+            logger.warning("Favored seeds need per-execution coverage, run without favoring")
+        self.top_rated: Optional[TopRated] = TopRated() if favored and self.gcov is not None else None
+
         self.target: Target = target  # Server tested
-        self.mut_executor = MutExecutor()
+        self.target.spawn_lock = self.fork_lock
+        # API calls inserted by the mutator, loaded (or built) only when the insertion is enabled
+        self.catalog: Optional[Catalog] = Catalog.load(self.protocol, self.queue[0]) if insert else None
+        self.mut_executor = MutExecutor(state_model=self.state_model, deps=self.deps if dependency else None,
+                                        catalog=self.catalog, splice=splice, havoc=havoc, favored=self.top_rated)
 
         # Recoring
         self.log = self.create_log() if log else None
         self.timer = Timer()
         self.start_time = 0.0
 
-    def execute(self, seed: Seed):
-        obj = Client.new(self.protocol, self.target.addr)
-        seed.execute(obj)
+        # Checkpoints of the campaign written to `checkpoint` every `checkpoint_interval` epochs,
+        # restored from there with `resume`, replacing the checkpoint there only with `checkpoint_overwrite`
+        if checkpoint_interval <= 0:
+            raise ValueError(f"The checkpoint interval must be positive, not {checkpoint_interval}")
+        if resume:
+            if checkpoint is None:
+                raise ValueError("Resuming needs the checkpoint directory")
+            self.restore(checkpoint)
+        self.checkpointer: Optional[Checkpointer] = \
+            Checkpointer(checkpoint, resume=resume, overwrite=checkpoint_overwrite) if checkpoint is not None else None
+        self.checkpoint_interval = checkpoint_interval
+
+        # Sampling profiler of the fuzzing loop and of the executors, writing into `profile`
+        self.profiler: Optional[SamplingProfiler] = SamplingProfiler(profile) if profile is not None else None
+
+    def execute(self, seed: Seed, conn: Optional[Connection] = None, record: bool = False, wire: Optional[bytes] = None):
+        if self.profiler is not None and conn is not None:
+            self.profiler.start_executor()
+        try:
+            self.target.enter()
+            recorder = Recorder(self.protocol.name, self.target.addr[1]) if record else None
+
+            if wire is not None:
+                # replay the bytes of a recorded execution without the client
+                seed.trace = Replayer(Trace.from_bytes(wire), self.target.addr, read_timeout=self.calibrator.timeout).replay()
+                seed.succ_count = sum(ok for _, ok in seed.trace)
+                seed.fail_count = len(seed.trace) - seed.succ_count
+            elif self.dns_engine is not None:
+                seed.trace = self.dns_engine.execute(seed, self.target.addr)
+                seed.succ_count = sum(ok for _, ok in seed.trace)
+                seed.fail_count = len(seed.trace) - seed.succ_count
+            elif self.smtp_pipeline is not None and not record and self.smtp_pipeline.supports(seed):
+                seed.trace = self.smtp_pipeline.execute(seed, self.target.addr, timeout=self.calibrator.timeout)
+                seed.succ_count = sum(ok for _, ok in seed.trace)
+                seed.fail_count = len(seed.trace) - seed.succ_count
+            else:
+                with recorder if recorder is not None else nullcontext():
+                    obj = Client.new(self.protocol, self.target.addr)
+                    seed.execute(obj, before=recorder.begin if recorder is not None else None, deadline=self.timeout_call,
+                                 budget=self.timeout_budget, abort=self.timeout_policy == "abort")
+
+            # the execution runs in a child process, report what the parent wants to know
+            if conn is not None:
+                recorded = recorder.trace.to_bytes() if recorder is not None else None
+                # the counters of the DNS engine, inherited from the parent then updated by this execution
+                queries = (self.dns_engine.sent, self.dns_engine.answered) if self.dns_engine is not None else None
+                conn.send((seed.trace, seed.succ_count, seed.fail_count, seed.timeout_category, recorded, Client.negotiated, queries))
+        finally:
+            # also when the execution fails; executors killed on timeout write their samples on SIGTERM
+            if self.profiler is not None and conn is not None:
+                self.profiler.stop_executor()
+
+    def run(self: "Fuzzer", seed: Seed, timeout: float, prefix: Optional[Path] = None, *,
+            record: bool = False, wire: Optional[Trace] = None) -> Optional[float]:
+        """
+        Execute one seed against a fresh server instance, writing its coverage counters under `prefix`.
+        With `record`, the wire trace of the execution is kept in `self.wire`; with `wire`, the given
+        trace is replayed instead of executing the seed.
+
+        Returns the execution latency, or None if the execution timeouts
+        """
+        self.target.env = GcovCollector.environ(prefix) if prefix is not None else {}
 
-    def fuzz_one(self: "Fuzzer", seed: Seed) -> SeedStatus:
-        '''
-        Execute one seed with coverage guided, return true if the seed is interesting
-        
-        Returns True is the seed is interesting, otherwise False
-        '''
         # Start the server
         with self.target as proc:
             time.sleep(0.1)
 
-            timeout = False
-
-            with self.timer:  # Only count in the actual execution time
-                exe_thread = mp.Process(target=self.execute, args=[seed,])
-                exe_thread.start()
-                exe_thread.join(timeout=self.timeout_testcase)
+            reader, writer = mp.Pipe(duplex=False)
+            try:
+                with self.timer:  # Only count in the actual execution time
+                    exe_thread = mp.Process(target=self.execute,
+                                            args=[seed, writer, record, wire.to_bytes() if wire is not None else None])
+                    with self.fork_lock:
+                        start = time.perf_counter()
+                        exe_thread.start()
+                    exe_thread.join(timeout=timeout)
+
+                    if exe_thread.is_alive():
+                        exe_thread.terminate()
+                        return None
+
+                    latency = seed.exec_time = time.perf_counter() - start
+
+                if reader.poll():
+                    seed.trace, seed.succ_count, seed.fail_count, seed.timeout_category, recorded, negotiated, queries = reader.recv()
+                    Client.negotiated.update(negotiated)  # inherited by the next executors
+                    if queries is not None:
+                        self.dns_engine.sent, self.dns_engine.answered = queries
+                    if recorded is not None:
+                        self.wire = Trace.from_bytes(recorded)
+                return latency
+            finally:
+                reader.close()
+                writer.close()
+
+    def calibrate(self: "Fuzzer", seed: Seed) -> None:
+        """
+        Run the seed several times to derive the testcase timeout from its latencies.
+        With `replay_calibration`, only the first run uses the client and the others replay its wire trace.
+        """
+        wire: Optional[Trace] = None
+        for i in range(self.calibration_runs):
+            prefix = self.new_execution()
+            record = self.replay_calibration and i == 0
+            latency = self.run(seed, self.calibrator.timeout_verify, prefix, record=record, wire=wire)
+            if record and self.wire is not None and len(self.wire) > 0:
+                wire = self.wire
+            if prefix is not None:
+                GcovCollector.discard(prefix)
+
+            if latency is None:
+                raise SeedDryRunTimeout("The initial seed given is timeout")
+            self.calibrator.record(latency)
+        logger.debug(f"Calibrated testcase timeout: {self.calibrator.timeout:.3f}s")
+
+    def new_execution(self: "Fuzzer") -> Optional[Path]:
+        """The coverage prefix of the next execution, None without per-execution coverage"""
+        return self.gcov.new_execution() if self.gcov is not None else None
+
+    def execute_one(self: "Fuzzer", seed: Seed) -> Tuple[Optional[float], Optional[Path]]:
+        """
+        Execute one seed, re-verifying a timeout with the longer limit
 
-                if exe_thread.is_alive():
-                    exe_thread.terminate()
-                    timeout = True
+        Returns the latency (None if the execution timeouts) and the coverage prefix of the execution
+        """
+        prefix = self.new_execution()
+        latency = self.run(seed, self.calibrator.timeout, prefix)
 
         # Stop the server and check the exit status TODO: crash handler
 
-        if timeout:
-            logger.debug("Seed execution timeouts...")
-            return SeedStatus.Timeout
+        if latency is None:
+            # Re-verify with the longer timeout before labeling the seed a hang
+            logger.debug("Seed execution timeouts, re-verifying...")
+            if prefix is not None:
+                GcovCollector.discard(prefix)
+                prefix = self.new_execution()
+
+            if (latency := self.run(seed, self.calibrator.timeout_verify, prefix)) is None:
+                logger.debug("Seed execution timeouts...")
+                if prefix is not None:
+                    GcovCollector.discard(prefix)
+                return None, None
+            # a slow outlier, not recorded: it would raise the timeout towards the verify limit
+            return latency, prefix
+
+        self.calibrator.record(latency)
+        return latency, prefix
+
+    def analyze(self: "Fuzzer", seed: Seed, prefix: Optional[Path]) -> SeedStatus:
+        """Collect the coverage of an execution and check whether the seed is interesting"""
+        if self.gcov is not None and prefix is not None:
+            return self.credit(seed, self.gcov.collect(prefix))
 
-        # coverage guided
         cov = self.target.collect_coverage()
         if cov[1] > self.line_cov or cov[3] > self.branch_cov:
             self.line_cov = cov[1]
@@ -81,11 +308,163 @@ class Fuzzer:
     
         return SeedStatus.Boring  # the seed is not interesting
 
+    def credit(self: "Fuzzer", seed: Seed, coverage: Coverage) -> SeedStatus:
+        """Merge the coverage of an execution, the seed is interesting if it reached anything new"""
+        seed.coverage = coverage
+        if self.cov_map.update(coverage):
+            self.line_cov = len(self.cov_map.lines)
+            self.branch_cov = len(self.cov_map.branches)
+            return SeedStatus.Interesting
+        return SeedStatus.Boring
+
+    def analyze_background(self: "Fuzzer", seed: Seed, prefix: Path) -> SeedStatus:
+        """
+        `analyze` run by the analyzer. The gcov run and the parsing take no lock and overlap the next
+        execution; only the bookkeeping (which may log) holds the fork lock
+        """
+        output = self.gcov.run(prefix)
+        coverage = GcovCollector.parse(output) if output is not None else Coverage()
+        with self.fork_lock:
+            if output is None:
+                logger.warning(f"No coverage data written under {prefix}, is the server instrumented?")
+            return self.credit(seed, coverage)
+
+    def fuzz_one(self: "Fuzzer", seed: Seed) -> SeedStatus:
+        '''
+        Execute one seed with coverage guided, return true if the seed is interesting
+        
+        Returns True is the seed is interesting, otherwise False
+        '''
+        latency, prefix = self.execute_one(seed)
+        if latency is None:
+            return SeedStatus.Timeout
+
+        if not self.worth_analyzing(seed, prefix):
+            return SeedStatus.Boring
+
+        # coverage guided
+        return self.analyze(seed, prefix)
+
+    def worth_analyzing(self: "Fuzzer", seed: Seed, prefix: Optional[Path]) -> bool:
+        """Check the reply codes of the execution before paying for the coverage collection"""
+        if self.response_filter is None or self.response_filter.should_collect(seed.codes):
+            return True
+
+        if prefix is not None:
+            GcovCollector.discard(prefix)
+        return False
+
+    def handle(self: "Fuzzer", seed: Seed, status: SeedStatus, epoch: int, *, publish: bool = True) -> None:
+        """Handle the status of a seed executed during `epoch`, publishing it to the sync directory if interesting"""
+        if epoch != 0:
+            self.mut_executor.record(seed, status in (SeedStatus.Interesting, SeedStatus.Crash))
+        if status == SeedStatus.Timeout:
+            self.timeouts["process"] += 1
+        elif seed.timeout_category is not None:
+            self.timeouts[seed.timeout_category] += 1
+        if status != SeedStatus.Timeout:
+            self.deps.observe(seed)
+        if self.state_model is not None and status != SeedStatus.Timeout:
+            self.state_model.update(seed, status == SeedStatus.Interesting)
+            if epoch == 0:
+                self.state_model.add_seed(self.queue.index(seed), seed)
+
+        if status == SeedStatus.Interesting:
+            if self.top_rated is not None:
+                self.top_rated.add(self.queue.index(seed) if epoch == 0 else len(self.queue), seed)
+            if epoch != 0:
+                self.queue.append(seed)
+                seed.save(PATH_SEED, status)
+                if self.sync is not None and publish:
+                    self.sync.publish(seed)
+                if self.log is not None:
+                    self.log.write(str(seed))
+                if self.state_model is not None:
+                    self.state_model.add_seed(len(self.queue) - 1, seed)
+        elif status == SeedStatus.Crash:
+            # TODO: handle crash seed
+            pass
+        elif status == SeedStatus.Timeout:
+            if epoch == 0:
+                raise SeedDryRunTimeout("The initial seed given is timeout")
+
+    def state(self: "Fuzzer") -> Dict[str, Any]:
+        """
+        The state of the campaign saved by the checkpoints, besides the queue. Unlike the queue, it is
+        pickled whole by the fuzzing loop at every checkpoint: with large coverage maps or models, the
+        checkpoint interval bounds this cost.
+        """
+        havoc = self.mut_executor.havoc
+        return {
+            "protocol": self.protocol.name,
+            "timer": self.timer,
+            "calibrator": self.calibrator,
+            "coverage": (self.line_cov, self.branch_cov, self.cov_map),
+            "response_filter": self.response_filter,
+            "state_model": self.state_model,
+            "deps": self.deps,
+            "timeouts": self.timeouts,
+            "top_rated": self.top_rated,
+            "mutators": [(mutator.avoided, mutator.repaired) for mutator in self.mut_executor.mutators],
+            "havoc": (havoc.tried, havoc.found) if havoc is not None else None,
+            "random": random.getstate(),
+        }
+
+    def restore(self: "Fuzzer", path: Path) -> None:
+        """Continue the campaign of the checkpoint in `path`"""
+        state, seeds = Checkpointer.load(path)
+        if state["protocol"] != self.protocol.name:
+            raise ValueError(f"The checkpoint is a {state['protocol']} campaign")
+
+        self.queue.close()
+        self.queue = SeedStore(seeds, memory_limit=self.queue.memory_limit)
+        self.timer = state["timer"]
+        self.calibrator = state["calibrator"]
+        self.line_cov, self.branch_cov, self.cov_map = state["coverage"]
+        # the models only exist when enabled for this run
+        if self.response_filter is not None and state["response_filter"] is not None:
+            self.response_filter = state["response_filter"]
+        if self.state_model is not None and state["state_model"] is not None:
+            self.state_model = self.mut_executor.state_model = state["state_model"]
+        state["deps"].guiding = self.deps.guiding  # as enabled for this run
+        self.deps = state["deps"]
+        self.timeouts = state["timeouts"]
+        if self.top_rated is not None and state["top_rated"] is not None:
+            self.top_rated = self.mut_executor.favored = state["top_rated"]
+        for mutator in self.mut_executor.mutators + ([self.mut_executor.havoc] if self.mut_executor.havoc else []):
+            mutator.deps = self.deps if mutator.deps is not None else None
+        for mutator, (avoided, repaired) in zip(self.mut_executor.mutators, state["mutators"]):
+            mutator.avoided, mutator.repaired = avoided, repaired
+        if self.mut_executor.havoc is not None and state["havoc"] is not None:
+            self.mut_executor.havoc.tried, self.mut_executor.havoc.found = state["havoc"]
+        random.setstate(state["random"])
+        logger.info(f"Resumed at epoch {self.timer.epoch_count} with {len(self.queue)} seeds")
+
+    def sync_seeds(self: "Fuzzer") -> None:
+        """Import the seeds published by the other instances, keeping those interesting for this one"""
+        for seed in self.sync.fetch():
+            # the coverage published is checked first, the execution tells whether the seed is still interesting here
+            if self.gcov is not None and seed.coverage is not None and not self.cov_map.has_new(seed.coverage):
+                continue
+            seed = seed.copy()
+            self.handle(seed, self.fuzz_one(seed), self.timer.epoch_count, publish=False)
+
+    def drain(self: "Fuzzer", *, wait: bool = False) -> None:
+        """Handle the seeds whose coverage analysis has finished (all of them if `wait`)"""
+        while self.pending and (wait or self.pending[0][2].done()):
+            seed, epoch, future = self.pending.popleft()
+            self.handle(seed, future.result(), epoch)
+
     def fuzz(self: "Fuzzer") -> None:
         '''main fuzzing loop'''
         self.start_time = time.time()
+        if self.profiler is not None:
+            self.profiler.start()
 
         print(f"{Style.DIM}", end=None)
+        if not self.calibrator.calibrated:  # unless resumed
+            self.calibrate(self.queue[0])
+
         while self.timer.total_time < self.timeout * 60:
 
             # prepare execution queue (when epoch_count is 0, perform dry run)
@@ -94,33 +473,84 @@ class Fuzzer:
             
             # execute the queue
             for seed in cur_queue:
-                if (status := self.fuzz_one(seed)) == SeedStatus.Interesting:
-                    if self.timer.epoch_count != 0:
-                        self.queue.append(seed)
-                        seed.save(PATH_SEED, status)
-                        if self.log is not None:
-                            self.log.write(str(seed))
-                elif status == SeedStatus.Crash:
-                    # TODO: handle crash seed
-                    pass
-                elif status == SeedStatus.Timeout:
-                    if self.timer.epoch_count == 0:
-                        raise SeedDryRunTimeout("The initial seed given is timeout")
+                if self.analyzer is None:
+                    self.handle(seed, self.fuzz_one(seed), self.timer.epoch_count)
+                    continue
+
+                # analyze the coverage in background while the next seed is executed
+                latency, prefix = self.execute_one(seed)
+                if latency is None:
+                    self.handle(seed, SeedStatus.Timeout, self.timer.epoch_count)
+                elif not self.worth_analyzing(seed, prefix):
+                    self.handle(seed, SeedStatus.Boring, self.timer.epoch_count)
+                else:
+                    self.pending.append((seed, self.timer.epoch_count, self.analyzer.submit(self.analyze_background, seed, prefix)))
+                self.drain()
+
+            if self.timer.epoch_count == 0:
+                self.drain(wait=True)  # the dry run is complete before any mutation
+                for index in range(len(self.queue)):
+                    self.queue.update(index)  # with the trace, coverage and latency of the dry run
 
             self.timer.count()
 
+            if self.sync is not None and self.timer.epoch_count % self.sync_interval == 0:
+                self.drain(wait=True)
+                self.sync_seeds()
+
+            if self.checkpointer is not None and self.timer.epoch_count % self.checkpoint_interval == 0:
+                self.drain(wait=True)
+                self.checkpointer.save(self.state(), self.queue)
+
             # epoch log
             self._write_epoch_status()
 
+        self.drain(wait=True)
+        if self.analyzer is not None:
+            self.analyzer.shutdown()
+        if self.checkpointer is not None:
+            self.checkpointer.wait()
+            self.checkpointer.save(self.state(), self.queue)
+            self.checkpointer.wait()
+        self.queue.close()
+
+        if self.state_model is not None:
+            self._write_state_graph()
+
         # summary log 
         self._write_total_status()
 
+        if self.profiler is not None:
+            self.profiler.stop()
+            print(self.profiler.summary())
+
     def catch(self) -> None:
-        """Only run the initial seeds"""
+        """Only run the initial seeds, writing the wire trace of the execution next to the logs"""
         logger.debug("Run one round for tcpdump or initialization test")
-        self.fuzz_one(self.queue[0])
+        seed, prefix = self.queue[0], self.new_execution()
+        if self.run(seed, self.calibrator.timeout_verify, prefix, record=True) is not None:
+            self.analyze(seed, prefix)
         self._write_epoch_status()
 
+        if self.wire is not None:
+            PATH_LOG.mkdir(exist_ok=True)
+            wire_path = PATH_LOG.joinpath(f"{self.protocol.name}-{get_local_time()}.wire")
+            self.wire.save(wire_path)
+            print(f"Wire trace ({len(self.wire)} events) written to {wire_path}")
+
+    def replay(self, path: Path) -> None:
+        """Replay a wire trace against a fresh server, e.g. to reproduce a crash"""
+        trace = Trace.load(path)
+        if trace.protocol != self.protocol.name:
+            logger.warning(f"Replay a {trace.protocol} trace against a {self.protocol.name} target")
+
+        seed = Seed([])
+        latency = self.run(seed, self.calibrator.timeout_verify, wire=trace)
+        if latency is None:
+            print(f"Replay of {path} timeouts")
+        else:
+            print(f"Replayed {path} in {latency:.3f}s, reply codes: {list(seed.codes)}")
+
     def create_log(self):
         """
         Create the log file
@@ -131,6 +561,13 @@ class Fuzzer:
         log_path = PATH_LOG.joinpath(log_name)
         return log_path.open("w", encoding="utf-8")
 
+    def _write_state_graph(self) -> None:
+        """Write the inferred protocol state graph (Graphviz) next to the logs"""
+        PATH_LOG.mkdir(exist_ok=True)
+        graph_path = PATH_LOG.joinpath(f"{self.protocol.name}-{get_local_time()}-states.dot")
+        graph_path.write_text(self.state_model.to_dot(), encoding="utf-8")
+        logger.debug(f"State graph written to {graph_path}")
+
     def _write_epoch_status(self) -> None:
         """write status to stdout and log file"""
 
@@ -158,7 +595,22 @@ class Fuzzer:
 
     def _write_total_status(self) -> None:
         formated_time = format_time(time.time() - self.start_time)
-        info = f"Total {self.timer.epoch_count} epoch in {self.timer.total_time:.2f}s; lcov: {self.line_cov}; bcov: {self.branch_cov}"
+        info = f"Total {self.timer.epoch_count} epoch in {self.timer.total_time:.2f}s; lcov: {self.line_cov}; bcov: {self.branch_cov}; timeout: {self.calibrator.timeout:.3f}s"
+        if self.response_filter is not None:
+            info += f"; {self.response_filter}"
+        info += f"; {self.deps}"
+        if self.dns_engine is not None:
+            info += f"; {self.dns_engine}"
+        if self.timeouts:
+            info += "; timeouts: " + ", ".join(f"{category} {count}" for category, count in sorted(self.timeouts.items()))
+        if self.mut_executor.havoc is not None:
+            info += f"; {self.mut_executor.havoc}"
+        if self.top_rated is not None:
+            info += f"; {self.top_rated}"
+        if self.sync is not None:
+            info += f"; {self.sync}"
+        if self.checkpointer is not None:
+            info += f"; {self.checkpointer}"
 
         # stdout
         summary_string = f"{Style.RESET_ALL}{Style.BRIGHT}[{Fore.BLUE}Summary{Fore.RESET}] - {formated_time} - {info}{Style.RESET_ALL}"
@@ -174,6 +626,12 @@ class Fuzzer:
             self.log.close()
 
 
+def positive_int(value: str) -> int:
+    if (number := int(value)) <= 0:
+        raise argparse.ArgumentTypeError(f"{value} is not a positive integer")
+    return number
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser('Function-Aware Fuzzer')
     parser.add_argument('protocol', choices=['ftp', 'smtp', 'dns', 'dicom'])
@@ -182,16 +640,74 @@ if __name__ == "__main__":
     parser.add_argument('-d', "--debug", default=False, action="store_true")
     parser.add_argument('-c', "--catch", default=False, action="store_true")
     parser.add_argument('-l', "--log", default=False, action="store_true")
+    parser.add_argument("--timeout-testcase", type=float, default=2.0, help="initial timeout (seconds) of one execution before calibration")
+    parser.add_argument("--timeout-verify", type=float, default=None, help="upper bound (seconds) of the timeouts, 5x the initial timeout by default; hangs are re-verified with twice the calibrated timeout")
+    parser.add_argument("--calibration-runs", type=int, default=5)
+    parser.add_argument("--timeout-call", type=float, default=None, metavar="SEC", help="socket deadline of every api call")
+    parser.add_argument("--timeout-budget", type=float, default=None, metavar="SEC", help="time budget of the api calls of one seed")
+    parser.add_argument("--timeout-policy", choices=["continue", "abort"], default="continue",
+                        help="run the rest of the seed after an api call missed its deadline, or not")
+    parser.add_argument("--per-exec-cov", default=False, action="store_true", help="collect the coverage of every execution separately (GCOV_PREFIX)")
+    parser.add_argument("--pipeline", default=False, action="store_true", help="analyze coverage in background while the next seed runs (needs --per-exec-cov)")
+    parser.add_argument("--state-aware", default=False, action="store_true", help="select seeds by the protocol states inferred from reply codes")
+    parser.add_argument("--response-filter", type=float, default=None, metavar="RATE",
+                        help="only collect coverage for new reply code sequences, and for a fraction RATE of the others (needs --per-exec-cov)")
+    parser.add_argument("--insert", default=False, action="store_true", help="insert api calls drawn from the catalog of the protocol")
+    parser.add_argument("--splice", default=False, action="store_true", help="cross over api calls between queue seeds")
+    parser.add_argument("--havoc", default=False, action="store_true", help="stack several mutations onto every mutant, with an adaptive depth")
+    parser.add_argument("--replay-calibration", default=False, action="store_true",
+                        help="calibrate the timeout by replaying the wire trace of the initial seed")
+    parser.add_argument("--replay", type=Path, default=None, metavar="TRACE", help="replay a wire trace (written by --catch) and exit")
+    parser.add_argument("--dns-batch", type=int, default=0, metavar="N",
+                        help="DNS only: send N header-mutated variants of the queries of every seed per server lifetime")
+    parser.add_argument("--smtp-pipeline", default=False, action="store_true",
+                        help="SMTP only: pipeline the commands of every seed over a raw socket (ESMTP PIPELINING when advertised)")
+    parser.add_argument("--queue-memory", type=int, default=256, metavar="MB",
+                        help="memory of the queue seeds kept alive, the others are spilled to disk")
+    role = parser.add_mutually_exclusive_group()
+    role.add_argument('-M', dest="sync_main", metavar="NAME", default=None, help="main instance NAME, importing the seeds of every instance of --sync-dir")
+    role.add_argument('-S', dest="sync_secondary", metavar="NAME", default=None, help="secondary instance NAME, importing the seeds of the main instances of --sync-dir")
+    parser.add_argument("--sync-dir", type=Path, default=None, metavar="DIR", help="directory shared with the other instances (e.g. a network mount)")
+    parser.add_argument("--sync-interval", type=positive_int, default=10, metavar="EPOCHS", help="epochs between two imports of the seeds of the other instances")
+    parser.add_argument("--checkpoint", type=Path, default=None, metavar="DIR", help="checkpoint the campaign into DIR")
+    parser.add_argument("--checkpoint-interval", type=positive_int, default=50, metavar="EPOCHS", help="epochs between two checkpoints")
+    parser.add_argument("--resume", default=False, action="store_true", help="continue the campaign checkpointed in --checkpoint")
+    parser.add_argument("--checkpoint-overwrite", default=False, action="store_true",
+                        help="start a new campaign over the checkpoint in --checkpoint")
+    parser.add_argument("--profile", type=Path, nargs="?", default=None, const=PATH_LOG.joinpath(f"profile-{get_local_time()}"),
+                        metavar="DIR", help="sample the stacks of the fuzzer and of the executors, writing flame graph stacks into DIR")
+    parser.add_argument("--favored", default=False, action="store_true",
+                        help="mostly mutate the favored seeds, the best seed of each line and branch (needs --per-exec-cov)")
+    parser.add_argument("--deps", default=False, action="store_true", help="avoid mutants breaking the learned dependencies between API calls")
 
     args = parser.parse_args()
+    if (args.sync_main or args.sync_secondary) and args.sync_dir is None:
+        parser.error("-M/-S need --sync-dir")
+    if args.resume and args.checkpoint is None:
+        parser.error("--resume needs --checkpoint")
 
     server_builder = ServerBuilder()
 
     if args.debug:
         logging.basicConfig(level=logging.DEBUG)
 
-    fuzzer = Fuzzer(args.protocol, server_builder.get_target(), timeout=args.timeout, log=args.log)
-    if args.catch:
+    fuzzer = Fuzzer(args.protocol, server_builder.get_target(), timeout=args.timeout, log=args.log,
+                    timeout_testcase=args.timeout_testcase, timeout_verify=args.timeout_verify,
+                    calibration_runs=args.calibration_runs, per_exec_cov=args.per_exec_cov,
+                    timeout_call=args.timeout_call, timeout_budget=args.timeout_budget, timeout_policy=args.timeout_policy,
+                    pipeline=args.pipeline, response_filter=args.response_filter,
+                    state_aware=args.state_aware, dependency=args.deps, insert=args.insert,
+                    splice=args.splice, havoc=args.havoc, replay_calibration=args.replay_calibration,
+                    dns_batch=args.dns_batch, smtp_pipeline=args.smtp_pipeline,
+                    queue_memory=args.queue_memory, sync_dir=args.sync_dir,
+                    sync_name=args.sync_secondary or args.sync_main or "main", sync_main=args.sync_secondary is None,
+                    sync_interval=args.sync_interval, checkpoint=args.checkpoint,
+                    checkpoint_interval=args.checkpoint_interval, resume=args.resume,
+                    checkpoint_overwrite=args.checkpoint_overwrite, profile=args.profile,
+                    favored=args.favored)
+    if args.replay is not None:
+        fuzzer.replay(args.replay)
+    elif args.catch:
         fuzzer.catch()
     else:
         fuzzer.fuzz()
\ No newline at end of file
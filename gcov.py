@@ -0,0 +1,167 @@
+"""
+Per-execution gcov coverage.
+
+Instead of letting the `.gcda` counters of the server pile up across the campaign, every
+execution writes its counters into a fresh `GCOV_PREFIX` directory, which is analyzed
+with `gcov --json-format` and removed afterwards. The result is exactly what one seed reached.
+"""
+import itertools
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import weakref
+import logging
+from pathlib import Path
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+from exception import CoverageError
+
+
+logger = logging.getLogger("fazz.gcov")
+
+PATH_TMPFS = Path("/dev/shm")
+
+Line = Tuple[str, int]            # (source file, line number)
+Branch = Tuple[str, int, int]     # (source file, line number, branch index)
+
+
+class Coverage:
+    """Lines and branches reached by one execution"""
+
+    __slots__ = ("lines", "branches")
+
+    def __init__(self, lines: FrozenSet[Line] = frozenset(), branches: FrozenSet[Branch] = frozenset()) -> None:
+        self.lines = lines
+        self.branches = branches
+
+    def __len__(self) -> int:
+        return len(self.lines) + len(self.branches)
+
+    def __getstate__(self):
+        return (self.lines, self.branches)
+
+    def __setstate__(self, state) -> None:
+        self.lines, self.branches = state
+
+    def __repr__(self) -> str:
+        return f"<Coverage lines: {len(self.lines)}; branches: {len(self.branches)}>"
+
+
+class CoverageMap:
+    """The union of the coverage of every execution of the campaign"""
+
+    def __init__(self) -> None:
+        self.lines: Set[Line] = set()
+        self.branches: Set[Branch] = set()
+
+    def has_new(self, cov: Coverage) -> bool:
+        return not (cov.lines <= self.lines and cov.branches <= self.branches)
+
+    def update(self, cov: Coverage) -> bool:
+        """Merge the coverage of one execution, return True if it reached anything new"""
+        new = self.has_new(cov)
+        if new:
+            self.lines |= cov.lines
+            self.branches |= cov.branches
+        return new
+
+
+class GcovCollector:
+    """Collect the coverage of single executions through per-execution `GCOV_PREFIX` directories"""
+
+    def __init__(self, *, gcov: str = "gcov", store: Optional[Path] = None) -> None:
+        if shutil.which(gcov) is None:
+            raise CoverageError(f"No such program: {gcov}")
+        self.gcov = gcov
+
+        store_dir = store if store is not None else (PATH_TMPFS if PATH_TMPFS.is_dir() else None)
+        self.store = Path(tempfile.mkdtemp(prefix="fazz-gcov-", dir=store_dir))
+        self._finalizer = weakref.finalize(self, shutil.rmtree, self.store, True)
+        self._counter = itertools.count()
+
+    def new_execution(self) -> Path:
+        """Create the empty prefix directory of one execution"""
+        prefix = self.store.joinpath(f"exec-{next(self._counter):08d}")
+        prefix.mkdir()
+        return prefix
+
+    @staticmethod
+    def environ(prefix: Path) -> Dict[str, str]:
+        """Environment making the instrumented server write its counters under `prefix`"""
+        return {"GCOV_PREFIX": str(prefix), "GCOV_PREFIX_STRIP": "0"}
+
+    def collect(self, prefix: Path, *, remove: bool = True) -> Coverage:
+        """Analyze the counters written under `prefix` by one execution"""
+        if (output := self.run(prefix, remove=remove)) is None:
+            logger.warning(f"No coverage data written under {prefix}, is the server instrumented?")
+            return Coverage()
+        return self.parse(output)
+
+    def run(self, prefix: Path, *, remove: bool = True) -> Optional[str]:
+        """
+        The output of gcov on the counters written under `prefix`, None without counters.
+        Takes no lock of the process (no logging): it may run while the fuzzer forks.
+        """
+        try:
+            gcda_files: List[str] = []
+            for dirpath, _, filenames in os.walk(prefix):
+                for name in filenames:
+                    if not name.endswith(".gcda"):
+                        continue
+                    gcda = os.path.join(dirpath, name)
+                    # the notes file lives next to the object file, at the path stripped of the prefix
+                    gcno = gcda[:-len(".gcda")] + ".gcno"
+                    origin = "/" + os.path.relpath(gcno, prefix)
+                    if not os.path.lexists(gcno):
+                        os.symlink(origin, gcno)
+                    gcda_files.append(gcda)
+
+            if not gcda_files:
+                return None
+
+            proc = subprocess.run([self.gcov, "--json-format", "--stdout", "--branch-probabilities", *gcda_files],
+                                  cwd=prefix, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, stdin=subprocess.DEVNULL)
+            if proc.returncode != 0:
+                raise CoverageError(f"gcov exited with {proc.returncode}")
+            return proc.stdout.decode()
+        finally:
+            if remove:
+                shutil.rmtree(prefix, ignore_errors=True)
+
+    @staticmethod
+    def parse(output: str) -> Coverage:
+        """Parse the (concatenated) JSON documents printed by `gcov --json-format --stdout`"""
+        lines: Set[Line] = set()
+        branches: Set[Branch] = set()
+
+        decoder = json.JSONDecoder()
+        pos = 0
+        output = output.strip()
+        while pos < len(output):
+            try:
+                doc, pos = decoder.raw_decode(output, pos)
+            except json.JSONDecodeError as e:
+                raise CoverageError(f"Cannot parse gcov output: {e}")
+            while pos < len(output) and output[pos].isspace():
+                pos += 1
+
+            for file in doc.get("files", []):
+                name = file["file"]
+                for line in file.get("lines", []):
+                    if line["count"] > 0:
+                        lines.add((name, line["line_number"]))
+                    for index, branch in enumerate(line.get("branches", [])):
+                        if branch["count"] > 0:
+                            branches.add((name, line["line_number"], index))
+
+        return Coverage(frozenset(lines), frozenset(branches))
+
+    @staticmethod
+    def discard(prefix: Path) -> None:
+        """Drop the counters of an execution whose coverage is not wanted"""
+        shutil.rmtree(prefix, ignore_errors=True)
+
+    def close(self) -> None:
+        self._finalizer()
@@ -1,17 +1,55 @@
 from abc import ABC, abstractmethod
-from typing import List, Tuple
+from typing import Dict, List, Optional, Sequence, Tuple
+from array import array
 import random
 from copy import deepcopy
 
 from seed import Seed
+from seed.fn import Fn
+from state import StateModel
+from dependency import DependencyModel
+from catalog import Catalog
+from favored import TopRated
 
 
 class Mutator(ABC):
     """
     Mutator interface
     """
-    @abstractmethod
+    # Whether the mutator changes the sequence of api calls (and may break their dependencies)
+    structural = False
+
+    def __init__(self, *, deps: Optional[DependencyModel] = None, attempts: int = 4) -> None:
+        self.deps = deps
+        self.attempts = attempts
+
+        self.avoided = 0   # mutants predicted to fail and mutated again
+        self.repaired = 0  # mutants predicted to fail and repaired
+
     def mutate(self, seed: Seed) -> Seed:
+        """
+        Mutate a copy of the seed. With a dependency model, the mutants breaking the dependencies
+        of their seed are mutated again (at most `attempts` times), then repaired if possible.
+        """
+        mutant = self.apply(seed.copy())
+        if self.deps is None or not self.structural:
+            return mutant
+
+        # Mutating again is pointless when the seed itself is predicted to fail
+        attempts = self.attempts if self.deps.doomed(seed) is None else 1
+        for _ in range(attempts - 1):
+            if self.deps.doomed(mutant) is None:
+                return mutant
+            self.avoided += 1
+            mutant = self.apply(seed.copy())
+
+        if self.deps.doomed(mutant) is not None and self.deps.repair(mutant):
+            self.repaired += 1
+        return mutant
+
+    @abstractmethod
+    def apply(self, seed: Seed) -> Seed:
+        """Mutate the given seed in place"""
         pass
 
     @abstractmethod
@@ -21,17 +59,22 @@ class Mutator(ABC):
     def __repr__(self):
         return f"Mutator[{self.name()}]"
 
+    @staticmethod
+    def position(seed: Seed) -> int:
+        """Choose the api call to mutate, at or after the focus of the seed"""
+        return random.randrange(min(seed.focus, seed.len() - 1), seed.len())
+
 
 class DupMutator(Mutator):
     """
     Choose one api call in a seed to duplicate it.
     """
-    def mutate(self, seed: Seed) -> Seed:
-        seed = seed.copy()
+    structural = True
 
+    def apply(self, seed: Seed) -> Seed:
         seed.mutations.append(self.name())
 
-        randpos: int = random.randrange(0, seed.len())
+        randpos: int = self.position(seed)
         seed.insert(randpos, deepcopy(seed[randpos]))
 
         return seed
@@ -44,8 +87,9 @@ class SwapMutator(Mutator):
     """
     Choose two api calls in a seed to swap them
     """
-    def mutate(self, seed: Seed) -> Seed:
-        seed = seed.copy()
+    structural = True
+
+    def apply(self, seed: Seed) -> Seed:
         # If the number of API calls in a seed is less than 2, 
         # it will cause an infinite loop when choosing API calls to exchange 
         if seed.len() < 2:
@@ -53,7 +97,7 @@ class SwapMutator(Mutator):
 
         seed.mutations.append(self.name())
 
-        randpos1 = random.randrange(0, seed.len())
+        randpos1 = self.position(seed)
         while (randpos2 := random.randrange(0, seed.len())) == randpos1:
             continue
 
@@ -69,12 +113,13 @@ class DelMutator(Mutator):
     """
     Choose one api call in a seed to delete it
     """
-    def mutate(self, seed: Seed) -> Seed:
-        seed = seed.copy()
+    structural = True
+
+    def apply(self, seed: Seed) -> Seed:
         seed.mutations.append(self.name())
 
         if seed.len() > 2:
-            randpos = random.randrange(0, seed.len())
+            randpos = self.position(seed)
             seed.fns.remove(seed[randpos])
         
         return seed
@@ -87,11 +132,10 @@ class ArgMutator(Mutator):
     """
     Choose one api call in a seed to mutate its arguments
     """
-    def mutate(self, seed: Seed) -> Seed:
-        seed = seed.copy()
+    def apply(self, seed: Seed) -> Seed:
         seed.mutations.append(self.name())
 
-        randpos: int = random.randrange(0, seed.len())
+        randpos: int = self.position(seed)
         fn = seed[randpos]
 
         for arg in fn.args:
@@ -106,26 +150,185 @@ class ArgMutator(Mutator):
 
 class InsMutator(Mutator):
     """
-    Randomly insert an api call into a seed
+    Randomly insert an api call drawn from the catalog of the protocol into a seed
     """
-    def mutate(self, seed: Seed):
-        return 
+    structural = True
+
+    def __init__(self, *, catalog: Optional[Catalog] = None, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.catalog = catalog
+
+    def apply(self, seed: Seed) -> Seed:
+        if self.catalog is None or len(self.catalog) == 0:
+            return seed
+
+        seed.mutations.append(self.name())
+
+        # Never insert after the api call ending the session
+        end = next((i for i, fn in enumerate(seed.fns) if fn.is_last), seed.len())
+        seed.fns.insert(random.randint(min(seed.focus, end), end), self.catalog.draw())
+
+        return seed
     
     def name(self) -> str:
         return "ins"
 
 
+class SpliceIndex:
+    """
+    The queue indices of the seeds containing each API call, to find splice partners without scanning the queue.
+    The index follows the queue as it grows (seeds are only appended to it).
+    """
+    def __init__(self) -> None:
+        self.seeds: Dict[str, array] = {}
+        self.synced = 0
+
+    def sync(self, queue: Sequence[Seed]) -> None:
+        """Index the seeds appended to the queue since the last sync"""
+        if len(queue) < self.synced:
+            self.seeds.clear()
+            self.synced = 0
+
+        for index in range(self.synced, len(queue)):
+            for name in {fn.fn_name for fn in queue[index].fns}:
+                self.seeds.setdefault(name, array('I')).append(index)
+        self.synced = len(queue)
+
+    def partners(self, name: str) -> Sequence[int]:
+        return self.seeds.get(name, ())
+
+
+class SpliceMutator(Mutator):
+    """
+    Cross over two seeds: the api calls of the seed before a compatible point (an api call of the same name)
+    followed by the api calls of another queue seed from that point
+    """
+    structural = True
+
+    def __init__(self, *, max_size: int = 64, tries: int = 8, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.max_size = max_size  # api calls of a spliced seed
+        self.tries = tries        # crossover points tried before giving up
+
+        self.index = SpliceIndex()
+        self.queue: Sequence[Seed] = []
+
+    def sync(self, queue: Sequence[Seed]) -> None:
+        self.queue = queue
+        self.index.sync(queue)
+
+    def apply(self, seed: Seed) -> Seed:
+        # The api calls after the one ending the session are never run, nor spliced
+        # (nor the ones beyond `max_size`, seeds grown longer by other mutators keep their head)
+        end = min(next((i for i, fn in enumerate(seed.fns) if fn.is_last), seed.len() - 1), self.max_size - 1)
+        if end < 0:
+            return seed
+        start = min(seed.focus, end)
+
+        for _ in range(self.tries):
+            head = random.randint(start, end)
+            name = seed[head].fn_name
+            if not (partners := self.index.partners(name)):
+                continue
+
+            partner = self.queue[random.choice(partners)]
+            positions = [i for i, fn in enumerate(partner.fns) if fn.fn_name == name]
+            if not positions:
+                continue  # the partner changed since indexed
+            tail = self.tail(partner, random.choice(positions), self.max_size - head)
+
+            seed.mutations.append(self.name())
+            seed.fns[head:] = tail
+            return seed
+        return seed
+
+    @staticmethod
+    def tail(partner: Seed, position: int, budget: int) -> List[Fn]:
+        """Copy the api calls of the partner from `position`, up to the one ending the session, within `budget`"""
+        tail: List[Fn] = []
+        for fn in partner.fns[position:]:
+            tail.append(fn)
+            if fn.is_last:
+                break
+        if len(tail) > budget:
+            tail = tail[:budget - 1] + [tail[-1]] if tail[-1].is_last else tail[:budget]
+        return deepcopy(tail)
+
+    def name(self) -> str:
+        return "splice"
+
+
+class HavocMutator(Mutator):
+    """
+    Stack a random number of mutations onto one copy of the seed, so that every (costly) execution
+    tests an input further from its seed. The stack depth is drawn from levels of [2^l, 2^(l+1)) mutations,
+    chosen by how many interesting seeds each level yielded.
+    """
+    structural = True
+
+    def __init__(self, mutator_with_weight: List[Tuple[Mutator, float]], *, max_level: int = 4, max_size: int = 64,
+                 **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.max_size = max_size  # stop stacking once the seed has that many api calls
+        self.mutators = [mutator for mutator, _ in mutator_with_weight]
+        self.weights = [weight for _, weight in mutator_with_weight]
+
+        self.tried = [0] * (max_level + 1)  # executed mutants of each level
+        self.found = [0] * (max_level + 1)  # interesting mutants of each level
+
+    def level(self) -> int:
+        """Choose the level of the stack depth, favoring the productive ones"""
+        scores = [(found + 1) / (tried + 1) for found, tried in zip(self.found, self.tried)]
+        return random.choices(range(len(scores)), scores)[0]
+
+    def apply(self, seed: Seed) -> Seed:
+        level = self.level()
+        seed.mutations.append(self.name())
+        seed.havoc_level = level
+
+        for mutator in random.choices(self.mutators, self.weights, k=random.randrange(2 ** level, 2 ** (level + 1))):
+            seed = mutator.apply(seed)
+            if seed.len() >= self.max_size:
+                break
+        return seed
+
+    def record(self, seed: Seed, interesting: bool) -> None:
+        """Feedback of the execution of a mutant"""
+        if (level := seed.havoc_level) is not None:
+            self.tried[level] += 1
+            self.found[level] += interesting
+
+    def name(self) -> str:
+        return "havoc"
+
+    def __str__(self) -> str:
+        return "havoc: " + " ".join(f"{2 ** level}+:{found}/{tried}"
+                                    for level, (found, tried) in enumerate(zip(self.found, self.tried)))
+
+
 class MutExecutor:
     """
     Mutation executor
     """
-    def __init__(self) -> None:
+    def __init__(self, *, state_model: Optional[StateModel] = None, deps: Optional[DependencyModel] = None,
+                 catalog: Optional[Catalog] = None, splice: bool = False, havoc: bool = False,
+                 favored: Optional[TopRated] = None) -> None:
+        self.state_model = state_model
+        self.favored = favored  # prefer the favored seeds over the redundant ones
         self.mutator_with_weight: List[Tuple[Mutator, float]] = [
             (ArgMutator(), 0.4),
-            (DupMutator(), 0.2), 
-            (SwapMutator(), 0.2),
-            (DelMutator(), 0.2),
+            (DupMutator(deps=deps), 0.2), 
+            (SwapMutator(deps=deps), 0.2),
+            (DelMutator(deps=deps), 0.2),
         ]
+        if catalog is not None:
+            self.mutator_with_weight.append((InsMutator(catalog=catalog, deps=deps), 0.2))
+        self.splice: Optional[SpliceMutator] = SpliceMutator(deps=deps) if splice else None
+        if self.splice is not None:
+            self.mutator_with_weight.append((self.splice, 0.2))
+
+        # Havoc stage: every mutant stacks several of the mutations above
+        self.havoc: Optional[HavocMutator] = HavocMutator(self.mutator_with_weight, deps=deps) if havoc else None
 
     @property
     def mutators(self):
@@ -135,13 +338,46 @@ class MutExecutor:
     def weights(self):
         return [weight for _, weight in self.mutator_with_weight]
 
-    def mutate(self, queue: List[Seed], *, top_n: int = 10, mut_limit: int = 5) -> List[Seed]:
+    def choose(self, k: int) -> List[Mutator]:
+        """The mutators producing `k` mutants of one seed"""
+        if self.havoc is not None:
+            return [self.havoc] * k
+        return random.choices(self.mutators, self.weights, k=k)
+
+    def record(self, seed: Seed, interesting: bool) -> None:
+        """Feedback of the execution of a mutant"""
+        if self.havoc is not None:
+            self.havoc.record(seed, interesting)
+
+    def mutate(self, queue: Sequence[Seed], *, top_n: int = 10, mut_limit: int = 5) -> List[Seed]:
         """Given a queue, mutate seeds with `top_n` priority. Perform no more than `mut_limit` mutations."""
         # Only mutate seeds with `top_n` priority
         # For now, for simplicity, we just use sample to random select #top_n seeds to mutate
         # TODO: Use priority algorithm to select seeds
-        selected_seeds = random.sample(queue, top_n) if top_n < len(queue) else queue
+        if self.splice is not None:
+            self.splice.sync(queue)
+
+        if self.state_model is not None and (scheduled := self.state_model.schedule(queue, top_n)):
+            return self.mutate_from_states(scheduled)
+
+        if self.favored is not None:
+            selected_seeds = self.favored.select(queue, top_n)
+        else:
+            selected_seeds = random.sample(queue, top_n) if top_n < len(queue) else queue
 
         return [mutator.mutate(seed) 
                 for seed in selected_seeds 
-                for mutator in random.choices(self.mutators, self.weights, k=seed.power)]
+                for mutator in self.choose(seed.power)]
+
+    def mutate_from_states(self, scheduled: List[Tuple[Seed, int, int]]) -> List[Seed]:
+        """Mutate the seeds chosen by the state model, after the api call reaching the targeted state"""
+        mutants: List[Seed] = []
+        for seed, position, state in scheduled:
+            seed.focus = position
+            for mutator in self.choose(seed.power):
+                mutant = mutator.mutate(seed)
+                mutant.focus = 0
+                mutant.target_state = state
+                mutants.append(mutant)
+            seed.focus = 0
+        return mutants
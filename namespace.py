@@ -0,0 +1,161 @@
+"""
+Per-instance Linux namespaces, so that parallel servers can share one configuration.
+
+Each isolated server runs in its own (unprivileged) user, network and mount namespace:
+it gets a private loopback, where every instance can listen on the same port, and a
+private copy of the directories it writes into. The executors join the network namespace
+of the server before connecting to it.
+"""
+import ctypes
+import ctypes.util
+import os
+import shutil
+import socket
+import struct
+import tempfile
+import weakref
+import logging
+from pathlib import Path
+from typing import Dict, Optional, Sequence
+
+from exception import ServerIsolationFailed
+
+
+logger = logging.getLogger("fazz.namespace")
+
+CLONE_NEWNS = 0x00020000
+CLONE_NEWUSER = 0x10000000
+CLONE_NEWNET = 0x40000000
+
+MS_BIND = 0x1000
+MS_REC = 0x4000
+MS_PRIVATE = 1 << 18
+
+SIOCGIFFLAGS = 0x8913
+SIOCSIFFLAGS = 0x8914
+IFF_UP = 0x1
+
+_libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+
+
+def _check(ret: int, what: str) -> None:
+    if ret != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, f"{what}: {os.strerror(errno)}")
+
+
+def unshare(flags: int) -> None:
+    if hasattr(os, "unshare"):
+        os.unshare(flags)
+    else:
+        _check(_libc.unshare(ctypes.c_int(flags)), "unshare")
+
+
+def setns(fd: int, nstype: int) -> None:
+    if hasattr(os, "setns"):
+        os.setns(fd, nstype)
+    else:
+        _check(_libc.setns(ctypes.c_int(fd), ctypes.c_int(nstype)), "setns")
+
+
+def mount(source: Optional[str], target: str, flags: int) -> None:
+    _check(_libc.mount(source.encode() if source else None, target.encode(), None,
+                       ctypes.c_ulong(flags), None), f"mount {target}")
+
+
+def loopback_up() -> None:
+    """Bring up `lo` of the current network namespace"""
+    import fcntl
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        ifreq = fcntl.ioctl(sock, SIOCGIFFLAGS, struct.pack("16sH22x", b"lo", 0))
+        flags = struct.unpack("16sH", ifreq[:18])[1]
+        fcntl.ioctl(sock, SIOCSIFFLAGS, struct.pack("16sH22x", b"lo", flags | IFF_UP))
+
+
+def supported() -> bool:
+    """Whether the current user can create the namespaces"""
+    try:
+        with open("/proc/sys/user/max_user_namespaces") as f:
+            if int(f.read()) == 0:
+                return False
+    except OSError:
+        pass
+    try:
+        with open("/proc/sys/kernel/unprivileged_userns_clone") as f:
+            return os.getuid() == 0 or int(f.read()) != 0
+    except OSError:
+        return True
+
+
+class Namespace:
+    """
+    Namespaces of one server instance.
+
+    `private` directories are copied once into a per-instance directory, which is bind
+    mounted over the original path inside the mount namespace.
+    """
+
+    def __init__(self, private: Sequence[Path] = ()) -> None:
+        if not supported():
+            raise ServerIsolationFailed("User namespaces are not available for the current user")
+
+        self.uid, self.gid = os.getuid(), os.getgid()
+
+        self.private: Dict[Path, Path] = {}
+        self.store: Optional[Path] = None
+        if private:
+            self.store = Path(tempfile.mkdtemp(prefix="fazz-ns-"))
+            self._finalizer = weakref.finalize(self, shutil.rmtree, self.store, True)
+            for i, path in enumerate(private):
+                path = Path(path).absolute()
+                copy = self.store.joinpath(f"{i}-{path.name}")
+                shutil.copytree(path, copy, symlinks=True)
+                self.private[path] = copy
+
+    def host_path(self, path: Path) -> Path:
+        """Where `path` seen by the isolated server lives in the fuzzer's filesystem view"""
+        path = Path(path).absolute()
+        for origin, copy in self.private.items():
+            if path == origin or origin in path.parents:
+                return copy.joinpath(path.relative_to(origin))
+        return path
+
+    def preexec(self) -> None:
+        """Enter new namespaces, run in the forked server process before `exec`"""
+        unshare(CLONE_NEWUSER | CLONE_NEWNET | CLONE_NEWNS)
+
+        # map the current user to itself, the capabilities in the new namespaces are
+        # only needed until `exec`
+        with open("/proc/self/setgroups", "w") as f:
+            f.write("deny")
+        with open("/proc/self/uid_map", "w") as f:
+            f.write(f"{self.uid} {self.uid} 1")
+        with open("/proc/self/gid_map", "w") as f:
+            f.write(f"{self.gid} {self.gid} 1")
+
+        mount(None, "/", MS_REC | MS_PRIVATE)
+        for origin, copy in self.private.items():
+            mount(str(copy), str(origin), MS_BIND | MS_REC)
+        os.chdir(os.getcwd())  # resolve the working directory again, through the bind mounts
+
+        loopback_up()
+
+    @staticmethod
+    def enter(pid: int) -> None:
+        """Join the network namespace of process `pid` (through its user namespace)"""
+        try:
+            user_fd = os.open(f"/proc/{pid}/ns/user", os.O_RDONLY)
+            net_fd = os.open(f"/proc/{pid}/ns/net", os.O_RDONLY)
+        except OSError as e:
+            raise ServerIsolationFailed(f"Cannot open the namespaces of {pid}: {e}")
+
+        try:
+            if os.stat(f"/proc/{pid}/ns/user").st_ino != os.stat("/proc/self/ns/user").st_ino:
+                setns(user_fd, CLONE_NEWUSER)
+            setns(net_fd, CLONE_NEWNET)
+        except OSError as e:
+            raise ServerIsolationFailed(f"Cannot join the namespaces of {pid}: {e}")
+        finally:
+            os.close(user_fd)
+            os.close(net_fd)
+        logger.debug(f"Joined the network namespace of {pid}")
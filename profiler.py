@@ -0,0 +1,165 @@
+"""
+Sampling profiler of the fuzzer and of its executors.
+
+`SIGPROF` fires every `interval` seconds of CPU time of the process; the handler only counts the
+stacks of code objects of the running threads, tagged with the name of their thread (the analyzer
+parsing the coverage, for example), the stacks are formatted when written. The overhead stays
+around a few microseconds per sample and thread, low enough to profile long campaigns.
+
+The stacks are written in the collapsed format of flame graphs (`flamegraph.pl`, speedscope):
+`fuzzer.collapsed` for the fuzzing loop, and `executors.collapsed` for the forked executors, every
+executor appending its own stacks when it finishes. The root of every stack is its thread name.
+"""
+from collections import Counter
+from pathlib import Path
+from types import CodeType, FrameType
+from typing import Dict, List, Optional, Tuple
+import os
+import random
+import signal
+import sys
+import threading
+import logging
+
+
+logger = logging.getLogger("fazz.profiler")
+
+Stack = Tuple[CodeType, ...]  # leaf first
+Sample = Tuple[str, Stack]     # thread name, stack
+
+# Waits of idle threads, whose stacks are not counted: modules, and functions waiting in C (the
+# workers of a thread pool waiting for a task)
+IDLE_MODULES = ("threading.py", "queue.py")
+IDLE_FUNCTIONS = {("thread.py", "_worker")}
+
+
+def label(code: CodeType) -> str:
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def collapse(samples: "Counter[Sample]") -> str:
+    """Format the samples as collapsed stacks, thread name then root first"""
+    lines = Counter()
+    for (thread, stack), count in samples.items():
+        lines[";".join((thread, *(label(code) for code in reversed(stack))))] += count
+    return "".join(f"{stack} {count}\n" for stack, count in lines.items())
+
+
+def read_collapsed(path: Path) -> "Counter[str]":
+    stacks: "Counter[str]" = Counter()
+    if path.exists():
+        for line in path.read_text(encoding="utf-8").splitlines():
+            stack, _, count = line.rpartition(" ")
+            if stack and count.isdigit():
+                stacks[stack] += int(count)
+    return stacks
+
+
+def top(stacks: "Counter[str]", n: int = 15) -> List[Tuple[str, int, int]]:
+    """The `n` functions taking the most samples: (function, self samples, total samples)"""
+    own: "Counter[str]" = Counter()
+    total: "Counter[str]" = Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(";")
+        own[frames[-1]] += count
+        for frame in set(frames):
+            total[frame] += count
+    return [(frame, count, total[frame]) for frame, count in own.most_common(n)]
+
+
+class SamplingProfiler:
+    """Sample the stacks of the fuzzer (`start`/`stop`) and of the executors it forks (`start_executor`/`stop_executor`)"""
+
+    def __init__(self, path: Path, *, interval: float = 0.005, max_depth: int = 128) -> None:
+        self.path = path
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples: "Counter[Sample]" = Counter()
+        self.threads: Dict[int, str] = {}  # thread id -> name
+        self.ticks = 0  # signals received by the fuzzer, one sample per running thread each
+        self._previous = None
+
+    def stack(self, frame: Optional[FrameType]) -> Stack:
+        stack = []
+        while frame is not None and len(stack) < self.max_depth:
+            stack.append(frame.f_code)
+            frame = frame.f_back
+        return tuple(stack)
+
+    def _sample(self, signum: int, frame: Optional[FrameType]) -> None:
+        # the handler runs in the main thread: `frame` is where it was interrupted
+        self.ticks += 1
+        main = threading.main_thread().ident
+        self.samples[(self.thread_name(main), self.stack(frame))] += 1
+        for ident, other in sys._current_frames().items():
+            module = os.path.basename(other.f_code.co_filename)
+            if ident == main or module in IDLE_MODULES or (module, other.f_code.co_name) in IDLE_FUNCTIONS:
+                continue
+            self.samples[(self.thread_name(ident), self.stack(other))] += 1
+
+    def thread_name(self, ident: int) -> str:
+        if (name := self.threads.get(ident, None)) is None:
+            # `threading.enumerate` takes a lock the interrupted thread may hold, the dict is read as is
+            thread = threading._active.get(ident, None)
+            name = self.threads[ident] = thread.name if thread is not None else f"thread-{ident}"
+        return name
+
+    def start(self) -> None:
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.path.joinpath("executors.collapsed").unlink(missing_ok=True)
+        self.samples.clear()
+        self.ticks = 0
+        self._previous = signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self) -> None:
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        if self._previous is not None:
+            signal.signal(signal.SIGPROF, self._previous)
+            self._previous = None
+
+    def start_executor(self) -> None:
+        """Sample a forked executor (the timers are not inherited, the samples of the parent are)"""
+        self.samples = Counter()
+        signal.signal(signal.SIGPROF, self._sample)
+        signal.signal(signal.SIGTERM, self._terminated)
+        # the executors are shorter than the interval: a random first sample keeps their profile unbiased
+        signal.setitimer(signal.ITIMER_PROF, random.uniform(1e-6, self.interval), self.interval)
+
+    def _terminated(self, signum: int, frame: Optional[FrameType]) -> None:
+        """Write the samples of an executor terminated on timeout (the hangs), then terminate it"""
+        self.stop_executor()
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        os.kill(os.getpid(), signal.SIGTERM)
+
+    def stop_executor(self) -> None:
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        samples, self.samples = self.samples, Counter()  # written once, even if terminated meanwhile
+        if not samples:
+            return
+        # one write appending all the stacks of the executor
+        fd = os.open(self.path.joinpath("executors.collapsed"), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, collapse(samples).encode())
+        finally:
+            os.close(fd)
+
+    def write(self) -> Dict[str, "Counter[str]"]:
+        """Write the samples of the fuzzer, returning the stacks of the fuzzer and of the executors"""
+        self.path.joinpath("fuzzer.collapsed").write_text(collapse(self.samples), encoding="utf-8")
+        return {
+            "fuzzer": read_collapsed(self.path.joinpath("fuzzer.collapsed")),
+            "executors": read_collapsed(self.path.joinpath("executors.collapsed")),
+        }
+
+    def summary(self, n: int = 15) -> str:
+        """Write the samples and summarize the hot functions"""
+        lines: List[str] = []
+        for name, stacks in self.write().items():
+            count = sum(stacks.values())
+            ticks = self.ticks if name == "fuzzer" else count  # the executors only run their main thread
+            lines.append(f"Profile of the {name}: {count} samples ({ticks * self.interval:.2f}s of CPU)")
+            for frame, own, total in (top(stacks, n) if count else []):
+                lines.append(f"  {own / count:6.1%} self {total / count:6.1%} total  {frame}")
+        lines.append(f"Collapsed stacks written to {self.path}")
+        return "\n".join(lines)
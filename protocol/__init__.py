@@ -1,5 +1,8 @@
-import logging
+from typing import Dict
+from importlib import import_module
 from enum import Enum
+import logging
+import time
 
 from seed import Seed
 from exception import SeedNotFound
@@ -16,36 +19,51 @@ class Protocol(Enum):
 
     @classmethod
     def new(cls, protocol: str) -> "Protocol":
-        if protocol == 'ftp':
-            return cls.FTP
-        if protocol == 'smtp':
-            return cls.SMTP
-        if protocol == 'dns':
-            return cls.DNS
-        if protocol == 'dicom':
-            return cls.DICOM
-        raise Exception("No such protocol")
+        try:
+            return cls[protocol.upper()]
+        except KeyError:
+            raise Exception("No such protocol")
+
+
+# Registry of the modules providing the initial seed of each protocol. A module is only
+# imported the first time its seed is requested and must expose `SEED`; it may also
+# expose a `prepare()` hook creating what the seed needs at execution time (dummy files, ...).
+SEED_MODULES: Dict[Protocol, str] = {
+    Protocol.FTP: "protocol.ftp",
+    Protocol.SMTP: "protocol.smtp",
+    Protocol.DNS: "protocol.dns",
+    Protocol.DICOM: "protocol.dicom",
+}
+
+# Seconds spent loading (importing and preparing) the seed module of each protocol
+LOAD_TIME: Dict[Protocol, float] = {}
 
 
+def register_seed(protocol: Protocol, module: str) -> None:
+    """Register (or override) the module providing the initial seed of `protocol`"""
+    SEED_MODULES[protocol] = module
+    LOAD_TIME.pop(protocol, None)
+
 
 def new_seed(protocol: Protocol) -> Seed:
     """Construct the corresponding seed"""
-    SEED = None
-
-    if protocol == Protocol.FTP:
-        from protocol.ftp import SEED
-    if protocol == Protocol.SMTP:
-        from protocol.smtp import SEED
-    if protocol == Protocol.DNS:
-        from protocol.dns import SEED
-    if protocol == Protocol.DICOM:
-        from protocol.dicom import SEED
-    
+    if (module_name := SEED_MODULES.get(protocol, None)) is None:
+        raise SeedNotFound(f"No seed found for {protocol.name}")
+
+    start = time.perf_counter()
+    module = import_module(module_name)
+    if protocol not in LOAD_TIME:
+        if (prepare := getattr(module, "prepare", None)) is not None:
+            prepare()
+        LOAD_TIME[protocol] = time.perf_counter() - start
+        logger.debug(f"Loaded {protocol.name} seed module in {LOAD_TIME[protocol] * 1000:.2f}ms")
+
+    SEED = getattr(module, "SEED", None)
     if SEED is None:
         raise SeedNotFound(f"No seed found for {protocol.name}")
-    
+
     if SEED.len() == 0:
         logger.warning("The initial seed has no api call.")
 
     logger.debug(f"Use {protocol.name} seed")
-    return SEED
\ No newline at end of file
+    return SEED
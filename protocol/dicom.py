@@ -1,7 +1,15 @@
 """Seed for [DICOM](https://www.dicomstandard.org/current)"""
 from enum import Enum
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import logging
+import random
+import struct
+import warnings
 
-from pydicom import dcmread
+from pydicom import config
+from pydicom.dataelem import DataElement
 from pydicom.dataset import Dataset, FileDataset
 
 
@@ -11,6 +19,160 @@ from seed import Seed
 from utils import PATH_DUMMY
 
 dummy_file = PATH_DUMMY.joinpath("test.dcm")
+logger = logging.getLogger("fazz.protocol.dicom")
+
+
+@lru_cache(maxsize=None)
+def load_dataset(path: Path) -> FileDataset:
+    """Parse a DICOM file once per process"""
+    from pydicom import dcmread
+    return dcmread(path)
+
+
+def prepare() -> None:
+    """
+    Parse the dummy file when the seed is first requested, so that forked executors inherit it,
+    and let pynetdicom send the pre-encoded datasets as they are
+    """
+    install_encoder()
+    if dummy_file.exists():
+        load_dataset(dummy_file)
+    else:
+        logger.warning(f"No such DICOM file: {dummy_file}, `send_c_store` will fail")
+
+
+# VRs encoded with a 4-byte length in explicit VR
+LONG_VRS = {b"OB", b"OD", b"OF", b"OL", b"OV", b"OW", b"SQ", b"SV", b"UC", b"UN", b"UR", b"UT", b"UV"}
+
+# Bytes worth writing into a value: bounds, and the backslash separating multiple values
+INTERESTING_BYTES = (0x00, 0x01, 0x7F, 0x80, 0xFF, 0x5C, 0x20)
+
+SyntaxKey = Tuple[bool, bool]  # implicit VR, little endian
+
+
+def index_elements(buffer: bytes, implicit: bool, little: bool) -> List[Tuple[int, int, int]]:
+    """(tag, value offset, value length) of the top-level elements of an encoded dataset"""
+    endian = '<' if little else '>'
+    elements: List[Tuple[int, int, int]] = []
+    offset = 0
+    while offset + 8 <= len(buffer):
+        group, element = struct.unpack_from(endian + "HH", buffer, offset)
+        if implicit:
+            length, = struct.unpack_from(endian + "I", buffer, offset + 4)
+            value = offset + 8
+        elif bytes(buffer[offset + 4:offset + 6]) in LONG_VRS:
+            length, = struct.unpack_from(endian + "I", buffer, offset + 8)
+            value = offset + 12
+        else:
+            length, = struct.unpack_from(endian + "H", buffer, offset + 6)
+            value = offset + 8
+        if length == 0xFFFFFFFF:
+            break  # undefined length (sequence), the rest of the dataset is not indexed
+        elements.append(((group << 16) | element, value, length))
+        offset = value + length
+    return elements
+
+
+def mutate_byte(value: memoryview, position: int, operation: int, byte: int) -> None:
+    """Mutate the byte at `position` of a value in place, preserving its length"""
+    if operation == 0:    # flip a bit
+        value[position] ^= 1 << (byte % 8)
+    elif operation == 1:  # random byte
+        value[position] = byte
+    elif operation == 2:  # interesting byte
+        value[position] = INTERESTING_BYTES[byte % len(INTERESTING_BYTES)]
+    else:                 # repeat the byte till the end of the value
+        value[position:] = bytes([value[position]]) * (len(value) - position)
+
+
+class EncodedDataset(Dataset):
+    """
+    A dataset sent as cached encoded bytes. Mutations change the bytes of element values in place
+    (through memoryviews, preserving their length) and are never re-encoded: the elements of the
+    dataset itself stay untouched, so that pynetdicom still selects the presentation context from them.
+    A dataset pynetdicom cannot encode has its elements mutated instead (never its UIDs).
+    """
+    def __init__(self, dataset: Dataset) -> None:
+        super().__init__(dataset)
+        # what pynetdicom reads besides the elements: the transfer syntax of the file and its encoding
+        if (file_meta := getattr(dataset, "file_meta", None)) is not None:
+            self.file_meta = file_meta
+        self.preamble = getattr(dataset, "preamble", None)
+        self.set_original_encoding(*dataset.original_encoding, dataset.original_character_set)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", DeprecationWarning)  # still read by pynetdicom, deprecated by pydicom 3
+            self.is_little_endian = dataset.is_little_endian
+            self.is_implicit_VR = dataset.is_implicit_VR
+        self._buffers: Dict[SyntaxKey, bytearray] = {}
+        self._elements: Dict[SyntaxKey, Dict[int, Tuple[int, int]]] = {}
+        self._mutations: List[Tuple[int, int, int, int]] = []  # tag, position in the value, operation, byte
+
+    def encoded(self, is_implicit_vr: bool = True, is_little_endian: bool = True) -> Optional[bytes]:
+        """The (mutated) dataset encoded with the given transfer syntax, encoding it once"""
+        key = (is_implicit_vr, is_little_endian)
+        if (buffer := self._buffers.get(key, None)) is None:
+            from pynetdicom.dsutils import encode
+            if (raw := encode(Dataset(self), is_implicit_vr, is_little_endian)) is None:
+                return None
+            buffer = self._buffers[key] = bytearray(raw)
+            self._elements[key] = {tag: (value, length) for tag, value, length
+                                   in index_elements(buffer, is_implicit_vr, is_little_endian)}
+            for mutation in self._mutations:
+                self._apply(key, *mutation)
+        return bytes(buffer)
+
+    def mutate(self) -> None:
+        """Mutate one byte of the value of a random element"""
+        if not self._buffers and self.encoded() is None:
+            # pynetdicom cannot encode the dataset: mutate its elements, encoded when sent
+            self._mutate_elements()
+            return
+        candidates = [(tag, length) for tag, (_, length) in next(iter(self._elements.values())).items() if length > 0]
+        if not candidates:
+            return
+
+        tag, length = random.choice(candidates)
+        mutation = (tag, random.randrange(length), random.randrange(4), random.randrange(256))
+        self._mutations.append(mutation)
+        for key in self._buffers:
+            self._apply(key, *mutation)
+
+    def _apply(self, key: SyntaxKey, tag: int, position: int, operation: int, byte: int) -> None:
+        if (element := self._elements[key].get(tag, None)) is None or position >= element[1]:
+            return
+        mutate_byte(memoryview(self._buffers[key])[element[0]:element[0] + element[1]], position, operation, byte)
+
+    def _mutate_elements(self) -> None:
+        """Mutate one byte of the value of a random text or bytes element of the dataset itself"""
+        candidates = [elem for elem in self if elem.VR != "UI" and isinstance(elem.value, (str, bytes)) and elem.value]
+        if not candidates:
+            return
+
+        elem = random.choice(candidates)
+        text = isinstance(elem.value, str)
+        value = bytearray(elem.value.encode("latin-1", "replace") if text else elem.value)
+        mutate_byte(memoryview(value), random.randrange(len(value)), random.randrange(4), random.randrange(256))
+        # the elements are shared with the wrapped dataset: replaced in a copy, never changed in place
+        self._dict = dict(self._dict)
+        self[elem.tag] = DataElement(elem.tag, elem.VR, value.decode("latin-1") if text else bytes(value),
+                                     validation_mode=config.IGNORE)  # invalid values are the point
+
+
+def install_encoder() -> None:
+    """Make pynetdicom send the cached bytes of the `EncodedDataset`s instead of encoding them"""
+    import pynetdicom.association as association
+    if getattr(association.encode, "encoded_datasets", False):
+        return
+
+    original = association.encode
+
+    def encode(ds: Dataset, is_implicit_vr: bool, is_little_endian: bool, deflated: bool = False) -> Optional[bytes]:
+        if isinstance(ds, EncodedDataset) and not deflated:
+            return ds.encoded(is_implicit_vr, is_little_endian)
+        return original(ds, is_implicit_vr, is_little_endian, deflated)
+
+    encode.encoded_datasets = True
+    association.encode = encode
 
 
 def defaul_dataset() -> Dataset:
@@ -24,19 +186,31 @@ def defaul_dataset() -> Dataset:
 
 class DICOMDatasetArg(Arg[Dataset]):
     def mutate(self) -> None:
-        return 
+        if not isinstance(self.value, EncodedDataset):
+            self.value = EncodedDataset(self.value)
+        self.value.mutate()
 
     def unpack(self):
         return self.value
 
 
-class DICOMFileDatasetArg(Arg[FileDataset]):
+class DICOMFileDatasetArg(Arg[Path]):
+    """
+    Dataset read from a DICOM file. The file is only parsed on the first unpack,
+    so that importing this module does not pay for `dcmread`.
+    """
+    encoded: Optional[EncodedDataset] = None  # the mutated dataset, once mutated
+
     def mutate(self) -> None:
-        # A lot of mutation can be done
-        return 
+        if self.encoded is None:
+            try:
+                self.encoded = EncodedDataset(load_dataset(self.value))
+            except OSError:
+                return
+        self.encoded.mutate()
 
-    def unpack(self):
-        return self.value
+    def unpack(self) -> Dataset:
+        return self.encoded if self.encoded is not None else load_dataset(self.value)
 
 
 class SOPClassFind(Enum):
@@ -91,7 +265,7 @@ SEED = Seed([
         NumberArg(1, name='msg_id')
     ]),
     Fn('send_c_store', [
-        DICOMFileDatasetArg(dcmread(dummy_file))
+        DICOMFileDatasetArg(dummy_file)
     ]),
     Fn('send_c_find', [
         DICOMDatasetArg(defaul_dataset()), 
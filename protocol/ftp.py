@@ -1,15 +1,7 @@
 """Seed for FTP"""
-from seed.arg import FileDescriptorArg, BooleanArg, StringArg, NumberArg, CallableArg
+from seed.arg import PayloadArg, BooleanArg, StringArg, NumberArg, CallableArg
 from seed.fn import Fn
 from seed import Seed
-from utils import PATH_DUMMY
-
-
-
-# Create the dummy file temp.txt
-PATH_DUMMY.mkdir(exist_ok=True)
-dummy_file = PATH_DUMMY.joinpath('temp.txt')
-dummy_file.write_text("Hello")
 
 
 def __simple_callback(data) -> None:
@@ -26,11 +18,11 @@ SEED = Seed([
 
     Fn("cwd", [StringArg("test")]),
 
-    Fn("storbinary", [StringArg("STOR temp1.txt"), FileDescriptorArg(dummy_file)]),
-    Fn("storbinary", [StringArg("APPE temp1.txt"), FileDescriptorArg(dummy_file)]),
+    Fn("storbinary", [StringArg("STOR temp1.txt"), PayloadArg(b"Hello")]),
+    Fn("storbinary", [StringArg("APPE temp1.txt"), PayloadArg(b"Hello")]),
 
-    Fn("storlines", [StringArg("STOR temp2.txt"), FileDescriptorArg(dummy_file)]),
-    Fn("storlines", [StringArg("APPE temp2.txt"), FileDescriptorArg(dummy_file)]),
+    Fn("storlines", [StringArg("STOR temp2.txt"), PayloadArg(b"Hello")]),
+    Fn("storlines", [StringArg("APPE temp2.txt"), PayloadArg(b"Hello")]),
 
     Fn("rename", [StringArg("temp2.txt"), StringArg("test.txt")]),
 
@@ -1,18 +1,25 @@
-from typing import List, Any
+from typing import Callable, List, Any, Optional, Tuple, TYPE_CHECKING
 from copy import deepcopy
 from enum import Enum
 import logging
 from pathlib import Path
 import pickle
+import time
 
 from seed.fn import Fn
-from exception import FnExecFailed
+from exception import FnExecFailed, FnTimeout
 from utils import get_local_time
 
+if TYPE_CHECKING:
+    from gcov import Coverage
 
 SEED_INDEX = 0
 logger = logging.getLogger("fazz.seed")
 
+# Reply codes standing for an API call without a code from the server
+CODE_OK = 0
+CODE_FAILED = -1
+
 
 class SeedStatus(Enum):
     Timeout = -1
@@ -34,27 +41,74 @@ class Seed:
         self.succ_count: int = 0
         self.fail_count: int = 0
 
-    def execute(self, obj: object) -> None:
+        self.coverage: Optional["Coverage"] = None  # per-execution coverage, when collected
+
+        # (reply code, succeeded) of every API call run by the last execution
+        self.trace: List[Tuple[int, bool]] = []
+
+        # Scheduling: mutate from the API call at `focus`, targeting the protocol state `target_state`
+        self.focus: int = 0
+        self.target_state: Optional[int] = None
+
+        # Level of the stack depth, when mutated by the havoc stage
+        self.havoc_level: Optional[int] = None
+
+        # Latency of the last execution (seconds)
+        self.exec_time: Optional[float] = None
+
+        # Why the last execution missed a deadline: "call" (an api call stalled) or "budget" (the sequence ran out of time)
+        self.timeout_category: Optional[str] = None
+
+    def execute(self, obj: object, *, before: Optional[Callable[[int], None]] = None, deadline: Optional[float] = None,
+                budget: Optional[float] = None, abort: bool = False) -> None:
         """
         Execute the seed
         
         Args:
             obj (object): The corresponding client or library for executing the seed (APIs)
-
-        Returns True when execution timeouts, otherwise False
+            before (Callable): Called with the index of every api call before executing it
+            deadline (float): Seconds every api call may block on the sockets of the client
+            budget (float): Seconds of the whole sequence, the api calls left are not run once spent
+            abort (bool): Stop at the first api call missing its deadline instead of running the next ones
         """
         self.execute_count += 1
-        for fn in self.fns:
+        self.trace = []
+        self.timeout_category = None
+        end = time.perf_counter() + budget if budget is not None else None
+        for index, fn in enumerate(self.fns):
+            limit, clamped = deadline, False  # whether the budget left is shorter than the deadline
+            if end is not None:
+                if (left := end - time.perf_counter()) <= 0:
+                    self.timeout_category = "budget"
+                    break
+                clamped = limit is None or left < limit
+                limit = left if clamped else limit
+
+            if before is not None:
+                before(index)
             try:
                 logger.debug(f"Executing {fn.fn_name}: {fn}")
-                fn.execute(obj)
+                code = fn.execute(obj, deadline=limit)
+                self.trace.append((code if code is not None else CODE_OK, True))
                 self.succ_count += 1
 
                 if fn.is_last:
                     break
-            except FnExecFailed:
+            except FnTimeout:
+                self.trace.append((CODE_FAILED, False))
+                self.fail_count += 1
+                self.timeout_category = "budget" if clamped else "call"
+                if abort or self.timeout_category == "budget":
+                    break
+            except FnExecFailed as e:
+                self.trace.append((e.code if e.code is not None else CODE_FAILED, False))
                 self.fail_count += 1  
 
+    @property
+    def codes(self) -> Tuple[int, ...]:
+        """The reply codes of the last execution"""
+        return tuple(code for code, _ in self.trace)
+
     def save(self, path: Path, status: SeedStatus) -> None:
         """
         Save this seed (Interesting or Crash) into binary file by pickling
@@ -77,6 +131,11 @@ class Seed:
     def copy(self) -> "Seed":
         new_seed: Seed = deepcopy(self)
         new_seed.succ_count = new_seed.fail_count = 0
+        new_seed.coverage = None
+        new_seed.trace = []
+        new_seed.havoc_level = None
+        new_seed.timeout_category = None
+        new_seed.exec_time = None
         return new_seed
         
     def len(self) -> int:
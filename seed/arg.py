@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
-from typing import Tuple, Union, Callable, TypeVar, Generic
-from io import BufferedReader, TextIOWrapper
+from typing import Dict, Tuple, Union, Callable, TypeVar, Generic
+from io import BufferedReader, BytesIO, TextIOWrapper
 from pathlib import Path
 from enum import Enum
 import sys
@@ -109,6 +109,99 @@ class FileDescriptorArg(Arg[Path]):
         return self.value.open('rb')
 
 
+class PayloadPool:
+    """
+    Interned payloads shared by every `PayloadArg` of the process (seed copies, mutants and the seeds
+    loaded back), plus a block of random filler the growing mutations slice from
+    """
+    def __init__(self, *, limit: int = 64 * 1024 * 1024, filler_size: int = 1024 * 1024) -> None:
+        self.limit = limit  # bytes interned before the pool is flushed
+        self.size = 0
+        self.payloads: Dict[bytes, bytes] = {}
+        self.filler_size = filler_size
+        self._filler = None
+
+    def intern(self, data: bytes) -> bytes:
+        data = bytes(data)
+        if (interned := self.payloads.get(data, None)) is not None:
+            return interned
+        if self.size + len(data) > self.limit:
+            self.payloads.clear()
+            self.size = 0
+        self.payloads[data] = data
+        self.size += len(data)
+        return data
+
+    @property
+    def filler(self) -> memoryview:
+        if self._filler is None:
+            self._filler = memoryview(random.randbytes(self.filler_size))
+        return self._filler
+
+
+PAYLOAD_POOL = PayloadPool()
+
+# Bytes of interest in the data sent: line endings, the end of an SMTP message, NUL, non-ASCII
+INTERESTING_PAYLOADS = (b"\r\n", b"\n", b"\r", b"\r\n.\r\n", b"\x00", b"\xff", b"\xc3\xa9", b"%s%n")
+
+
+class PayloadArg(Arg[bytes]):
+    """
+    Argument wrapper for the data of a transfer (e.g. FTP `storbinary`), kept in memory and unpacked
+    as a fresh `BytesIO`, which shares the payload until written
+    """
+    def __init__(self, value: bytes, *, mutable: bool = True, name: str = "", nullable: bool = False,
+                 max_size: int = 4 * 1024 * 1024) -> None:
+        super().__init__(PAYLOAD_POOL.intern(value), mutable=mutable, name=name, nullable=nullable)
+        self.max_size = max_size
+
+    def mutate(self) -> None:
+        size = len(self.value)
+        choice = random.randint(1, 6) if size else random.choice((3, 4))
+        data = bytearray(self.value)
+        if choice == 1:    # flip bytes
+            view = memoryview(data)
+            for _ in range(random.randint(1, 8)):
+                pos = random.randrange(size)
+                view[pos] ^= 1 << random.randrange(8)
+            view.release()
+        elif choice == 2:  # truncation
+            del data[random.randrange(size):]
+        elif choice == 3:  # interesting bytes
+            pos = random.randint(0, size)
+            data[pos:pos] = random.choice(INTERESTING_PAYLOADS)
+        elif choice == 4:  # growth, up to multi-megabyte bodies
+            filler = PAYLOAD_POOL.filler
+            length = min(random.choice((1 << random.randrange(4, 23), random.randrange(1, 4096))), self.max_size - size)
+            start = random.randrange(len(filler))
+            while length > 0:
+                chunk = filler[start:start + length]
+                data += chunk
+                length -= len(chunk)
+                start = 0
+        elif choice == 5:  # duplicate a block
+            pos1, pos2 = sorted((random.randrange(size), random.randrange(size + 1)))
+            data[pos2:pos2] = data[pos1:pos2]
+        else:              # deletion of a block
+            pos1, pos2 = sorted((random.randrange(size), random.randrange(size + 1)))
+            del data[pos1:pos2]
+        self.value = PAYLOAD_POOL.intern(data[:self.max_size])
+
+    def unpack(self) -> BytesIO:
+        return BytesIO(self.value)
+
+    def __setstate__(self, state) -> None:
+        self.__dict__.update(state)
+        self.value = PAYLOAD_POOL.intern(self.value)
+
+    def __repr__(self) -> str:
+        return f"<{type(self)} {len(self.value)} bytes>"
+
+    def __str__(self) -> str:
+        preview = self.value[:16] + (b"..." if len(self.value) > 16 else b"")
+        return f"<PayloadArg {len(self.value)} bytes {preview!r}>"
+
+
 class CallableArg(Arg[Callable]):
     """
     Argument wrapper for function
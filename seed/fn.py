@@ -1,14 +1,65 @@
 import logging
-from typing import List
+import re
+from io import IOBase
+from types import GeneratorType
+from typing import Any, List, Optional
 
 from colorama import Fore
 
 from seed.arg import Arg
-from exception import FnExecFailed, FnNotFound
+from exception import FnExecFailed, FnNotFound, FnTimeout
 
 
 logger = logging.getLogger("fazz.seed.fn")
 
+REPLY_CODE = re.compile(r"\s*(\d{3})\b")
+
+
+def reply_code(value: Any) -> Optional[int]:
+    """
+    Extract the protocol reply code from what a client returned or raised:
+    FTP reply strings, SMTP `(code, msg)` tuples and exceptions, DNS answers and DICOM status datasets.
+    """
+    if value is None:
+        return None
+    if isinstance(value, tuple) and value and isinstance(value[0], int):
+        return value[0]
+    if isinstance(value, (str, bytes)):
+        match = REPLY_CODE.match(value.decode(errors="replace") if isinstance(value, bytes) else value)
+        return int(match.group(1)) if match is not None else None
+    if isinstance(code := getattr(value, "smtp_code", None), int):
+        return code
+    if (response := getattr(value, "response", None)) is not None and hasattr(response, "rcode"):
+        return int(response.rcode())
+    if type(value).__name__ == "NXDOMAIN":
+        return 3
+    if isinstance(status := getattr(value, "Status", None), int):
+        return status
+    if isinstance(value, BaseException) and value.args:
+        return reply_code(value.args[0])
+    return None
+
+
+def set_deadline(obj: object, seconds: float) -> None:
+    """
+    Bound the socket operations of a client to `seconds`: the sockets of ftplib/smtplib (and their
+    next data connections), the resolution lifetime of dnspython, the network timeouts of pynetdicom
+    """
+    if (sock := getattr(obj, "sock", None)) is not None:
+        sock.settimeout(seconds)
+    for attr in ("timeout", "lifetime", "dimse_timeout", "network_timeout", "acse_timeout"):
+        if hasattr(obj, attr):
+            setattr(obj, attr, seconds)
+
+
+def timed_out(e: BaseException) -> bool:
+    """Whether a failure comes from a deadline, possibly wrapped by the client (e.g. SMTPServerDisconnected)"""
+    while e is not None:
+        if isinstance(e, TimeoutError) or type(e).__name__.endswith("Timeout"):
+            return True
+        e = e.__cause__ or e.__context__
+    return False
+
 
 class Fn:
     """
@@ -25,13 +76,17 @@ class Fn:
     def is_last(self) -> bool:
         return self._is_last
 
-    def execute(self, obj: object):
+    def execute(self, obj: object, *, deadline: Optional[float] = None) -> Optional[int]:
         """
         Args:
             obj (object): The corresponding client
+            deadline (float): Seconds the socket operations of the call may block, unbounded by default
+
+        Returns the reply code of the server, None if it cannot be told
 
         Raises:
             FnNotFound: When the function is not found in the client
+            FnTimeout: When the call misses its deadline
             ExecutionFailed: When the client fails to execute the given function 
                 (including exceptions raised by the executed function when it handles error messages from the server )
         """
@@ -41,12 +96,37 @@ class Fn:
             logger.error(f"No such function: {self.fn_name}")
             raise FnNotFound(f"No such function: {self.fn_name}")
 
+        if deadline is not None:
+            set_deadline(obj, deadline)
+
+        lastresp = getattr(obj, "lastresp", None)
+        args: List[Any] = []
         try:
-            resp = real_fn(*[arg.unpack() for arg in self.args])
+            # unpacking may fail too (e.g. a missing dataset file), as a failed call
+            for arg in self.args:
+                args.append(arg.unpack())
+            resp = real_fn(*args)
+            if isinstance(resp, GeneratorType):
+                # e.g. DICOM C-FIND yielding (status, identifier), the request is only sent when iterated
+                statuses = [status for status, *_ in resp]
+                resp = statuses[-1] if statuses else None
             logger.debug(f'''{Fore.GREEN}Execution succeed{Fore.RESET}: {self.fn_name} - {resp}''')
         except Exception as e:
             logger.debug(f'''{Fore.RED}Execution failed{Fore.RESET}: {self.fn_name} - {e}''')
-            raise FnExecFailed
+            if deadline is not None and timed_out(e):
+                raise FnTimeout(f"{self.fn_name} missed its deadline of {deadline:.3f}s")
+            raise FnExecFailed(code=reply_code(e))
+        finally:
+            # the files unpacked (e.g. uploaded data) are only used by this call
+            for arg in args:
+                if isinstance(arg, IOBase):
+                    arg.close()
+
+        # ftplib keeps the code of the last reply, whatever the API returns; the calls sending nothing
+        # (e.g. `set_pasv`) leave the code of the previous one
+        if (current := getattr(obj, "lastresp", None)) is not lastresp and (code := reply_code(current)) is not None:
+            return code
+        return reply_code(resp)
 
     def __str__(self) -> str:
         return f"{self.fn_name}({','.join([str(arg) for arg in self.args])})"
\ No newline at end of file
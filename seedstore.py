@@ -0,0 +1,160 @@
+"""
+Bounded-memory store of the queue seeds.
+
+The queue only grows, and every seed holds deep-copied argument objects (datasets, payloads...):
+long campaigns run out of memory when they are all kept alive. The store pickles every seed appended
+into on-disk segments and only keeps alive an LRU set of the seeds recently used (those the scheduler
+is working on), within `memory_limit` bytes. The other seeds are loaded back on access, from a
+memory-mapped segment once it is full, with `pread` from the segment being written otherwise.
+
+Queue seeds must not change once appended: changes to a seed are lost when it is evicted (and are not
+in the checkpoints), unless the seed is stored again with `update` while still live.
+"""
+from collections import OrderedDict
+from collections.abc import Sequence
+from array import array
+from pathlib import Path
+from typing import Iterable, List, Optional, Union
+import mmap
+import os
+import pickle
+import shutil
+import tempfile
+import weakref
+import logging
+
+from seed import Seed
+
+
+logger = logging.getLogger("fazz.seedstore")
+
+
+class SeedStore(Sequence):
+    """A sequence of seeds spilled to disk, with an LRU set of live seeds"""
+
+    def __init__(self, seeds: Iterable[Seed] = (), *, path: Optional[Path] = None,
+                 memory_limit: int = 256 * 1024 * 1024, segment_size: int = 64 * 1024 * 1024) -> None:
+        self.memory_limit = memory_limit  # bytes of the live seeds (measured pickled)
+        self.segment_size = segment_size  # bytes of a segment before starting the next one
+
+        self._owned = path is None  # a temporary directory, removed when closed
+        self.path = Path(tempfile.mkdtemp(prefix="fazz-queue-")) if path is None else path
+        self.path.mkdir(parents=True, exist_ok=True)
+        # the temporary directory is also removed when the campaign stops without closing the store
+        self._finalizer = weakref.finalize(self, shutil.rmtree, self.path, True) if self._owned else None
+
+        # Metadata of every seed: where its pickle is
+        self.segments = array('H')
+        self.offsets = array('Q')
+        self.sizes = array('I')
+
+        # Segment files, the last one being written, the others memory-mapped once read
+        self._files: List = []
+        self._maps: List[Optional[mmap.mmap]] = []
+        self._written = 0  # bytes of the last segment
+
+        # Live seeds: queue index -> seed, least recently used first
+        self.live: "OrderedDict[int, Seed]" = OrderedDict()
+        self.live_size = 0
+        self.loads = 0  # seeds loaded back from the disk
+
+        for seed in seeds:
+            self.append(seed)
+
+    def append(self, seed: Seed) -> None:
+        data = pickle.dumps(seed, protocol=pickle.HIGHEST_PROTOCOL)
+        self.segments.append(0)
+        self.offsets.append(0)
+        self.sizes.append(0)
+        self._write(len(self.offsets) - 1, data)
+        self._keep(len(self.offsets) - 1, seed)
+
+    def update(self, index: int) -> None:
+        """Store again the live seed at `index`, changed since appended (e.g. by the dry run)"""
+        if (seed := self.live.get(index, None)) is None:
+            return
+        data = pickle.dumps(seed, protocol=pickle.HIGHEST_PROTOCOL)
+        self.live_size -= self.sizes[index]
+        self._write(index, data)  # the previous pickle is left unused in its segment
+        self.live_size += len(data)
+
+    def _write(self, index: int, data: bytes) -> None:
+        if not self._files or (self._written and self._written + len(data) > self.segment_size):
+            self._new_segment()
+
+        file = self._files[-1]
+        file.write(data)
+        file.flush()
+        self.segments[index] = len(self._files) - 1
+        self.offsets[index] = self._written
+        self.sizes[index] = len(data)
+        self._written += len(data)
+
+    def extend(self, seeds: Iterable[Seed]) -> None:
+        for seed in seeds:
+            self.append(seed)
+
+    def _new_segment(self) -> None:
+        self._files.append(self.path.joinpath(f"segment-{len(self._files):05d}").open("w+b"))
+        self._maps.append(None)
+        self._written = 0
+
+    def _keep(self, index: int, seed: Seed) -> None:
+        """Make the seed live, evicting the least recently used ones beyond the memory limit"""
+        self.live[index] = seed
+        self.live_size += self.sizes[index]
+        while self.live_size > self.memory_limit and len(self.live) > 1:
+            evicted, _ = self.live.popitem(last=False)
+            self.live_size -= self.sizes[evicted]
+
+    def pickled(self, index: int) -> bytes:
+        """The seed at `index` as pickled when appended, without loading it"""
+        segment, offset, size = self.segments[index], self.offsets[index], self.sizes[index]
+        if segment == len(self._files) - 1:
+            return os.pread(self._files[segment].fileno(), size, offset)
+        if (mapped := self._maps[segment]) is None:
+            mapped = self._maps[segment] = mmap.mmap(self._files[segment].fileno(), 0, access=mmap.ACCESS_READ)
+        return mapped[offset:offset + size]
+
+    def _load(self, index: int) -> Seed:
+        self.loads += 1
+        return pickle.loads(self.pickled(index))
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("seed store index out of range")
+
+        if (seed := self.live.get(index, None)) is not None:
+            self.live.move_to_end(index)
+            return seed
+        seed = self._load(index)
+        self._keep(index, seed)
+        return seed
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def index(self, seed: Seed, start: int = 0, stop: Optional[int] = None) -> int:
+        """The index of a live seed (compared by identity, without loading the others)"""
+        for index, live in self.live.items():
+            if live is seed and start <= index < (stop if stop is not None else len(self)):
+                return index
+        raise ValueError("seed is not live in the store")
+
+    def close(self) -> None:
+        for mapped in self._maps:
+            if mapped is not None:
+                mapped.close()
+        for file in self._files:
+            file.close()
+        self._maps, self._files = [], []
+        if self._finalizer is not None:
+            self._finalizer()
+
+    def __str__(self) -> str:
+        return f"seeds: {len(self)} ({len(self.live)} live, {self.live_size / 1024 / 1024:.1f}MB)"
@@ -1,15 +1,20 @@
 """Server wrappers"""
 import os
+import shutil
 import subprocess
 import re
 import signal
+import threading
+from contextlib import nullcontext
 import logging
 from pathlib import Path
 from configparser import ConfigParser
-from typing import Optional, Tuple, Union
+from typing import Dict, List, Optional, Tuple, Union
 from abc import ABC, abstractmethod
 
 from utils import Addr
+from snapshot import Snapshot
+from namespace import Namespace
 from exception import ServerConfigNotFound, ServerTerminated, ServerNotStarted
 
 logger = logging.getLogger("server")
@@ -20,29 +25,57 @@ class Server(ABC):
     """Abstract server wrapper"""
     name = "ServerWrapper"
 
-    def __init__(self, cmd: str, path: str, root: str, host: str, port: str, clean: Optional[str] = None) -> None:
+    def __init__(self, cmd: str, path: str, root: str, host: str, port: str, clean: Optional[str] = None,
+                 snapshot: Optional[str] = None, snapshot_store: Optional[str] = None,
+                 isolate: Union[bool, str] = False, private: str = "") -> None:
         self.cmd: str = cmd
         self.cmd_cleanup: Optional[str] = clean
         
-        self.path: str = path
+        # The server, `root` (of the coverage) and the `clean` command run in `path`, the working directory
+        # of the fuzzer itself never changes
+        self.path: str = os.path.abspath(path) if path else os.getcwd()
         self.root: str = root
-        self.old_path: str = ""
+        self.argv: Optional[List[str]] = None  # `cmd` with its executable resolved, on the first start
+
+        # Run the server in its own user, network and mount namespaces, with a private copy of
+        # the `private` directories (comma separated, relative to `path`)
+        self.namespace: Optional[Namespace] = None
+        if str(isolate).lower() in ("1", "yes", "true", "on"):
+            self.namespace = Namespace([Path(self.path, p.strip()) for p in private.split(",") if p.strip()])
+
+        # The directory the server writes into (relative to `path`), restored from a pristine
+        # snapshot after every execution instead of running the `clean` command
+        self.snapshot: Optional[Snapshot] = None
+        if snapshot is not None:
+            snapshot_root = Path(self.path, snapshot)
+            if self.namespace is not None:
+                snapshot_root = self.namespace.host_path(snapshot_root)
+            self.snapshot = Snapshot(snapshot_root, store=Path(snapshot_store) if snapshot_store else None)
 
         self.__host = host
         self.__port = int(port)
 
         self.proc: Optional[subprocess.Popen] = None
+        self.spawn_lock: Optional[threading.Lock] = None  # held while spawning, set by the fuzzer
+        self.env: Dict[str, str] = {}  # extra environment variables of the next start
 
     @property
     def addr(self) -> Addr:
         return (self.__host, self.__port)
 
     def _start(self) -> subprocess.Popen:
-        if self.path:
-            self.old_path = os.getcwd()
-            os.chdir(self.path)
-
-        self.proc = subprocess.Popen(self.cmd.split(' '), stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        if self.snapshot is not None and not self.snapshot.taken:
+            self.snapshot.take()
+
+        # Without `preexec_fn`, the server is spawned with vfork: the child does not copy the page tables
+        # of the fuzzer, and nothing process-wide changes, so several servers can start concurrently
+        argv = self.resolve()
+        with self.spawn_lock if self.spawn_lock is not None else nullcontext():
+            self.proc = subprocess.Popen(argv, executable=argv[0], cwd=self.path,
+                                         env={**os.environ, **self.env},
+                                         stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                         close_fds=True, restore_signals=True,
+                                         preexec_fn=self.namespace.preexec if self.namespace is not None else None)
         if self.proc is None:
             raise ServerNotStarted("Cannot start server properly!")
         if self.proc.returncode:
@@ -50,6 +83,22 @@ class Server(ABC):
         logger.debug(f"Server is up at {self.addr}, pid is {self.proc.pid}")
         return self.proc
 
+    def resolve(self) -> List[str]:
+        """The arguments of the server, its executable made absolute (relative to `path`, or from `PATH`)"""
+        if self.argv is None:
+            argv = self.cmd.split(' ')
+            if os.sep in argv[0]:
+                executable = os.path.join(self.path, argv[0])
+            elif (executable := shutil.which(argv[0], path=os.environ.get("PATH", os.defpath))) is None:
+                raise ServerNotStarted(f"Cannot find the server executable {argv[0]}")
+            self.argv = [os.path.normpath(executable), *argv[1:]]
+        return self.argv
+
+    def enter(self) -> None:
+        """Make the current process reach the server, called by the executors before connecting"""
+        if self.namespace is not None and self.proc is not None:
+            self.namespace.enter(self.proc.pid)
+
     @abstractmethod
     def _terminate(self) -> int:
         pass
@@ -63,7 +112,8 @@ class Server(ABC):
         For now, we use gcovr to collect the coverage for convenience.
         In the future, we will use approach like that used by AFL to collect runtime code coverage 
         """
-        gcovr_proc = subprocess.Popen(f"gcovr -r {self.root} -s | grep [lb][ir][a-z]*:", stdout=subprocess.PIPE, stdin=subprocess.DEVNULL, stderr=subprocess.DEVNULL, shell=True)
+        gcovr_proc = subprocess.Popen(f"gcovr -r {self.root} -s | grep [lb][ir][a-z]*:", stdout=subprocess.PIPE, stdin=subprocess.DEVNULL, stderr=subprocess.DEVNULL, shell=True,
+                                      cwd=self.path)
         output = gcovr_proc.communicate()[0].decode().split('\n')
 
         ln_per, ln_abs = "", ""
@@ -103,10 +153,16 @@ class Target(Server):
     
     def _cleanup(self) -> int:
         """Do cleanup"""
+        if self.snapshot is not None:
+            self.snapshot.restore()
+            return 0
+
         if self.cmd_cleanup is None:
             return 0
         logger.debug(f"Executing cleanup command: {self.cmd_cleanup}")
-        proc_cleanup = subprocess.run(self.cmd_cleanup, shell=True)
+        proc_cleanup = subprocess.run(self.cmd_cleanup, shell=True, cwd=self.path)
+        if proc_cleanup.returncode != 0:
+            logger.warning(f"Cleanup command exited with {proc_cleanup.returncode}: {self.cmd_cleanup}")
         return proc_cleanup.returncode
 
 
@@ -0,0 +1,170 @@
+"""
+SMTP execution over a raw socket, pipelining the commands when the target advertises PIPELINING (RFC 2920).
+
+`smtplib` waits for the reply of every command before sending the next one. This engine translates the
+API calls of a seed into SMTP commands and writes whole groups of them (`mail`/`rcpt`/.../`data`) at once,
+then splits the batched replies back into the outcome of every API call. Without PIPELINING, the commands
+are still sent over the raw socket, one at a time. Seeds with calls it cannot translate (authentication,
+`sendmail`, ...) are left to `smtplib`.
+"""
+import socket
+import logging
+from email.utils import parseaddr
+from smtplib import quoteaddr
+from typing import Callable, Dict, List, Optional, Tuple
+
+from utils import Addr
+from seed import Seed, CODE_FAILED
+from seed.fn import Fn, REPLY_CODE
+
+
+logger = logging.getLogger("fazz.smtppipeline")
+
+CRLF = b"\r\n"
+
+# Commands allowed in the middle of a pipelined group, the others end it (RFC 2920, section 3.1)
+GROUPABLE = {b"MAIL", b"RCPT", b"RSET"}
+
+QUICKACK = hasattr(socket, "TCP_QUICKACK")
+
+Command = Tuple[bytes, Optional[bytes]]  # command line, message sent after a 354 reply (DATA)
+
+
+def address_only(address: str) -> str:
+    return parseaddr(address)[1] or address
+
+
+def message_body(msg) -> bytes:
+    """The message of DATA with CRLF line endings and dot-stuffing, terminated like `smtplib.SMTP.data`"""
+    body = msg.encode("ascii", errors="surrogateescape") if isinstance(msg, str) else bytes(msg)
+    body = body.replace(b"\r\n", b"\n").replace(b"\r", b"\n").replace(b"\n", CRLF)
+    lines = [b"." + line if line.startswith(b".") else line for line in body.split(CRLF)]
+    body = CRLF.join(lines)
+    if not body.endswith(CRLF):
+        body += CRLF
+    return body + b"." + CRLF
+
+
+class SMTPPipeline:
+    """Execute SMTP seeds over a raw socket"""
+
+    def __init__(self, *, timeout: float = 2.0) -> None:
+        self.timeout = timeout  # waiting for one reply
+
+        # API call -> builder of its command from the arguments, as sent by `smtplib`
+        self.commands: Dict[str, Callable[..., Command]] = {
+            "noop": lambda: (b"NOOP", None),
+            "rset": lambda: (b"RSET", None),
+            "quit": lambda: (b"QUIT", None),
+            "help": lambda args="": (f"HELP {args}".strip().encode(), None),
+            "helo": lambda name="": (f"HELO {name or self.local_name}".encode(), None),
+            "ehlo": lambda name="": (f"EHLO {name or self.local_name}".encode(), None),
+            "expn": lambda address: (f"EXPN {address_only(address)}".encode(), None),
+            "vrfy": lambda address: (f"VRFY {address_only(address)}".encode(), None),
+            "verify": lambda address: (f"VRFY {address_only(address)}".encode(), None),
+            "mail": lambda sender, options=(): (f"MAIL FROM:{quoteaddr(sender)}{''.join(' ' + o for o in options)}".encode(), None),
+            "rcpt": lambda recipient, options=(): (f"RCPT TO:{quoteaddr(recipient)}{''.join(' ' + o for o in options)}".encode(), None),
+            "data": lambda msg: (b"DATA", message_body(msg)),
+            "docmd": lambda cmd, args="": (f"{cmd} {args}".strip().encode(), None),
+        }
+
+        self.local_name = "[127.0.0.1]"
+        self.pipelining = False
+        self.groups = 0
+        self.commands_sent = 0
+
+    def supports(self, seed: Seed) -> bool:
+        return all(fn.fn_name in self.commands for fn in seed.fns)
+
+    def translate(self, fn: Fn) -> Optional[Command]:
+        try:
+            return self.commands[fn.fn_name](*[arg.unpack() for arg in fn.args])
+        except Exception as e:
+            logger.debug(f"Cannot translate {fn}: {e}")
+            return None
+
+    def execute(self, seed: Seed, addr: Addr, *, timeout: Optional[float] = None) -> List[Tuple[int, bool]]:
+        """
+        Execute the seed against the target at `addr`, waiting `timeout` seconds at most for every
+        reply (`self.timeout` by default)
+
+        Returns the trace of the seed: (reply code, succeeded) of every API call run
+        """
+        fns: List[Fn] = []
+        for fn in seed.fns:
+            fns.append(fn)
+            if fn.is_last:
+                break
+
+        trace: List[Tuple[int, bool]] = []
+        try:
+            sock = socket.create_connection(addr, timeout=timeout if timeout is not None else self.timeout)
+        except OSError:
+            return [(CODE_FAILED, False)] * len(fns)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # the groups are written at once anyway
+
+        self.pipelining = False
+        self.local_name = f"[{sock.getsockname()[0]}]"
+        reader = sock.makefile("rb")
+        try:
+            self.reply(reader)  # banner
+            group: List[Tuple[Fn, Optional[Command]]] = []
+            for fn in fns:
+                group.append((fn, command := self.translate(fn)))
+                if not self.pipelining or command is None or command[0].split(b" ")[0].upper() not in GROUPABLE:
+                    trace.extend(self.send_group(sock, reader, group))
+                    group = []
+            trace.extend(self.send_group(sock, reader, group))
+        except OSError:
+            trace.extend([(CODE_FAILED, False)] * (len(fns) - len(trace)))
+        finally:
+            reader.close()
+            sock.close()
+        return trace
+
+    def send_group(self, sock: socket.socket, reader, group: List[Tuple[Fn, Optional[Command]]]) -> List[Tuple[int, bool]]:
+        """Write the commands of the group at once, then read one reply for each"""
+        if not group:
+            return []
+
+        payload = b"".join(command[0] + CRLF for _, command in group if command is not None)
+        if payload:
+            sock.sendall(payload)
+            self.groups += 1
+            self.commands_sent += sum(command is not None for _, command in group)
+
+        outcomes: List[Tuple[int, bool]] = []
+        for fn, command in group:
+            if command is None:
+                outcomes.append((CODE_FAILED, False))  # `smtplib` would raise before sending anything
+                continue
+
+            if QUICKACK:
+                # ACK the replies at once: a target flushing the reply of every pipelined command
+                # otherwise waits for the delayed ACK of the previous one (Nagle)
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+            code, lines = self.reply(reader)
+            if fn.fn_name == "ehlo" and code == 250:
+                self.pipelining = any(line[4:].strip().upper().startswith(b"PIPELINING") for line in lines[1:])
+
+            if (message := command[1]) is not None:
+                if code != 354:
+                    outcomes.append((code, False))  # `smtplib` raises SMTPDataError
+                    continue
+                sock.sendall(message)
+                code, _ = self.reply(reader)
+            outcomes.append((code, True))
+        return outcomes
+
+    def reply(self, reader) -> Tuple[int, List[bytes]]:
+        """Read one (possibly multiline) reply"""
+        lines: List[bytes] = []
+        while True:
+            line = reader.readline(8192)
+            if not line:
+                raise ConnectionResetError("Connection closed by the target")
+            lines.append(line.rstrip(CRLF))
+            if len(line) < 4 or line[3:4] != b"-":
+                break
+        match = REPLY_CODE.match(lines[-1].decode(errors="replace"))
+        return (int(match.group(1)) if match is not None else CODE_FAILED), lines
@@ -0,0 +1,158 @@
+"""Fast reset of the directory a server writes into"""
+import os
+import shutil
+import stat
+import tempfile
+import weakref
+import logging
+from pathlib import Path
+from typing import Dict, Optional, Set, Tuple
+
+from exception import ServerResetFailed
+
+
+logger = logging.getLogger("fazz.snapshot")
+
+FICLONE = 0x40049409  # ioctl request cloning a file on reflink-capable filesystems (btrfs, xfs, ...)
+PATH_TMPFS = Path("/dev/shm")
+
+# (file type, inode, size, mtime in ns, permission bits) of one entry
+Signature = Tuple[int, int, int, int, int]
+
+
+def signature(st: os.stat_result) -> Signature:
+    if stat.S_ISDIR(st.st_mode):
+        # the mtime of a directory changes with its entries, which are compared one by one
+        return (stat.S_IFDIR, st.st_ino, 0, 0, stat.S_IMODE(st.st_mode))
+    return (stat.S_IFMT(st.st_mode), st.st_ino, st.st_size, st.st_mtime_ns, stat.S_IMODE(st.st_mode))
+
+
+def clone_file(src: str, dst: str) -> None:
+    """Copy a regular file, sharing its extents (reflink) when the filesystem supports it"""
+    try:
+        import fcntl
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+    except (ImportError, OSError):
+        shutil.copyfile(src, dst)
+    shutil.copystat(src, dst)
+
+
+class Snapshot:
+    """
+    Pristine copy of a directory, restored after every execution.
+
+    Only the entries whose signature differs from the one recorded when the snapshot
+    was taken (or last restored) are copied back, and the entries created since are removed,
+    so that a reset costs a directory walk instead of a shell command.
+    """
+
+    def __init__(self, root: Path, *, store: Optional[Path] = None) -> None:
+        self.root = Path(root).absolute()
+
+        # Keep the pristine copy on tmpfs when available
+        store_dir = store if store is not None else (PATH_TMPFS if PATH_TMPFS.is_dir() else None)
+        self.store = Path(tempfile.mkdtemp(prefix="fazz-snapshot-", dir=store_dir))
+        self._finalizer = weakref.finalize(self, shutil.rmtree, self.store, True)
+
+        self.manifest: Dict[str, Signature] = {}
+        self.taken = False
+
+    def take(self) -> None:
+        """Copy the current content of the directory as the pristine state"""
+        if not self.root.is_dir():
+            raise ServerResetFailed(f"No such directory to snapshot: {self.root}")
+
+        shutil.rmtree(self.store, ignore_errors=True)
+        shutil.copytree(self.root, self.store, symlinks=True, copy_function=clone_file)
+
+        self.manifest.clear()
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            for name in dirnames + filenames:
+                path = os.path.join(dirpath, name)
+                self.manifest[os.path.relpath(path, self.root)] = signature(os.lstat(path))
+
+        self.taken = True
+        logger.debug(f"Snapshot of {self.root} taken ({len(self.manifest)} entries)")
+
+    def restore(self) -> int:
+        """
+        Restore the directory to the pristine state
+
+        Returns the number of entries removed or copied back
+        """
+        if not self.taken:
+            raise ServerResetFailed(f"No snapshot taken for {self.root}")
+
+        try:
+            changed = 0
+            seen: Set[str] = set()
+            for dirpath, dirnames, filenames in os.walk(self.root):
+                for name in list(dirnames):
+                    path = os.path.join(dirpath, name)
+                    rel = os.path.relpath(path, self.root)
+                    expected = self.manifest.get(rel, None)
+                    st = os.lstat(path)
+                    if expected is None or expected[0] != stat.S_IFDIR or not stat.S_ISDIR(st.st_mode):
+                        # new directory (or replaced), the pristine entry (if any) is copied back below
+                        self._remove(path)
+                        dirnames.remove(name)
+                        changed += 1
+                        continue
+                    if expected[4] != stat.S_IMODE(st.st_mode):
+                        os.chmod(path, expected[4])
+                        changed += 1
+                    seen.add(rel)
+
+                for name in filenames:
+                    path = os.path.join(dirpath, name)
+                    rel = os.path.relpath(path, self.root)
+                    expected = self.manifest.get(rel, None)
+                    if expected is None:
+                        os.unlink(path)
+                        changed += 1
+                        continue
+                    if expected != signature(os.lstat(path)):
+                        os.unlink(path)
+                        self._copy_back(rel)
+                        changed += 1
+                    seen.add(rel)
+
+            # entries removed during the execution, parents first
+            for rel in sorted(self.manifest.keys() - seen, key=lambda rel: rel.count(os.sep)):
+                if not os.path.lexists(os.path.join(self.root, rel)):
+                    self._copy_back(rel)
+                    changed += 1
+        except OSError as e:
+            raise ServerResetFailed(f"Cannot restore {self.root}: {e}")
+
+        logger.debug(f"Snapshot of {self.root} restored ({changed} entries changed)")
+        return changed
+
+    def close(self) -> None:
+        """Remove the pristine copy"""
+        self._finalizer()
+
+    def _copy_back(self, rel: str) -> None:
+        src = os.path.join(self.store, rel)
+        dst = os.path.join(self.root, rel)
+
+        st = os.lstat(src)
+        if stat.S_ISDIR(st.st_mode):
+            shutil.copytree(src, dst, symlinks=True, copy_function=clone_file)
+            for dirpath, dirnames, filenames in os.walk(dst):
+                for name in dirnames + filenames:
+                    path = os.path.join(dirpath, name)
+                    self.manifest[os.path.relpath(path, self.root)] = signature(os.lstat(path))
+        elif stat.S_ISLNK(st.st_mode):
+            os.symlink(os.readlink(src), dst)
+        else:
+            clone_file(src, dst)
+        self.manifest[rel] = signature(os.lstat(dst))
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        else:
+            os.unlink(path)
@@ -0,0 +1,134 @@
+"""
+Protocol state model inferred from the reply codes (AFLNet-style).
+
+Every reply code observed during `Seed.execute` is a state of the server, and two consecutive
+replies are a transition. The model keeps, for every state, the seeds reaching it and how
+productive fuzzing from it was, so that the scheduler can focus on rarely visited or recently
+productive states instead of picking seeds blindly.
+"""
+import math
+import random
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from seed import Seed, CODE_OK, CODE_FAILED
+
+
+logger = logging.getLogger("fazz.state")
+
+INITIAL_STATE = -2  # before the first reply
+
+
+class StateInfo:
+    """Statistics of one state"""
+
+    __slots__ = ("code", "visits", "selected", "fuzzed", "discovered", "seeds")
+
+    def __init__(self, code: int) -> None:
+        self.code = code
+        self.visits = 0       # executions reaching the state
+        self.selected = 0     # times the state was targeted by the scheduler
+        self.fuzzed = 0       # mutants executed while targeting the state
+        self.discovered = 0   # interesting mutants found while targeting the state
+
+        # (queue index, position of the API call reaching the state) of the seeds reaching it
+        self.seeds: List[Tuple[int, int]] = []
+
+    @property
+    def score(self) -> float:
+        """Energy of the state: high when rarely fuzzed and productive (the AFLNet formula)"""
+        rarity = math.pow(2, -math.log10(math.log10(self.fuzzed + 1) * self.selected + 1))
+        productivity = math.pow(2, math.log(self.discovered + 1))
+        return 1000 * rarity * productivity
+
+    @property
+    def label(self) -> str:
+        if self.code == INITIAL_STATE:
+            return "init"
+        if self.code == CODE_OK:
+            return "ok"
+        if self.code == CODE_FAILED:
+            return "failed"
+        return str(self.code)
+
+
+class StateModel:
+
+    def __init__(self) -> None:
+        self.states: Dict[int, StateInfo] = {}
+        self.transitions: Dict[Tuple[int, int], int] = {}
+
+    def state(self, code: int) -> StateInfo:
+        if (info := self.states.get(code, None)) is None:
+            info = self.states[code] = StateInfo(code)
+            logger.debug(f"New state: {info.label}")
+        return info
+
+    def update(self, seed: Seed, interesting: bool) -> bool:
+        """
+        Learn from the reply codes of an executed seed
+
+        Returns True if a state or a transition was never seen before
+        """
+        new = False
+        previous = INITIAL_STATE
+        self.state(INITIAL_STATE).visits += 1
+        for code in seed.codes:
+            new |= code not in self.states
+            self.state(code).visits += 1
+
+            transition = (previous, code)
+            new |= transition not in self.transitions
+            self.transitions[transition] = self.transitions.get(transition, 0) + 1
+            previous = code
+
+        if (target := getattr(seed, "target_state", None)) is not None and target in self.states:
+            self.states[target].fuzzed += 1
+            if interesting or new:
+                self.states[target].discovered += 1
+        return new
+
+    def add_seed(self, index: int, seed: Seed) -> None:
+        """Register the seed at position `index` of the queue to every state it reaches"""
+        self.state(INITIAL_STATE).seeds.append((index, 0))
+        reached = set()
+        for position, code in enumerate(seed.codes):
+            if code not in reached:
+                reached.add(code)
+                # mutate the API calls after the one whose reply leads to the state
+                self.state(code).seeds.append((index, position + 1))
+
+    def select(self) -> Optional[StateInfo]:
+        """Choose the state to target, weighted by score"""
+        candidates = [info for info in self.states.values() if info.seeds]
+        if not candidates:
+            return None
+
+        info = random.choices(candidates, [info.score for info in candidates])[0]
+        info.selected += 1
+        return info
+
+    def schedule(self, queue: Sequence[Seed], n: int) -> List[Tuple[Seed, int, int]]:
+        """
+        Choose `n` seeds to mutate
+
+        Returns (seed, position from which to mutate, targeted state) triples
+        """
+        selected: List[Tuple[Seed, int, int]] = []
+        for _ in range(n):
+            if (info := self.select()) is None:
+                break
+            index, position = random.choice(info.seeds)
+            selected.append((queue[index], position, info.code))
+        return selected
+
+    def to_dot(self) -> str:
+        """The inferred state graph in Graphviz format"""
+        lines = ["digraph states {"]
+        for info in self.states.values():
+            lines.append(f'  "{info.label}" [label="{info.label}\\nvisits={info.visits} fuzzed={info.fuzzed} '
+                         f'discovered={info.discovered}"];')
+        for (src, dst), count in self.transitions.items():
+            lines.append(f'  "{self.states[src].label}" -> "{self.states[dst].label}" [label="{count}"];')
+        lines.append("}")
+        return "\n".join(lines) + "\n"
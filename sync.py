@@ -0,0 +1,121 @@
+"""
+Corpus synchronization between fuzzer instances through a shared directory (AFL `-M`/`-S`).
+
+Every instance owns `<sync dir>/<name>/`: it publishes its interesting seeds (pickled with their
+coverage) under `queue/`, then appends their file names to the append-only `index`. An instance
+imports the seeds of the others by reading their indexes from the byte offset reached the last time
+(its watermark, persisted in `watermarks.json`): a sync round never lists the seeds already imported.
+The main instance imports from every instance, the secondaries only from the main ones.
+
+The sync directory may be a network mount: the seeds are written to a temporary file and renamed
+before being indexed, and only the complete lines of an index are read.
+"""
+from pathlib import Path
+from typing import Dict, Iterator, List
+import json
+import os
+import pickle
+import logging
+
+from seed import Seed
+
+
+logger = logging.getLogger("fazz.sync")
+
+ROLE_MAIN = "main"
+ROLE_SECONDARY = "secondary"
+
+
+class SyncDir:
+    """The directory of this instance in the sync directory, and the watermarks of the others"""
+
+    def __init__(self, root: Path, name: str, *, main: bool = True) -> None:
+        if not name or os.sep in name or name.startswith('.'):
+            raise ValueError(f"Invalid instance name: {name!r}")
+
+        self.root = root
+        self.name = name
+        self.main = main
+        self.path = root.joinpath(name)
+        self.path.joinpath("queue").mkdir(parents=True, exist_ok=True)
+        self.path.joinpath("role").write_text(ROLE_MAIN if main else ROLE_SECONDARY)
+
+        self.index = self.path.joinpath("index")
+        self.index.touch()
+        with self.index.open("rb") as file:
+            self.published = sum(1 for _ in file)  # resume the numbering after a restart
+
+        # instance -> offset of its index already read
+        self.watermarks: Dict[str, int] = {}
+        if (path := self.path.joinpath("watermarks.json")).exists():
+            try:
+                self.watermarks = json.loads(path.read_text(encoding="utf-8"))
+            except ValueError as e:
+                logger.warning(f"Ignore the corrupted watermarks {path}: {e}")
+
+        self.imported = 0
+
+    def publish(self, seed: Seed) -> None:
+        """Publish an interesting seed of this instance"""
+        name = f"{self.published:06d}"
+        tmp = self.path.joinpath("queue", f".{name}.tmp")
+        tmp.write_bytes(pickle.dumps(seed, protocol=pickle.HIGHEST_PROTOCOL))
+        os.replace(tmp, self.path.joinpath("queue", name))
+
+        # the seed is complete before it is indexed, with one write of the whole line
+        fd = os.open(self.index, os.O_WRONLY | os.O_APPEND)
+        try:
+            os.write(fd, f"{name}\n".encode())
+        finally:
+            os.close(fd)
+        self.published += 1
+
+    def peers(self) -> List[str]:
+        """The instances this one imports from"""
+        peers: List[str] = []
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if entry.name == self.name or entry.name.startswith('.') or not entry.is_dir():
+                    continue
+                if not self.main:
+                    try:
+                        if Path(entry.path, "role").read_text().strip() != ROLE_MAIN:
+                            continue
+                    except OSError:
+                        continue
+                peers.append(entry.name)
+        return peers
+
+    def fetch(self) -> Iterator[Seed]:
+        """The seeds published by the other instances since the last fetch"""
+        for peer in self.peers():
+            index = self.root.joinpath(peer, "index")
+            offset = self.watermarks.get(peer, 0)
+            try:
+                with index.open("rb") as file:
+                    file.seek(offset)
+                    data = file.read()
+            except OSError:
+                continue
+
+            # a line being appended is read again next time
+            complete = data[:data.rfind(b"\n") + 1]
+            for line in complete.splitlines():
+                try:
+                    seed = pickle.loads(self.root.joinpath(peer, "queue", line.decode().strip()).read_bytes())
+                except Exception as e:
+                    logger.warning(f"Skip the seed {line!r} of {peer}: {e}")
+                    continue
+                self.imported += 1
+                yield seed
+
+            self.watermarks[peer] = offset + len(complete)
+            self.save_watermarks()
+
+    def save_watermarks(self) -> None:
+        tmp = self.path.joinpath(".watermarks.json.tmp")
+        tmp.write_text(json.dumps(self.watermarks), encoding="utf-8")
+        os.replace(tmp, self.path.joinpath("watermarks.json"))
+
+    def __str__(self) -> str:
+        return f"sync: {self.published} published, {self.imported} imported"
@@ -0,0 +1,26 @@
+from typing import Callable, Iterable, Optional
+
+import pytest
+
+from gcov import Coverage
+from seed import Seed
+from seed.fn import Fn
+
+
+@pytest.fixture
+def make_seed() -> Callable[..., Seed]:
+    """
+    Build a seed of the API calls named, `quit` ending it. With `codes`, the seed is executed
+    and the calls got these reply codes (failing from 400); with `lines`, it covered these lines
+    in `exec_time`
+    """
+    def make(*names: str, codes: Optional[Iterable[int]] = None, lines: Optional[Iterable[str]] = None,
+             exec_time: Optional[float] = None) -> Seed:
+        seed = Seed([Fn(name, is_last=name == "quit") for name in names])
+        if codes is not None:
+            seed.trace = [(code, code < 400) for code in codes]
+        if lines is not None:
+            seed.coverage = Coverage(frozenset(lines), frozenset())
+        seed.exec_time = exec_time
+        return seed
+    return make
@@ -0,0 +1,23 @@
+from catalog import Catalog, introspect, SOURCES
+from mutator import InsMutator
+from protocol import Protocol
+from seed import Seed
+from seed.arg import StringArg
+from seed.fn import Fn
+
+
+class TestCatalog:
+
+    def test_introspect(self):
+        apis = {name: (kinds, required) for name, kinds, required in introspect(SOURCES[Protocol.SMTP])}
+        assert apis["mail"] == (("str",), 1)
+        assert apis["noop"] == ((), 0)
+        assert "quit" not in apis and "connect" not in apis
+
+    def test_insert_before_last(self):
+        seed = Seed([Fn("helo"), Fn("mail", [StringArg("a@b")]), Fn("quit", is_last=True)])
+        mutator = InsMutator(catalog=Catalog.load(Protocol.SMTP, seed, cache=False))
+        for _ in range(50):
+            mutant = mutator.mutate(seed)
+            assert mutant.len() == seed.len() + 1
+            assert mutant[-1].fn_name == "quit"
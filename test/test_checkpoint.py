@@ -0,0 +1,51 @@
+import random
+
+import pytest
+
+from checkpoint import Checkpointer
+from seed import Seed
+from seed.arg import StringArg
+from seed.fn import Fn
+from seedstore import SeedStore
+from utils import Timer
+
+
+def make_seed(i: int) -> Seed:
+    return Seed([Fn("noop", [StringArg(f"seed{i}")])])
+
+
+class TestCheckpoint:
+
+    def test_incremental_save_and_load(self, tmp_path):
+        queue = SeedStore([make_seed(i) for i in range(3)])
+        try:
+            checkpointer = Checkpointer(tmp_path)
+            timer = Timer()
+            timer.count()
+            assert checkpointer.save({"timer": timer, "random": random.getstate()}, queue)
+            checkpointer.wait()
+
+            queue.extend(make_seed(i) for i in range(3, 5))
+            timer.count()
+            checkpointer.save({"timer": timer, "random": random.getstate()}, queue)
+            checkpointer.wait()
+            size = tmp_path.joinpath("queue").stat().st_size
+
+            # a checkpoint interrupted after appending its seeds
+            with tmp_path.joinpath("queue").open("ab") as file:
+                file.write(b"\x10\x00\x00\x00partial")
+
+            state, seeds = Checkpointer.load(tmp_path)
+            assert state["timer"].epoch_count == 2
+            assert [str(seed) for seed in seeds] == [str(make_seed(i)) for i in range(5)]
+
+            # resuming drops the partial seeds, starting over needs to overwrite the checkpoint
+            assert Checkpointer(tmp_path, resume=True).seeds == 5
+            assert tmp_path.joinpath("queue").stat().st_size == size
+            with pytest.raises(FileExistsError):
+                Checkpointer(tmp_path)
+            assert tmp_path.joinpath("state").exists()
+            Checkpointer(tmp_path, overwrite=True)
+            assert not tmp_path.joinpath("state").exists()
+        finally:
+            queue.close()
@@ -0,0 +1,26 @@
+from dependency import DependencyModel
+
+
+class TestDependencyModel:
+
+    def test_learn_and_repair(self, make_seed):
+        model = DependencyModel(min_failures=2)
+        for _ in range(3):
+            model.observe(make_seed("mail", "rcpt", codes=[250, 250]))
+            model.observe(make_seed("rcpt", "mail", codes=[503, 250]))
+
+        assert model.requires("rcpt") == {"mail"}
+        assert model.requires("mail") == set()
+
+        seed = make_seed("rcpt", "mail")
+        assert model.doomed(seed) == 0
+        assert model.repair(seed)
+        assert [fn.fn_name for fn in seed.fns] == ["mail", "rcpt"]
+
+        wasted = model.wasted
+        assert model.observe(make_seed("rcpt", codes=[503]))
+        assert model.wasted == wasted + 1
+
+        # the rate only counts the executions observed once the first dependency was learned
+        assert model.learned_at == 4 and model.executions == 7
+        assert str(model) == "wasted (deps off): 2/3 (66.7%) since execution 4"
@@ -0,0 +1,69 @@
+from copy import deepcopy
+
+from pydicom import config, dcmread
+from pydicom.dataelem import DataElement
+from pydicom.data import get_testdata_file
+from pynetdicom import AE, evt, StoragePresentationContexts
+
+from protocol.dicom import EncodedDataset, defaul_dataset, index_elements, install_encoder
+
+
+class TestEncodedDataset:
+
+    def test_mutate_in_place(self):
+        dataset = EncodedDataset(defaul_dataset())
+        original = dataset.encoded()
+        assert [tag for tag, _, _ in index_elements(original, True, True)] == [0x00080052, 0x00100020, 0x0020000D, 0x0020000E]
+
+        mutant = deepcopy(dataset)
+        for _ in range(8):
+            mutant.mutate()
+        assert len(mutant.encoded()) == len(original)
+        assert dataset.encoded() == original
+
+        # the mutations are replayed on the encodings made later
+        assert len(mutant.encoded(False, True)) == len(dataset.encoded(False, True))
+        assert mutant.PatientID == dataset.PatientID
+
+    def test_mutate_unencodable(self):
+        plain = defaul_dataset()
+        # pynetdicom fails to encode it
+        plain[0x00280010] = DataElement(0x00280010, "US", "not a number", validation_mode=config.IGNORE)
+        dataset = EncodedDataset(plain)
+        assert dataset.encoded() is None
+
+        for _ in range(8):
+            dataset.mutate()
+        assert [str(elem.value) for elem in dataset] != [str(elem.value) for elem in plain]
+        assert plain.PatientID == "1234567"  # the wrapped dataset is untouched
+        assert dataset.StudyInstanceUID == plain.StudyInstanceUID
+
+    def test_send_c_store(self):
+        install_encoder()
+        received = []
+
+        def handle_store(event):
+            received.append(event.request.DataSet.getvalue())
+            return 0x0000
+
+        scp = AE()
+        scp.supported_contexts = StoragePresentationContexts
+        server = scp.start_server(("127.0.0.1", 0), block=False, evt_handlers=[(evt.EVT_C_STORE, handle_store)])
+        try:
+            # wrapping a file keeps what C-STORE reads besides the elements
+            dataset = EncodedDataset(dcmread(get_testdata_file("CT_small.dcm")))
+            assert dataset.file_meta.TransferSyntaxUID == "1.2.840.10008.1.2.1"
+            assert dataset.original_encoding == (False, True) and dataset.preamble is not None
+            dataset.mutate()
+
+            scu = AE()
+            scu.add_requested_context(dataset.SOPClassUID, dataset.file_meta.TransferSyntaxUID)
+            assoc = scu.associate(*server.server_address)
+            assert assoc.is_established
+            try:
+                assert assoc.send_c_store(dataset).Status == 0x0000
+            finally:
+                assoc.release()
+        finally:
+            server.shutdown()
+        assert received == [dataset.encoded(False, True)]
@@ -0,0 +1,60 @@
+import socket
+import threading
+
+from dnsbatch import DNSBatchEngine, HEADER
+from protocol import Protocol, new_seed
+
+
+def serve(sock):
+    """Answer every query with its own header, QR set and NXDOMAIN, until an empty datagram"""
+    while (data := sock.recvfrom(4096))[0]:
+        query, addr = data
+        if len(query) >= HEADER.size:
+            ident, flags, *counts = HEADER.unpack_from(query)
+            sock.sendto(HEADER.pack(ident, flags | 0x8003, *counts) + query[HEADER.size:], addr)
+
+
+class TestDNSBatchEngine:
+
+    def test_batch_matched_by_id(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        server.bind(("127.0.0.1", 0))
+        threading.Thread(target=serve, args=[server], daemon=True).start()
+        addr = server.getsockname()
+        try:
+            engine = DNSBatchEngine(variants=2000, window=128)
+            seed = new_seed(Protocol.DNS)
+            assert engine.execute(seed, addr) == [(3, True)]
+            assert engine.sent == 2001
+            assert engine.answered > 1900  # only the queries truncated within the header go unanswered
+            assert str(engine) == f"dns: 2001 queries, {engine.answered / 2001:.1%} answered"
+
+            assert engine.queries(seed)[1] == engine.queries(seed)[1]
+        finally:
+            socket.socket(socket.AF_INET, socket.SOCK_DGRAM).sendto(b"", addr)
+            server.close()
+
+    def test_late_responses(self):
+        class LateSocket:
+            """Answers every window only once the next one is sent"""
+            def __init__(self):
+                self.windows, self.pending = [], []
+
+            def send(self, packets):
+                self.pending = [packet + b"!" for window in self.windows[-1:] for packet in window]
+                self.windows.append(packets)
+                return len(packets)
+
+            def wait(self, timeout):
+                return bool(self.pending)
+
+            def recv(self):
+                received, self.pending = self.pending, []
+                return received
+
+        engine = DNSBatchEngine(window=2, timeout=0.01)
+        queries = [bytes([0, 0, i]) for i in range(6)]
+        responses = engine.send(LateSocket(), queries)
+        # the late responses are credited to their own queries, never to the window being sent
+        assert responses[:4] == [b"\x00\x00\x00!", b"\x00\x01\x01!", b"\x00\x02\x02!", b"\x00\x03\x03!"]
+        assert responses[4:] == [None, None]
@@ -0,0 +1,30 @@
+from favored import TopRated
+
+
+class TestTopRated:
+
+    def test_cull(self, make_seed):
+        top_rated = TopRated()
+        queue = [make_seed("noop", lines={"a:1", "a:2", "a:3"}, exec_time=1.0),
+                 make_seed("noop", lines={"a:1", "a:4"}, exec_time=0.5),
+                 make_seed("noop", lines={"a:2", "a:3"}, exec_time=0.1)]
+        for index, seed in enumerate(queue):
+            top_rated.add(index, seed)
+
+        # the faster seeds took over every element of the first one, which lost its bitset
+        assert 0 not in top_rated.bits and 0 not in top_rated.refs
+        assert sorted(top_rated.cull()) == [1, 2]
+
+        # a slower seed wins nothing, a longer one only what it covers alone
+        assert not top_rated.add(3, make_seed("noop", lines={"a:1"}, exec_time=1.0))
+        assert top_rated.add(4, make_seed("noop", "noop", "noop", lines={"a:5"}, exec_time=1.0))
+        assert sorted(top_rated.cull()) == [1, 2, 4]
+
+        queue.extend([make_seed("noop", lines={"a:1"}, exec_time=1.0), make_seed("noop", "noop", "noop", lines={"a:5"}, exec_time=1.0)])
+        queue.extend(make_seed("noop", lines={"a:1"}, exec_time=2.0) for _ in range(10))
+        picked = top_rated.select(queue, 4)
+        assert len({id(seed) for seed in picked}) == 4
+        assert {id(queue[index]) for index in (1, 2, 4)} < {id(seed) for seed in picked}
+
+        # small queues are mutated whole, once per seed
+        assert top_rated.select(queue[:3], 5) == queue[:3]
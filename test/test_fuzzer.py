@@ -0,0 +1,41 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from fuzzer import Fuzzer
+from gcov import CoverageMap
+from seed import Seed, SeedStatus
+
+
+class SlowGcov:
+    """gcov taking `delay` seconds per execution"""
+    def __init__(self, delay: float) -> None:
+        self.delay = delay
+
+    def run(self, prefix: Path) -> str:
+        time.sleep(self.delay)
+        return '{"files": [{"file": "%s", "lines": [{"line_number": 1, "count": 1}]}]}' % prefix.name
+
+
+class TestPipeline:
+
+    def test_analysis_overlaps_execution(self):
+        fuzzer = Fuzzer.__new__(Fuzzer)  # only the state of the analysis
+        fuzzer.gcov, fuzzer.cov_map, fuzzer.fork_lock = SlowGcov(0.2), CoverageMap(), threading.Lock()
+        fuzzer.line_cov = fuzzer.branch_cov = 0
+        fuzzer.log = None
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=1) as analyzer:
+            futures = []
+            for i in range(5):
+                with fuzzer.fork_lock:  # forking the server and the executor of execution i
+                    pass
+                time.sleep(0.2)         # execution i, while execution i-1 is analyzed
+                futures.append(analyzer.submit(fuzzer.analyze_background, Seed([]), Path(f"exec-{i}")))
+            statuses = [future.result() for future in futures]
+
+        # 5 executions then the last analysis, instead of 10 steps one after another
+        assert time.perf_counter() - start < 1.6
+        assert statuses == [SeedStatus.Interesting] * 5 and len(fuzzer.cov_map.lines) == 5
@@ -0,0 +1,51 @@
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from gcov import CoverageMap, GcovCollector
+
+PATH_DATA = Path(__file__).parent.joinpath("data")
+
+SOURCE = """
+int check(int n) {
+    if (n > 1)
+        return 1;
+    return 0;
+}
+
+int main(int argc, char **argv) {
+    return check(argc);
+}
+"""
+
+
+class TestGcov:
+
+    def test_parse(self):
+        # two documents printed by `gcov --json-format --stdout` for main.c and lib.c
+        cov = GcovCollector.parse(PATH_DATA.joinpath("gcov.json").read_text())
+        assert cov.lines == {("lib.c", 1), ("lib.c", 2), ("main.c", 3), ("main.c", 4), ("main.c", 5), ("main.c", 6)}
+        assert cov.branches == {("main.c", 4, 0), ("main.c", 4, 1)}
+
+        cov_map = CoverageMap()
+        assert cov_map.update(cov) and not cov_map.update(cov)
+
+    @pytest.mark.skipif(shutil.which("gcc") is None or shutil.which("gcov") is None, reason="needs gcc and gcov")
+    def test_collect_one_execution(self, tmp_path):
+        tmp_path.joinpath("srv.c").write_text(SOURCE)
+        subprocess.run(["gcc", "--coverage", "-O0", "-o", "srv", "srv.c"], cwd=tmp_path, check=True)
+
+        collector = GcovCollector(store=tmp_path)
+        try:
+            prefix = collector.new_execution()
+            subprocess.run([str(tmp_path.joinpath("srv"))], cwd=tmp_path, env=GcovCollector.environ(prefix))
+            cov = collector.collect(prefix)
+            assert not prefix.exists()
+        finally:
+            collector.close()
+
+        # the counters of this execution only: the branch returning 1 is not taken
+        assert {line for _, line in cov.lines} == {2, 3, 5, 8, 9}
+        assert {(line, index) for _, line, index in cov.branches} == {(3, 1)}
@@ -0,0 +1,46 @@
+from mutator import SpliceMutator, HavocMutator, DupMutator
+
+
+class TestSpliceMutator:
+
+    def test_splice_at_compatible_point(self, make_seed):
+        queue = [make_seed("helo", "mail", "quit"), make_seed("mail", "rcpt", "data", "quit", "noop")]
+        mutator = SpliceMutator(max_size=4)
+        mutator.sync(queue)
+        assert list(mutator.index.partners("rcpt")) == [1]
+
+        for _ in range(50):
+            mutant = mutator.mutate(queue[0])
+            names = [fn.fn_name for fn in mutant.fns]
+            assert len(names) <= 4
+            assert names[-1] == "quit" and names.count("quit") == 1
+            assert "noop" not in names
+
+    def test_splice_long_seed(self, make_seed):
+        queue = [make_seed(*["noop"] * 10, "quit"), make_seed("helo", "noop", "quit")]
+        queue[0].focus = 8
+        mutator = SpliceMutator(max_size=4)
+        mutator.sync(queue)
+        for _ in range(20):
+            assert mutator.mutate(queue[0]).len() <= 10
+
+    def test_sync_appended_seeds(self, make_seed):
+        queue = [make_seed("helo")]
+        mutator = SpliceMutator()
+        mutator.sync(queue)
+        queue.append(make_seed("helo", "quit"))
+        mutator.sync(queue)
+        assert list(mutator.index.partners("helo")) == [0, 1]
+
+
+class TestHavocMutator:
+
+    def test_stack_and_record(self, make_seed):
+        mutator = HavocMutator([(DupMutator(), 1.0)], max_level=2)
+        seed = make_seed("helo", "mail", "quit")
+        mutant = mutator.mutate(seed)
+        assert 2 ** mutant.havoc_level <= mutant.len() - seed.len() < 2 ** (mutant.havoc_level + 1)
+
+        mutator.record(mutant, True)
+        assert mutator.found[mutant.havoc_level] == mutator.tried[mutant.havoc_level] == 1
+        assert mutant.copy().havoc_level is None
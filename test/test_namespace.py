@@ -0,0 +1,67 @@
+import multiprocessing as mp
+import os
+import socket
+
+import pytest
+
+from exception import ServerIsolationFailed
+from namespace import Namespace, supported
+
+
+def isolated_server(namespace: Namespace, private, port: int, ready) -> None:
+    """Enter the namespaces as a server would before `exec`, then serve one connection"""
+    try:
+        namespace.preexec()
+    except OSError as e:
+        ready.send(f"skip: {e}")
+        os._exit(0)
+    private.joinpath("written").write_text("isolated")
+    with socket.create_server(("127.0.0.1", port)) as server:
+        ready.send("ready")
+        conn, _ = server.accept()
+        conn.sendall(b"hello")
+        conn.close()
+    os._exit(0)
+
+
+def isolated_client(pid: int, port: int, result) -> None:
+    Namespace.enter(pid)
+    with socket.create_connection(("127.0.0.1", port), timeout=5) as sock:
+        result.send(sock.recv(5))
+
+
+@pytest.mark.skipif(not supported(), reason="user namespaces are not available")
+class TestNamespace:
+
+    def test_preexec_and_enter(self, tmp_path):
+        private = tmp_path.joinpath("data")
+        private.mkdir()
+        try:
+            namespace = Namespace([private])
+        except ServerIsolationFailed as e:
+            pytest.skip(str(e))
+
+        # the port is taken on the host, not on the private loopback of the server
+        with socket.create_server(("127.0.0.1", 0)) as taken:
+            port = taken.getsockname()[1]
+            reader, writer = mp.Pipe(duplex=False)
+            server = mp.Process(target=isolated_server, args=[namespace, private, port, writer])
+            server.start()
+            try:
+                assert reader.poll(10)
+                if (status := reader.recv()).startswith("skip"):
+                    pytest.skip(status)
+                assert status == "ready"
+
+                client = mp.Process(target=isolated_client, args=[server.pid, port, writer])
+                client.start()
+                client.join(10)
+                assert reader.poll(1) and reader.recv() == b"hello"
+            finally:
+                server.join(10)
+                if server.is_alive():
+                    server.kill()
+
+        # the writes of the server go to its private copy
+        assert not private.joinpath("written").exists()
+        assert namespace.host_path(private.joinpath("written")).read_text() == "isolated"
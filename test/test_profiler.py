@@ -0,0 +1,62 @@
+import multiprocessing as mp
+import signal
+import threading
+import time
+
+from profiler import SamplingProfiler, read_collapsed, top
+
+
+def busy(seconds: float) -> int:
+    end, count = time.process_time() + seconds, 0
+    while time.process_time() < end:
+        count += 1
+    return count
+
+
+class TestProfiler:
+
+    def test_collapsed_stacks(self, tmp_path):
+        profiler = SamplingProfiler(tmp_path, interval=0.001)
+        profiler.start()
+        busy(0.2)
+        profiler.stop()
+
+        stacks = profiler.write()["fuzzer"]
+        assert stacks == read_collapsed(tmp_path.joinpath("fuzzer.collapsed"))
+        assert sum(stacks.values()) > 20
+        assert all(stack.split(";")[0] for stack in stacks)
+        hottest = [frame for frame, _, _ in top(stacks, 3)]
+        assert "test_profiler.py:busy" in hottest
+
+    def test_threads(self, tmp_path):
+        profiler = SamplingProfiler(tmp_path, interval=0.001)
+        worker = threading.Thread(target=busy, args=[0.2], name="analyzer_0")
+        profiler.start()
+        worker.start()
+        while worker.is_alive():
+            # the signals are handled by the main thread, only while it runs (as the fuzzing loop does)
+            busy(0.01)
+        profiler.stop()
+
+        # the samples of every thread, under its name
+        stacks = profiler.write()["fuzzer"]
+        assert any(stack.startswith("analyzer_0;") and stack.endswith("test_profiler.py:busy") for stack in stacks)
+        assert all(stack.split(";")[0] in ("MainThread", "analyzer_0") for stack in stacks)
+
+    def test_terminated_executor(self, tmp_path):
+        profiler = SamplingProfiler(tmp_path, interval=0.001)
+
+        def hang():
+            profiler.start_executor()
+            busy(60)
+
+        executor = mp.Process(target=hang)
+        executor.start()
+        executor.join(timeout=0.3)
+        executor.terminate()
+        executor.join()
+
+        # the samples of a hang are written when it is killed
+        assert executor.exitcode == -signal.SIGTERM
+        stacks = read_collapsed(tmp_path.joinpath("executors.collapsed"))
+        assert "test_profiler.py:busy" in [frame for frame, _, _ in top(stacks, 3)]
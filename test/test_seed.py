@@ -1,6 +1,13 @@
 import pickle
+import socket
+import time
 
-from seed.arg import BooleanArg
+from ftplib import error_perm
+from smtplib import SMTPResponseException
+
+from seed import Seed
+from seed.arg import BooleanArg, PayloadArg, StringArg
+from seed.fn import Fn, reply_code
 
 class TestArg:
 
@@ -11,4 +18,98 @@ class TestArg:
 
         false = BooleanArg(True)
         loaded_false = pickle.loads(pickle.dumps(true))
-        assert false.value == loaded_false.value
\ No newline at end of file
+        assert false.value == loaded_false.value
+
+    def test_payload_arg(self):
+        payload = PayloadArg(b"Hello", max_size=1 << 16)
+        for _ in range(200):
+            payload.mutate()
+            assert len(payload.value) <= 1 << 16
+        assert payload.unpack().read() == payload.value
+
+        # copies and loaded seeds share the interned payload
+        assert pickle.loads(pickle.dumps(payload)).value is payload.value
+
+class TestFn:
+
+    def test_deadlines(self):
+        class Client:
+            def __init__(self):
+                self.sock, self.peer = socket.socketpair()
+                self.timeout = None
+
+            def stall(self):
+                return self.sock.recv(1)  # nothing is ever sent
+
+            def noop(self):
+                return "250 ok"
+
+        client = Client()
+        seed = Seed([Fn("stall"), Fn("noop"), Fn("stall"), Fn("noop")])
+        start = time.perf_counter()
+        seed.execute(client, deadline=0.05)
+        assert time.perf_counter() - start < 1
+        assert seed.trace == [(-1, False), (250, True), (-1, False), (250, True)]
+        assert seed.timeout_category == "call" and client.timeout == 0.05
+
+        seed.execute(client, deadline=0.05, abort=True)
+        assert seed.trace == [(-1, False)]
+
+        seed.execute(client, deadline=1.0, budget=0.05)
+        assert seed.trace == [(-1, False)] and seed.timeout_category == "budget"
+
+    def test_close_unpacked_files(self):
+        class Client:
+            def storbinary(self, cmd, fp):
+                self.fp = fp
+                return "226 Transfer complete"
+
+        client = Client()
+        assert Fn("storbinary", [BooleanArg(True), PayloadArg(b"data")]).execute(client) == 226
+        assert client.fp.closed
+
+    def test_unpack_failure(self):
+        class MissingFile(StringArg):
+            def unpack(self):
+                raise FileNotFoundError(self.value)
+
+        class Client:
+            def storbinary(self, fp, path):
+                return "226 Transfer complete"
+
+        class Payload(PayloadArg):
+            def unpack(self):
+                self.file = super().unpack()
+                return self.file
+
+        payload = Payload(b"data")
+        seed = Seed([Fn("storbinary", [payload, MissingFile("dummy/test.dcm")])])
+        seed.execute(Client())
+        # a failed call, closing the payload already unpacked
+        assert seed.trace == [(-1, False)]
+        assert payload.file.closed
+
+    def test_stale_last_reply(self):
+        class Client:
+            lastresp = "331"
+
+            def login(self):
+                self.lastresp = "230"
+                return "230 Login successful"
+
+            def set_pasv(self, val):
+                return None
+
+        client = Client()
+        assert Fn("set_pasv", [BooleanArg(True)]).execute(client) is None
+        assert Fn("login").execute(client) == 230
+        assert Fn("set_pasv", [BooleanArg(False)]).execute(client) is None
+
+    def test_reply_code(self):
+        assert reply_code("226 Transfer complete") == 226
+        assert reply_code((250, b"OK")) == 250
+        assert reply_code(b"214 help") == 214
+        assert reply_code(error_perm("550 No such file")) == 550
+        assert reply_code(SMTPResponseException(503, b"bad sequence")) == 503
+        assert reply_code("/test") is None
+        assert reply_code(None) is None
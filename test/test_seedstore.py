@@ -0,0 +1,52 @@
+import random
+
+from seed import Seed
+from seed.arg import PayloadArg, StringArg
+from seed.fn import Fn
+from seedstore import SeedStore
+
+
+def make_seed(i: int) -> Seed:
+    return Seed([Fn("noop", [StringArg(f"seed{i}"), PayloadArg(random.randbytes(2048))])])
+
+
+class TestSeedStore:
+
+    def test_spill_and_load(self):
+        store = SeedStore(memory_limit=16 * 1024, segment_size=32 * 1024)
+        try:
+            seeds = [make_seed(i) for i in range(64)]
+            store.extend(seeds)
+            assert len(store) == 64 and len(store._files) > 1
+            assert store.live_size <= 16 * 1024 and len(store.live) < 64
+
+            # spilled seeds come back from the sealed (mapped) and the last (written) segments
+            for i in (0, 31, 63, -1):
+                assert str(store[i]) == str(seeds[i])
+            assert store.loads > 0
+            assert [str(seed) for seed in store[60:]] == [str(seed) for seed in seeds[60:]]
+
+            # a live seed is the same object, found without loading the others
+            seed = store[5]
+            assert store[5] is seed and store.index(seed) == 5
+            assert len(random.sample(store, 10)) == 10
+        finally:
+            path = store.path
+            store.close()
+        assert not path.exists()
+
+    def test_update(self):
+        store = SeedStore([make_seed(0)], memory_limit=4 * 1024)
+        try:
+            store[0].trace = [(250, True)]
+            store.update(0)
+            store.extend(make_seed(i) for i in range(1, 4))
+            assert 0 not in store.live and store[0].trace == [(250, True)]
+        finally:
+            store.close()
+
+    def test_removed_when_dropped(self):
+        store = SeedStore([make_seed(0)])
+        path = store.path
+        del store
+        assert not path.exists()
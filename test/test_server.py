@@ -0,0 +1,20 @@
+import os
+
+from server import Target
+
+
+class TestServer:
+
+    def test_start_in_path(self, tmp_path):
+        tmp_path.joinpath("srv").write_text("#!/bin/sh\npwd > started\nread line\n")
+        tmp_path.joinpath("srv").chmod(0o755)
+        cwd = os.getcwd()
+
+        target = Target("./srv", str(tmp_path), ".", "127.0.0.1", "2200", clean="rm started")
+        assert target.resolve()[0] == str(tmp_path.joinpath("srv"))
+        with target as proc:
+            proc.communicate(b"q\n", timeout=5)
+            assert tmp_path.joinpath("started").read_text().strip() == str(tmp_path)
+        # the server ran in its path, the cleanup too, and the fuzzer stayed where it was
+        assert os.getcwd() == cwd
+        assert not tmp_path.joinpath("started").exists()
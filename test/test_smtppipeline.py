@@ -0,0 +1,75 @@
+import socket
+import socketserver
+import threading
+import time
+
+from seed import Seed
+from seed.arg import StringArg
+from seed.fn import Fn
+from smtppipeline import SMTPPipeline, message_body
+
+
+class PipeliningHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.wfile.write(b"220 hi\r\n")
+        in_data = False
+        while line := self.rfile.readline():
+            if in_data:
+                if line == b".\r\n":
+                    in_data = False
+                    self.wfile.write(b"250 queued\r\n")
+                continue
+            command = line[:4].upper()
+            if command == b"EHLO":
+                self.wfile.write(b"250-hi\r\n250-PIPELINING\r\n250 8BITMIME\r\n")
+            elif command == b"DATA":
+                in_data = True
+                self.wfile.write(b"354 go\r\n")
+            elif command == b"RCPT" and b"nobody" in line:
+                self.wfile.write(b"550 no such user\r\n")
+            elif command == b"QUIT":
+                self.wfile.write(b"221 bye\r\n")
+                break
+            else:
+                self.wfile.write(b"250 ok\r\n")
+
+
+class TestSMTPPipeline:
+
+    def test_pipelined_groups(self):
+        server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), PipeliningHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            seed = Seed([
+                Fn("ehlo"),
+                Fn("mail", [StringArg("a@b")]),
+                Fn("rcpt", [StringArg("a@b")]),
+                Fn("rcpt", [StringArg("nobody@b")]),
+                Fn("data", [StringArg("hello\n.dot")]),
+                Fn("quit", is_last=True),
+                Fn("noop"),
+            ])
+            engine = SMTPPipeline()
+            assert engine.supports(seed)
+            trace = engine.execute(seed, server.server_address)
+
+            assert trace == [(250, True), (250, True), (250, True), (550, True), (250, True), (221, True)]
+            assert engine.pipelining
+            assert engine.groups == 3  # ehlo, mail/rcpt/rcpt/data, quit
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_timeout(self):
+        server = socket.create_server(("127.0.0.1", 0))  # accepts, never replies
+        try:
+            start = time.perf_counter()
+            trace = SMTPPipeline(timeout=10).execute(Seed([Fn("noop"), Fn("quit")]), server.getsockname(), timeout=0.05)
+            assert time.perf_counter() - start < 1
+            assert trace == [(-1, False), (-1, False)]
+        finally:
+            server.close()
+
+    def test_unsupported_and_body(self):
+        assert not SMTPPipeline().supports(Seed([Fn("login", [StringArg("u"), StringArg("p")])]))
+        assert message_body("a\n.b") == b"a\r\n..b\r\n.\r\n"
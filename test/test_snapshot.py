@@ -0,0 +1,34 @@
+from snapshot import Snapshot
+
+
+def listing(root):
+    return {str(p.relative_to(root)): (p.read_bytes() if p.is_file() else None) for p in root.rglob("*")}
+
+
+class TestSnapshot:
+
+    def test_restore(self, tmp_path):
+        root = tmp_path.joinpath("root")
+        root.mkdir()
+        root.joinpath("keep.txt").write_text("keep")
+        root.joinpath("dir").mkdir()
+        root.joinpath("dir", "nested.txt").write_text("nested")
+
+        snapshot = Snapshot(root, store=tmp_path)
+        snapshot.take()
+        pristine = listing(root)
+
+        # what a FTP seed does: mkd, stor, appe, delete, rmd
+        root.joinpath("test").mkdir()
+        root.joinpath("test", "temp1.txt").write_text("Hello")
+        with root.joinpath("keep.txt").open("a") as f:
+            f.write("Hello")
+        root.joinpath("dir", "nested.txt").unlink()
+        root.joinpath("dir").rmdir()
+
+        assert snapshot.restore() > 0
+        assert listing(root) == pristine
+        assert snapshot.restore() == 0
+
+        snapshot.close()
+        assert not snapshot.store.exists()
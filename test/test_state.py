@@ -0,0 +1,24 @@
+from state import StateModel, INITIAL_STATE
+
+
+class TestStateModel:
+
+    def test_states_and_transitions(self, make_seed):
+        model = StateModel()
+        assert model.update(make_seed("helo", "mail", "rcpt", codes=[220, 250, 503]), False)
+        assert not model.update(make_seed("helo", "mail", "rcpt", codes=[220, 250, 503]), False)
+
+        assert set(model.states) == {INITIAL_STATE, 220, 250, 503}
+        assert model.transitions[(250, 503)] == 2
+        assert "digraph" in model.to_dot()
+
+    def test_schedule_from_reached_state(self, make_seed):
+        model = StateModel()
+        seed = make_seed("helo", "mail", "rcpt", codes=[220, 250, 503])
+        model.update(seed, True)
+        model.add_seed(0, seed)
+
+        for scheduled, position, state in model.schedule([seed], 20):
+            assert scheduled is seed
+            expected = 0 if state == INITIAL_STATE else seed.codes.index(state) + 1
+            assert position == expected
@@ -0,0 +1,35 @@
+from seed import Seed
+from seed.arg import StringArg
+from seed.fn import Fn
+from sync import SyncDir
+
+
+def make_seed(name: str) -> Seed:
+    return Seed([Fn("noop", [StringArg(name)])])
+
+
+class TestSync:
+
+    def test_incremental_fetch(self, tmp_path):
+        main = SyncDir(tmp_path, "main")
+        first = SyncDir(tmp_path, "first", main=False)
+        second = SyncDir(tmp_path, "second", main=False)
+
+        first.publish(make_seed("a"))
+        second.publish(make_seed("b"))
+        assert sorted(str(seed) for seed in main.fetch()) == sorted([str(make_seed("a")), str(make_seed("b"))])
+        assert list(main.fetch()) == []  # up to the watermarks
+
+        # a secondary only imports from the main instances
+        main.publish(make_seed("c"))
+        assert [str(seed) for seed in first.fetch()] == [str(make_seed("c"))]
+
+        # a line being appended is left for the next round
+        first.publish(make_seed("d"))
+        with first.index.open("ab") as index:
+            index.write(b"0000")
+        assert [str(seed) for seed in main.fetch()] == [str(make_seed("d"))]
+
+        # the watermarks and the numbering survive a restart
+        assert list(SyncDir(tmp_path, "main").fetch()) == []
+        assert SyncDir(tmp_path, "second", main=False).published == 1
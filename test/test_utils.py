@@ -0,0 +1,29 @@
+from utils import TimeoutCalibrator
+
+
+class TestTimeoutCalibrator:
+
+    def test_timeout_follows_latency(self):
+        calibrator = TimeoutCalibrator(2.0, upper=10.0, lower=0.1, factor=3.0)
+        for _ in range(10):
+            calibrator.record(0.2)
+        assert abs(calibrator.timeout - 0.6) < 1e-9
+
+        for _ in range(256):
+            calibrator.record(1.0)
+        assert abs(calibrator.timeout - 3.0) < 1e-9
+
+    def test_timeout_is_clamped(self):
+        calibrator = TimeoutCalibrator(2.0, upper=5.0, lower=0.5)
+        calibrator.record(0.001)
+        assert calibrator.timeout == 0.5
+
+        calibrator.record(100.0)
+        assert calibrator.timeout == 5.0
+        assert calibrator.timeout_verify == 5.0
+
+    def test_verify_follows_timeout(self):
+        calibrator = TimeoutCalibrator(2.0, upper=10.0)
+        assert calibrator.timeout_verify == 10.0  # calibration runs
+        calibrator.record(0.1)
+        assert abs(calibrator.timeout_verify - 0.6) < 1e-9
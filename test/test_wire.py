@@ -0,0 +1,43 @@
+import socket
+import socketserver
+import threading
+
+from wire import Recorder, Replayer, Trace, EV_CONNECT, EV_SEND
+
+
+class LineHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.wfile.write(b"220 hi\r\n")
+        for line in self.rfile:
+            self.wfile.write(b"221 bye\r\n" if line.startswith(b"quit") else b"250 ok\r\n")
+            if line.startswith(b"quit"):
+                break
+
+
+class TestWire:
+
+    def test_record_and_replay(self):
+        server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), LineHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        addr = server.server_address
+        try:
+            with Recorder("SMTP", addr[1]) as recorder:
+                sock = socket.create_connection(addr)
+                reader = sock.makefile("rb")
+                reader.readline()
+                for index, command in enumerate([b"noop\r\n", b"quit\r\n"]):
+                    recorder.begin(index)
+                    sock.sendall(command)
+                    reader.readline()
+                reader.close()
+                sock.close()
+
+            trace = Trace.from_bytes(recorder.trace.to_bytes())
+            assert trace.protocol == "SMTP" and trace.port == addr[1]
+            assert [kind for kind, *_ in trace.events][:1] == [EV_CONNECT]
+            assert [payload for kind, _, _, payload in trace.events if kind == EV_SEND] == [b"noop\r\n", b"quit\r\n"]
+
+            assert Replayer(trace, addr).replay() == [(250, True), (221, True)]
+        finally:
+            server.shutdown()
+            server.server_close()
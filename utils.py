@@ -1,5 +1,6 @@
 from functools import wraps
-from typing import NoReturn, Tuple
+from typing import NoReturn, Tuple, Optional, Deque
+from collections import deque
 from enum import Enum
 import time
 from pathlib import Path
@@ -9,6 +10,7 @@ PATH_ROOT = Path(__file__).parent
 PATH_LOG = PATH_ROOT.joinpath('log')
 PATH_SEED = PATH_ROOT.joinpath('saved-seed')
 PATH_DUMMY = PATH_ROOT.joinpath('dummy')
+PATH_CATALOG = PATH_ROOT.joinpath('catalog')
 PATH_CONFIG = PATH_ROOT.joinpath('server-config.ini')
 
 
@@ -75,3 +77,48 @@ class Timer:
     def total_time(self) -> float:
         """The total execution time"""
         return self._total_time
+
+
+class TimeoutCalibrator:
+    """
+    Derive the testcase timeout from the observed execution latencies.
+    The timeout is `factor` times the `percentile` of the latest `window` latencies,
+    clamped into [`lower`, `upper`], and follows the latencies as they are recorded.
+    A hang is re-verified with `verify_factor` times the timeout, up to `upper`.
+    """
+
+    def __init__(self, initial: float, *, upper: Optional[float] = None, lower: float = 0.1,
+                 factor: float = 3.0, percentile: float = 0.99, window: int = 256,
+                 verify_factor: float = 2.0) -> None:
+        self._timeout = initial
+        self.upper = upper if upper is not None else initial
+        self.lower = min(lower, self.upper)
+
+        self.factor = factor
+        self.verify_factor = verify_factor
+        self.percentile = percentile
+        self._latencies: Deque[float] = deque(maxlen=window)
+
+    def record(self, latency: float) -> None:
+        """Record the latency of a finished (not timed out) execution and update the timeout"""
+        self._latencies.append(latency)
+
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile))
+        self._timeout = min(self.upper, max(self.lower, ordered[index] * self.factor))
+
+    @property
+    def calibrated(self) -> bool:
+        return len(self._latencies) > 0
+
+    @property
+    def timeout(self) -> float:
+        """The current timeout of one execution"""
+        return self._timeout
+
+    @property
+    def timeout_verify(self) -> float:
+        """The longer timeout used to re-verify an execution before labeling it a hang (`upper` until calibrated)"""
+        if not self.calibrated:
+            return self.upper
+        return min(self.upper, self._timeout * self.verify_factor)
@@ -0,0 +1,305 @@
+"""
+Wire-level record and replay of seed executions.
+
+`Recorder` captures the exact bytes every API call sends and receives, by patching the methods of
+`socket.socket` in the (forked) executor, and serializes them in a compact binary trace.
+`Replayer` re-sends a trace with raw sockets, without the client libraries, which is much faster
+than replaying the seed call by call: calibration and crash reproduction use it.
+
+Only the outbound connections (and datagrams) of the client are recorded: the connections
+accepted by the client (e.g. FTP active mode) are not replayed.
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+from pathlib import Path
+import re
+import select
+import socket
+import struct
+import time
+import logging
+
+from utils import Addr
+from seed import CODE_OK
+from seed.fn import reply_code
+
+
+logger = logging.getLogger("fazz.wire")
+
+MAGIC = b"FAZW"
+VERSION = 1
+
+HEADER = struct.Struct("<4sBHB")   # magic, version, target port, length of the protocol name
+EVENT = struct.Struct("<BBhI")     # kind, connection, API call index, payload length
+CONNECT = struct.Struct("<BH")     # socket type, peer port
+
+# Event kinds
+EV_CONNECT = 1
+EV_SEND = 2
+EV_RECV = 3
+EV_CLOSE = 4
+
+NO_FN = -1  # events before the first API call (connection, banner)
+
+# FTP passive mode replies telling the port of the data connection
+PASV_PORT = re.compile(rb"227 .*\(\d+,\d+,\d+,\d+,(\d+),(\d+)\)")
+EPSV_PORT = re.compile(rb"229 .*\(\|\|\|(\d+)\|\)")
+
+Event = Tuple[int, int, int, bytes]  # kind, connection, API call index, payload
+
+
+class Trace:
+    """The socket events of one execution"""
+
+    def __init__(self, protocol: str, port: int, events: Optional[List[Event]] = None) -> None:
+        self.protocol = protocol
+        self.port = port  # port of the target when recorded, mapped to the current one when replayed
+        self.events: List[Event] = events if events is not None else []
+
+    def to_bytes(self) -> bytes:
+        name = self.protocol.encode()
+        chunks = [HEADER.pack(MAGIC, VERSION, self.port, len(name)), name]
+        for kind, conn, fn, payload in self.events:
+            chunks.append(EVENT.pack(kind, conn, fn, len(payload)))
+            chunks.append(payload)
+        return b"".join(chunks)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Trace":
+        magic, version, port, name_len = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not a wire trace (or an unsupported version)")
+        offset = HEADER.size
+        protocol = data[offset:offset + name_len].decode()
+        offset += name_len
+
+        events: List[Event] = []
+        while offset < len(data):
+            kind, conn, fn, length = EVENT.unpack_from(data, offset)
+            offset += EVENT.size
+            events.append((kind, conn, fn, data[offset:offset + length]))
+            offset += length
+        return cls(protocol, port, events)
+
+    def save(self, path: Path) -> None:
+        path.write_bytes(self.to_bytes())
+
+    @classmethod
+    def load(cls, path: Path) -> "Trace":
+        return cls.from_bytes(path.read_bytes())
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+
+class Recorder:
+    """
+    Record the socket traffic of the current process while installed.
+    Meant for the forked executors: the patches are process-wide.
+    """
+    PATCHED = ("connect", "send", "sendall", "sendto", "recv", "recv_into", "recvfrom", "recvfrom_into",
+               "shutdown", "_real_close")
+
+    def __init__(self, protocol: str, port: int) -> None:
+        self.trace = Trace(protocol, port)
+        self.fn = NO_FN
+        self.conns: Dict[int, int] = {}  # id of the open socket -> connection number
+        self.count = 0                   # connections recorded
+        self._originals: Dict[str, Callable] = {}
+
+    def begin(self, index: int) -> None:
+        """Attribute the next events to the API call at `index`"""
+        self.fn = index
+
+    def _connection(self, sock: socket.socket, address, *, connect: bool) -> Optional[int]:
+        # the id of a socket collected without `close` may be reused by a new one, connecting it again
+        if not connect and (conn := self.conns.get(id(sock), None)) is not None:
+            return conn
+        if sock.family not in (socket.AF_INET, socket.AF_INET6) or self.count > 255:
+            return None
+
+        conn = self.conns[id(sock)] = self.count
+        self.count += 1
+        kind = 1 if sock.type == socket.SOCK_STREAM else 2
+        self.trace.events.append((EV_CONNECT, conn, self.fn, CONNECT.pack(kind, address[1])))
+        return conn
+
+    def _event(self, kind: int, sock: socket.socket, payload: bytes = b"") -> None:
+        if (conn := self.conns.get(id(sock), None)) is not None:
+            self.trace.events.append((kind, conn, self.fn, bytes(payload)))
+
+    def install(self) -> None:
+        recorder = self
+        originals = self._originals = {name: getattr(socket.socket, name) for name in self.PATCHED}
+
+        def connect(sock, address):
+            originals["connect"](sock, address)
+            recorder._connection(sock, address, connect=True)
+
+        def send(sock, data, *args):
+            sent = originals["send"](sock, data, *args)
+            recorder._event(EV_SEND, sock, memoryview(data)[:sent])
+            return sent
+
+        def sendall(sock, data, *args):
+            originals["sendall"](sock, data, *args)
+            recorder._event(EV_SEND, sock, data)
+
+        def sendto(sock, data, *args):
+            sent = originals["sendto"](sock, data, *args)
+            recorder._connection(sock, args[-1], connect=False)
+            recorder._event(EV_SEND, sock, memoryview(data)[:sent])
+            return sent
+
+        def recv(sock, *args):
+            data = originals["recv"](sock, *args)
+            recorder._event(EV_RECV, sock, data)
+            return data
+
+        def recv_into(sock, buffer, *args):
+            received = originals["recv_into"](sock, buffer, *args)
+            recorder._event(EV_RECV, sock, memoryview(buffer)[:received])
+            return received
+
+        def recvfrom(sock, *args):
+            data, address = originals["recvfrom"](sock, *args)
+            recorder._event(EV_RECV, sock, data)
+            return data, address
+
+        def recvfrom_into(sock, buffer, *args):
+            received, address = originals["recvfrom_into"](sock, buffer, *args)
+            recorder._event(EV_RECV, sock, memoryview(buffer)[:received])
+            return received, address
+
+        def shutdown(sock, how):
+            recorder._event(EV_CLOSE, sock)
+            return originals["shutdown"](sock, how)
+
+        def _real_close(sock, *args):
+            recorder._event(EV_CLOSE, sock)
+            recorder.conns.pop(id(sock), None)
+            return originals["_real_close"](sock, *args)
+
+        patches = {
+            "connect": connect, "send": send, "sendall": sendall, "sendto": sendto,
+            "recv": recv, "recv_into": recv_into, "recvfrom": recvfrom, "recvfrom_into": recvfrom_into,
+            "shutdown": shutdown, "_real_close": _real_close,
+        }
+        for name, patch in patches.items():
+            setattr(socket.socket, name, patch)
+
+    def uninstall(self) -> None:
+        for name, original in self._originals.items():
+            setattr(socket.socket, name, original)
+        self._originals = {}
+
+    def __enter__(self) -> "Recorder":
+        self.install()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.uninstall()
+
+
+class Replayer:
+    """Re-send a trace to the target with raw sockets"""
+
+    def __init__(self, trace: Trace, addr: Addr, *, read_timeout: float = 0.5, timeout_connect: int = 5) -> None:
+        self.trace = trace
+        self.addr = addr
+        self.read_timeout = read_timeout  # waiting for the replies recorded
+        self.timeout_connect = timeout_connect
+
+        self.socks: Dict[int, socket.socket] = {}
+        self.pending: Dict[int, int] = {}        # connection -> bytes expected and not received yet
+        self.received: Dict[int, bytearray] = {}  # API call index -> bytes received
+        self.passive_port: Optional[int] = None
+
+    def peer(self, port: int) -> Addr:
+        """Map a recorded port to the current target (the data connections to the last passive port)"""
+        if port == self.trace.port:
+            return self.addr
+        return self.addr[0], self.passive_port if self.passive_port is not None else port
+
+    def connect(self, conn: int, payload: bytes) -> None:
+        kind, port = CONNECT.unpack(payload)
+        addr = self.peer(port)
+        if kind == 2:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.connect(addr)
+        else:
+            for i in range(self.timeout_connect):
+                try:
+                    sock = socket.create_connection(addr, timeout=self.read_timeout)
+                    break
+                except OSError:
+                    if i + 1 == self.timeout_connect:
+                        raise
+                    time.sleep(0.05)
+        sock.setblocking(False)
+        self.socks[conn] = sock
+        self.pending[conn] = 0
+
+    def drain(self, fn: int) -> None:
+        """Read the replies expected so far, giving up on a connection silent for `read_timeout`"""
+        while waiting := [self.socks[conn] for conn, left in self.pending.items() if left > 0 and conn in self.socks]:
+            readable, _, _ = select.select(waiting, [], [], self.read_timeout)
+            if not readable:
+                break
+            for sock in readable:
+                conn = next(conn for conn, s in self.socks.items() if s is sock)
+                try:
+                    data = sock.recv(65536)
+                except OSError:
+                    data = b""
+                if not data:
+                    self.pending[conn] = 0  # closed by the target
+                    continue
+                self.pending[conn] -= len(data)
+                self.received.setdefault(fn, bytearray()).extend(data)
+                self.passive(data)
+
+    def passive(self, data: bytes) -> None:
+        if (match := PASV_PORT.search(data)) is not None:
+            self.passive_port = int(match.group(1)) * 256 + int(match.group(2))
+        elif (match := EPSV_PORT.search(data)) is not None:
+            self.passive_port = int(match.group(1))
+
+    def replay(self) -> List[Tuple[int, bool]]:
+        """
+        Replay the trace
+
+        Returns (reply code, succeeded) of every API call, read from the replies for the text protocols
+        """
+        fn = NO_FN
+        try:
+            for kind, conn, event_fn, payload in self.trace.events:
+                if kind == EV_RECV:
+                    self.pending[conn] = self.pending.get(conn, 0) + len(payload)
+                    fn = event_fn
+                    continue
+
+                self.drain(fn)
+                if kind == EV_CONNECT:
+                    self.connect(conn, payload)
+                elif kind == EV_SEND and (sock := self.socks.get(conn, None)) is not None:
+                    sock.setblocking(True)
+                    sock.sendall(payload)
+                    sock.setblocking(False)
+                elif kind == EV_CLOSE and (sock := self.socks.pop(conn, None)) is not None:
+                    sock.close()
+            self.drain(fn)
+        finally:
+            for sock in self.socks.values():
+                sock.close()
+            self.socks.clear()
+
+        return self.outcomes()
+
+    def outcomes(self) -> List[Tuple[int, bool]]:
+        last_fn = max((fn for _, _, fn, _ in self.trace.events), default=NO_FN)
+        trace: List[Tuple[int, bool]] = []
+        for fn in range(last_fn + 1):
+            lines = bytes(self.received.get(fn, b"")).splitlines()
+            code = reply_code(lines[-1]) if lines else None
+            trace.append((code, code < 400) if code is not None else (CODE_OK, True))
+        return trace